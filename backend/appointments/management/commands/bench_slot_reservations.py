@@ -0,0 +1,115 @@
+import time as perf_time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from appointments.models import Appointment, ACTIVE_APPOINTMENT_STATUSES
+from appointments.services import AppointmentService
+from doctors.models import Schedule
+from patients.models import Patient
+
+
+class Command(BaseCommand):
+    help = (
+        "Bắn N lượt đặt lịch song song vào một Schedule và báo cáo "
+        "throughput, tỉ lệ xung đột. Các lịch hẹn tạo ra sẽ được dọn sau khi chạy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--schedule", type=int, required=True)
+        parser.add_argument("--patient", type=int, required=True)
+        parser.add_argument("--bookings", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument(
+            "--keep", action="store_true", help="Không xóa các lịch hẹn đã tạo"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            schedule = Schedule.objects.get(id=options["schedule"])
+            patient = Patient.objects.get(id=options["patient"])
+        except (Schedule.DoesNotExist, Patient.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        slots = self._slots(schedule)
+        if not slots:
+            raise CommandError("Schedule không có slot nào.")
+
+        original = (schedule.current_patients, schedule.status, schedule.booked_slots)
+        attempts = [slots[i % len(slots)] for i in range(options["bookings"])]
+
+        def book(slot):
+            try:
+                data = {
+                    "doctor": schedule.doctor,
+                    "patient": patient,
+                    "schedule": Schedule.objects.get(id=schedule.id),
+                    "symptoms": "",
+                    "slot_start": slot[0],
+                    "slot_end": slot[1],
+                }
+                return AppointmentService.create_appointment(data).id, None
+            except ValueError as e:
+                return None, str(e)
+            finally:
+                connection.close()
+
+        started = perf_time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            results = list(pool.map(book, attempts))
+        elapsed = perf_time.perf_counter() - started
+
+        created_ids = [r[0] for r in results if r[0] is not None]
+        rejections = Counter(r[1] for r in results if r[1] is not None)
+
+        schedule.refresh_from_db()
+        duplicated = (
+            Appointment.objects.filter(
+                id__in=created_ids, status__in=ACTIVE_APPOINTMENT_STATUSES
+            )
+            .values("slot_start")
+            .distinct()
+            .count()
+            != len(created_ids)
+        )
+
+        total = len(attempts)
+        self.stdout.write(f"Bookings:       {total} ({options['workers']} workers)")
+        self.stdout.write(f"Elapsed:        {elapsed:.3f}s")
+        self.stdout.write(f"Throughput:     {total / elapsed:.1f} bookings/s")
+        self.stdout.write(f"Succeeded:      {len(created_ids)}")
+        self.stdout.write(
+            f"Conflict rate:  {(total - len(created_ids)) / total:.1%}"
+        )
+        for message, count in rejections.most_common():
+            self.stdout.write(f"  {count:>6}  {message}")
+        self.stdout.write(
+            f"current_patients: {original[0]} -> {schedule.current_patients}"
+        )
+
+        if duplicated:
+            self.stdout.write(self.style.ERROR("Phát hiện slot bị đặt trùng!"))
+        if schedule.current_patients - original[0] != len(created_ids):
+            self.stdout.write(self.style.ERROR("current_patients bị lệch!"))
+
+        if not options["keep"]:
+            Appointment.objects.filter(id__in=created_ids).delete()
+            Schedule.objects.filter(id=schedule.id).update(
+                current_patients=original[0],
+                status=original[1],
+                booked_slots=original[2],
+            )
+
+    @staticmethod
+    def _slots(schedule):
+        duration = timedelta(minutes=schedule.default_appointment_duration_minutes)
+        current = datetime.combine(schedule.work_date, schedule.start_time)
+        end = datetime.combine(schedule.work_date, schedule.end_time)
+        slots = []
+        while current + duration <= end:
+            slots.append((current.time(), (current + duration).time()))
+            current += duration
+        return slots
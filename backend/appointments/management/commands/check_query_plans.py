@@ -0,0 +1,178 @@
+import re
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from appointments.models import ACTIVE_APPOINTMENT_STATUSES, Appointment, ServiceOrder
+from appointments.reminders import due_appointments
+from doctors.models import Schedule
+from payments.models import Bill, Transaction
+from payments.services import BillService
+
+# Dòng kế hoạch cho biết một bảng bị quét toàn bộ thay vì tra qua index
+SEQ_SCAN_PATTERNS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (?:TABLE )?(?!TABLE\b)(\w+)\b(?! USING)"),
+}
+INDEX_PATTERN = re.compile(
+    r"(?:USING (?:COVERING )?INDEX|Index (?:Only )?Scan using|Bitmap Index Scan on) (\w+)"
+)
+
+
+def _appointments_by_doctor(appointment):
+    # AppointmentService.get_appointments_by_doctor_id_optimized
+    return Appointment.objects.filter(
+        doctor_id=appointment.doctor_id,
+        status=appointment.status,
+        schedule__work_date=appointment.schedule.work_date,
+    ).order_by("schedule__start_time")
+
+
+def _appointments_by_slot(appointment):
+    # Kiểm tra slot trong SlotReservationService / count_by_schedule_and_slot_start
+    return Appointment.objects.filter(
+        schedule_id=appointment.schedule_id,
+        slot_start=appointment.slot_start,
+        status__in=ACTIVE_APPOINTMENT_STATUSES,
+    )
+
+
+def _upcoming_by_patient(appointment):
+    # AppointmentService.get_appointments_by_patient_id_optimized(appointment_type="upcoming")
+    return Appointment.objects.filter(
+        patient_id=appointment.patient_id,
+        status__in=ACTIVE_APPOINTMENT_STATUSES,
+    ).order_by("slot_start")
+
+
+def _schedules_by_doctor(schedule):
+    # ScheduleService.get_all_schedules(doctor_id, work_date=...)
+    return Schedule.objects.filter(
+        doctor_id=schedule.doctor_id, work_date=schedule.work_date
+    ).order_by("work_date", "start_time")
+
+
+def _schedules_by_range(schedule):
+    # AppointmentService.iter_available_time_slots
+    return Schedule.objects.filter(
+        work_date__range=(schedule.work_date, schedule.work_date + timedelta(days=7))
+    )
+
+
+def _orders_by_room(order):
+    # ServiceOrderViewSet.by_room
+    day_start = timezone.make_aware(
+        datetime.combine(timezone.localdate(order.order_time), datetime.min.time())
+    )
+    return ServiceOrder.objects.filter(
+        room_id=order.room_id,
+        status=order.status,
+        order_time__gte=day_start,
+        order_time__lt=day_start + timedelta(days=1),
+    )
+
+
+def _latest_transaction(txn):
+    # PayOSService.handle_payment_callback / TransactionService.handle_payment_success
+    return Transaction.objects.filter(bill_id=txn.bill_id).order_by("-created_at")[:1]
+
+
+def _bill_page(sort_by):
+    # BillService.get_all_bills: trang sau cursor theo từng cách sắp xếp
+    keys = BillService.SORT_KEYS[sort_by]
+
+    def build(bill):
+        values = [getattr(bill, key) for key in keys]
+        return Bill.objects.filter(BillService.keyset_filter(keys, values, "lt")).order_by(
+            *(f"-{key}" for key in keys)
+        )[:11]
+    return build
+
+
+def _bills_by_status(bill):
+    return Bill.objects.filter(status=bill.status).order_by("-created_at", "-id")[:11]
+
+
+def _bills_by_patient(bill):
+    return Bill.objects.filter(patient_id=bill.patient_id).order_by("-created_at", "-id")[:11]
+
+
+def _bills_by_day(bill):
+    day_start = timezone.make_aware(
+        datetime.combine(timezone.localdate(bill.created_at), datetime.min.time())
+    )
+    return Bill.objects.filter(
+        created_at__gte=day_start, created_at__lt=day_start + timedelta(days=1)
+    ).order_by("-created_at", "-id")[:11]
+
+
+def _due_reminders(schedule):
+    # appointments.reminders.send_due_reminders
+    now = timezone.make_aware(datetime.combine(schedule.work_date, datetime.min.time()))
+    return due_appointments(now).order_by("id")
+
+
+# (tên, queryset lấy mẫu, hàm dựng truy vấn nóng từ dòng mẫu)
+HOT_QUERIES = [
+    ("appointments_by_doctor", lambda: Appointment.objects.select_related("schedule"), _appointments_by_doctor),
+    ("appointments_by_slot", lambda: Appointment.objects.exclude(slot_start=None), _appointments_by_slot),
+    ("upcoming_by_patient", lambda: Appointment.objects.all(), _upcoming_by_patient),
+    ("schedules_by_doctor", lambda: Schedule.objects.all(), _schedules_by_doctor),
+    ("schedules_by_range", lambda: Schedule.objects.all(), _schedules_by_range),
+    ("orders_by_room", lambda: ServiceOrder.objects.exclude(order_time=None), _orders_by_room),
+    ("latest_transaction", lambda: Transaction.objects.all(), _latest_transaction),
+    ("due_reminders", lambda: Schedule.objects.all(), _due_reminders),
+    *(
+        (f"bills_sorted_by_{sort_by}", lambda: Bill.objects.all(), _bill_page(sort_by))
+        for sort_by in BillService.SORT_KEYS
+    ),
+    ("bills_by_status", lambda: Bill.objects.all(), _bills_by_status),
+    ("bills_by_patient", lambda: Bill.objects.all(), _bills_by_patient),
+    ("bills_by_day", lambda: Bill.objects.all(), _bills_by_day),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Chạy EXPLAIN cho các truy vấn nóng của tầng service trên dữ liệu hiện có "
+        "và báo lỗi nếu truy vấn nào quét tuần tự thay vì dùng index."
+    )
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"Chưa hỗ trợ kiểm tra kế hoạch truy vấn cho {connection.vendor}.")
+
+        failures = []
+        for name, sample_queryset, build in HOT_QUERIES:
+            sample = sample_queryset().order_by("id").first()
+            if sample is None:
+                self.stdout.write(f"SKIP {name}: chưa có dữ liệu mẫu")
+                continue
+
+            plan = self._explain(build(sample))
+            scanned = sorted(set(pattern.findall(plan)))
+            indexes = sorted(set(INDEX_PATTERN.findall(plan)))
+            if scanned:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"SEQ  {name}: quét toàn bảng {', '.join(scanned)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK   {name}: {', '.join(indexes) or 'primary key'}"))
+            if options["verbosity"] > 1:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f"Truy vấn quét tuần tự: {', '.join(failures)}")
+
+    @staticmethod
+    def _explain(queryset):
+        if connection.vendor != "postgresql":
+            return queryset.explain()
+        # Dữ liệu seed nhỏ khiến planner luôn chọn Seq Scan; tắt nó để hỏi
+        # xem có đường đi qua index hay không.
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            return queryset.explain()
@@ -0,0 +1,40 @@
+import time as perf_time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from appointments.reminders import send_due_reminders
+from common.constants import APPOINTMENT_REMINDER
+
+
+class Command(BaseCommand):
+    help = (
+        "Gửi thông báo nhắc lịch cho các lịch hẹn sắp diễn ra. Mỗi lịch hẹn chỉ được "
+        "nhắc một lần cho mỗi khoảng báo trước; có thể chạy định kỳ bằng cron hoặc --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lead-hours", type=int, default=APPOINTMENT_REMINDER["LEAD_HOURS"])
+        parser.add_argument("--batch-size", type=int, default=APPOINTMENT_REMINDER["BATCH_SIZE"])
+        parser.add_argument(
+            "--loop", action="store_true", help="Chạy liên tục, quét lại sau mỗi --interval giây"
+        )
+        parser.add_argument("--interval", type=float, default=APPOINTMENT_REMINDER["POLL_SECONDS"])
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            started = perf_time.perf_counter()
+            scanned, sent = send_due_reminders(
+                lead_minutes=options["lead_hours"] * 60,
+                batch_size=options["batch_size"],
+            )
+            elapsed = perf_time.perf_counter() - started
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Đã quét {scanned} lịch hẹn, nhắc {sent} trong {elapsed:.2f}s."
+                )
+            )
+            if not options["loop"]:
+                return
+            perf_time.sleep(options["interval"])
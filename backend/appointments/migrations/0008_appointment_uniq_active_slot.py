@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointments", "0007_appointment_note_alter_appointment_symptoms"),
+        ("doctors", "0007_alter_doctor_department"),
+        ("patients", "0003_patient_avatar_alter_patient_gender"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="appointment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["P", "C", "I"])),
+                fields=("schedule", "slot_start"),
+                name="uniq_active_appointment_slot",
+            ),
+        ),
+    ]
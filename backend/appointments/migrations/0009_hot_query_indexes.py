@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointments", "0008_appointment_uniq_active_slot"),
+        ("doctors", "0009_schedule_indexes"),
+        ("patients", "0003_patient_avatar_alter_patient_gender"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor", "status"], name="appt_doctor_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["schedule", "slot_start", "status"],
+                name="appt_schedule_slot_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                condition=models.Q(("status__in", ["P", "C", "I"])),
+                fields=["patient", "slot_start"],
+                name="appt_patient_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="serviceorder",
+            index=models.Index(
+                fields=["room", "status", "order_time"],
+                name="order_room_status_time_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointments", "0009_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AppointmentReminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("lead_minutes", models.PositiveIntegerField()),
+                ("claim_id", models.UUIDField()),
+                ("sent_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "appointment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reminders",
+                        to="appointments.appointment",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["claim_id"], name="appt_reminder_claim_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("appointment", "lead_minutes"),
+                        name="uniq_appointment_reminder",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointments", "0010_appointmentreminder"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AppointmentTriage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("C", "CLASSIFIED"),
+                            ("N", "NO_MATCH"),
+                            ("F", "FAILED"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("matched_symptoms", models.JSONField(blank=True, default=list)),
+                (
+                    "predicted_disease",
+                    models.CharField(blank=True, max_length=100, null=True),
+                ),
+                ("confidence", models.FloatField(blank=True, null=True)),
+                ("top_predictions", models.JSONField(blank=True, default=list)),
+                ("error", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "appointment",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="triage",
+                        to="appointments.appointment",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -2,9 +2,16 @@ from django.db import models
 from core.models import BaseModel
 from doctors.models import Doctor, Schedule, ExaminationRoom
 from patients.models import Patient
-from common.enums import AppointmentStatus, NoteType, OrderStatus, ServiceType
+from common.enums import AppointmentStatus, NoteType, OrderStatus, ServiceType, TriageStatus
 from common.constants import SERVICE_LENGTH, COMMON_LENGTH, DECIMAL_MAX_DIGITS, DECIMAL_DECIMAL_PLACES, ENUM_LENGTH
 
+# Statuses that hold a slot on the schedule
+ACTIVE_APPOINTMENT_STATUSES = [
+    AppointmentStatus.PENDING.value,
+    AppointmentStatus.CONFIRMED.value,
+    AppointmentStatus.IN_PROGRESS.value,
+]
+
 class Appointment(models.Model):
     doctor = models.ForeignKey(Doctor, on_delete=models.RESTRICT)
     patient = models.ForeignKey(Patient, on_delete=models.RESTRICT)
@@ -23,6 +30,30 @@ class Appointment(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["schedule", "slot_start"],
+                condition=models.Q(status__in=ACTIVE_APPOINTMENT_STATUSES),
+                name="uniq_active_appointment_slot",
+            ),
+        ]
+        indexes = [
+            # Danh sách theo bác sĩ lọc doctor + status rồi join Schedule(doctor, work_date)
+            models.Index(fields=["doctor", "status"], name="appt_doctor_status_idx"),
+            # Kiểm tra slot theo ca: schedule + slot_start + status
+            models.Index(
+                fields=["schedule", "slot_start", "status"],
+                name="appt_schedule_slot_status_idx",
+            ),
+            # Lịch sắp tới của bệnh nhân chỉ đọc các lịch còn hiệu lực
+            models.Index(
+                fields=["patient", "slot_start"],
+                condition=models.Q(status__in=ACTIVE_APPOINTMENT_STATUSES),
+                name="appt_patient_active_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Appointment {self.pk}"
 
@@ -64,5 +95,53 @@ class ServiceOrder(BaseModel):
     result_file_url = models.CharField(max_length=COMMON_LENGTH["URL"], blank=True, null=True)
     result_file_public_id = models.CharField(max_length=COMMON_LENGTH["PUBLIC_ID"], blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["room", "status", "order_time"], name="order_room_status_time_idx"),
+        ]
+
     def __str__(self):
         return f"Order {self.pk}"
+
+
+class AppointmentReminder(models.Model):
+    """Đánh dấu lịch hẹn đã được nhắc với một khoảng báo trước, tránh gửi trùng."""
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name="reminders")
+    lead_minutes = models.PositiveIntegerField()
+    # Lượt quét đã giành được dòng này; dùng để biết dòng nào do mình chèn
+    claim_id = models.UUIDField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["appointment", "lead_minutes"],
+                name="uniq_appointment_reminder",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["claim_id"], name="appt_reminder_claim_idx"),
+        ]
+
+    def __str__(self):
+        return f"Reminder {self.appointment_id} ({self.lead_minutes}m)"
+
+
+class AppointmentTriage(models.Model):
+    """Phân loại sơ bộ triệu chứng của lịch hẹn bởi disease-prediction-service."""
+    appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE, related_name="triage")
+    status = models.CharField(
+        max_length=ENUM_LENGTH["DEFAULT"],
+        choices=[(t.value, t.name) for t in TriageStatus]
+    )
+    # Khóa triệu chứng (tiếng Anh) nhận ra từ văn bản bệnh nhân nhập
+    matched_symptoms = models.JSONField(default=list, blank=True)
+    predicted_disease = models.CharField(max_length=COMMON_LENGTH["NAME"], blank=True, null=True)
+    confidence = models.FloatField(blank=True, null=True)
+    # [{"disease", "disease_vn", "probability"}, ...] như /api/predict trả về
+    top_predictions = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Triage {self.appointment_id}"
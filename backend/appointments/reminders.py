@@ -0,0 +1,127 @@
+"""
+Nhắc lịch khám cho bệnh nhân theo lô.
+
+Mỗi lượt quét lấy các lịch hẹn còn hiệu lực bắt đầu trong ``[now, now + lead)``
+bằng truy vấn khoảng trên ``Schedule.work_date`` (index ``schedule_date_start_idx``),
+bỏ qua lịch đã có dấu trong AppointmentReminder, rồi xử lý theo từng lô id:
+
+- Chèn dấu cho cả lô bằng một bulk_create; dòng đã tồn tại bị bỏ qua nên hai
+  lượt quét chồng nhau không nhắc trùng.
+- Gom các lịch hẹn cùng giờ khám thành một lần gọi ``NotificationService.create_many``.
+"""
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from common.constants import APPOINTMENT_REMINDER
+from common.enums import AppointmentStatus, NotificationType
+from notifications.services import NotificationService
+from .models import Appointment, AppointmentReminder
+
+# Lịch đang khám hoặc đã xong thì không cần nhắc
+REMINDABLE_STATUSES = [AppointmentStatus.PENDING.value, AppointmentStatus.CONFIRMED.value]
+
+REMINDER_TITLE = _("Nhắc lịch khám")
+
+
+def _window_filter(start, end):
+    """Điều kiện (work_date, giờ khám) nằm trong [start, end) với start, end là giờ địa phương."""
+    first_day, last_day = start.date(), end.date()
+    if first_day == last_day:
+        return Q(schedule__work_date=first_day, appointment_time__gte=start.time(),
+                 appointment_time__lt=end.time())
+    return (
+        Q(schedule__work_date=first_day, appointment_time__gte=start.time())
+        | Q(schedule__work_date__gt=first_day, schedule__work_date__lt=last_day)
+        | Q(schedule__work_date=last_day, appointment_time__lt=end.time())
+    )
+
+
+def due_appointments(now=None, lead_minutes=None):
+    """Lịch hẹn cần nhắc trong ``lead_minutes`` tới mà chưa được nhắc."""
+    lead_minutes = lead_minutes or APPOINTMENT_REMINDER["LEAD_HOURS"] * 60
+    start = timezone.localtime(now or timezone.now()).replace(tzinfo=None)
+    end = start + timedelta(minutes=lead_minutes)
+    already_sent = AppointmentReminder.objects.filter(
+        appointment_id=OuterRef("pk"), lead_minutes=lead_minutes
+    )
+    return (
+        Appointment.objects.annotate(
+            appointment_time=Coalesce("slot_start", "schedule__start_time")
+        )
+        # Điều kiện khoảng ngày riêng để planner dùng index trên Schedule.work_date
+        .filter(
+            schedule__work_date__range=(start.date(), end.date()),
+            status__in=REMINDABLE_STATUSES,
+        )
+        .filter(_window_filter(start, end))
+        .filter(~Exists(already_sent))
+    )
+
+
+def reminder_message(work_date, appointment_time):
+    return _("Bạn có lịch khám lúc %(time)s ngày %(date)s.") % {
+        "time": f"{appointment_time:%H:%M}",
+        "date": f"{work_date:%d/%m/%Y}",
+    }
+
+
+def _send_batch(rows, lead_minutes):
+    """Giành dấu nhắc cho một lô rồi gửi thông báo; trả về số lịch hẹn đã nhắc."""
+    claim_id = uuid.uuid4()
+    with transaction.atomic():
+        AppointmentReminder.objects.bulk_create(
+            [
+                AppointmentReminder(appointment_id=row["id"], lead_minutes=lead_minutes, claim_id=claim_id)
+                for row in rows
+            ],
+            ignore_conflicts=True,
+        )
+        claimed = set(
+            AppointmentReminder.objects.filter(claim_id=claim_id).values_list("appointment_id", flat=True)
+        )
+
+        groups = defaultdict(list)
+        for row in rows:
+            if row["id"] in claimed:
+                groups[(row["schedule__work_date"], row["appointment_time"])].append(row["user_id"])
+        for (work_date, appointment_time), user_ids in groups.items():
+            NotificationService.create_many(
+                user_ids,
+                REMINDER_TITLE,
+                reminder_message(work_date, appointment_time),
+                NotificationType.APPOINTMENT.value,
+            )
+    return len(claimed)
+
+
+def send_due_reminders(now=None, lead_minutes=None, batch_size=None):
+    """
+    Nhắc tất cả lịch hẹn đến hạn. Duyệt theo khóa id tăng dần để mỗi lô là một
+    truy vấn có LIMIT. Trả về (số lịch đã quét, số lịch đã nhắc).
+    """
+    lead_minutes = lead_minutes or APPOINTMENT_REMINDER["LEAD_HOURS"] * 60
+    batch_size = batch_size or APPOINTMENT_REMINDER["BATCH_SIZE"]
+    queryset = due_appointments(now, lead_minutes).annotate(
+        user_id=F("patient__user_id")
+    ).order_by("id")
+
+    scanned = sent = 0
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id).values(
+                "id", "user_id", "schedule__work_date", "appointment_time"
+            )[:batch_size]
+        )
+        if not rows:
+            return scanned, sent
+        last_id = rows[-1]["id"]
+        scanned += len(rows)
+        sent += _send_batch(rows, lead_minutes)
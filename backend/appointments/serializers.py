@@ -6,9 +6,32 @@ from .models import Appointment, AppointmentNote, ServiceOrder, Service
 from doctors.models import Schedule, Doctor, Department, ExaminationRoom
 from patients.serializers import PatientSerializer
 from common.enums import ServiceType, Gender, AppointmentStatus
-from common.constants import DECIMAL_MAX_DIGITS, DECIMAL_DECIMAL_PLACES, PAGE_NO_DEFAULT, PAGE_SIZE_DEFAULT, MIN_VALUE
+from common.constants import DECIMAL_MAX_DIGITS, DECIMAL_DECIMAL_PLACES, PAGE_NO_DEFAULT, PAGE_SIZE_DEFAULT, MIN_VALUE, AVAILABILITY_BATCH_MAX_DAYS
 from django.utils.translation import gettext_lazy as _
 from datetime import date, datetime, timedelta
+from django.db.models import Prefetch
+
+
+# Quan hệ mà ScheduleSerializer lồng bên trong đọc tới (doctorName, departmentName, room.*)
+SCHEDULE_RELATED = ('schedule__doctor', 'schedule__room__department')
+
+
+class EagerLoadingMixin:
+    """
+    Khai báo các quan hệ serializer sẽ đọc để list endpoint chạy một số query cố định,
+    không phụ thuộc số dòng trong trang.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return queryset
+
 
 class DoctorSerializer(serializers.ModelSerializer):
     fullName = serializers.SerializerMethodField()
@@ -198,6 +221,8 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
             'doctor', 'patient'
         ]
         read_only_fields = ['id']
+        # Trùng slot được chặn ở AppointmentService qua ràng buộc DB
+        validators = []
 
 
 class AppointmentUpdateSerializer(serializers.ModelSerializer):
@@ -209,6 +234,7 @@ class AppointmentUpdateSerializer(serializers.ModelSerializer):
             'id', 'doctor', 'patient', 'schedule', 'symptoms', 'note',
             'status', 'slot_start', 'slot_end'
         ]
+        validators = []
 
 
 class AppointmentNoteSerializer(serializers.ModelSerializer):
@@ -234,7 +260,27 @@ class ScheduleTimeSerializer(serializers.Serializer):
     end_time = serializers.TimeField(required=False)
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class ScheduleAvailabilityBatchSerializer(serializers.Serializer):
+    startDate = serializers.DateField(source='start_date', input_formats=['%Y-%m-%d'])
+    endDate = serializers.DateField(source='end_date', input_formats=['%Y-%m-%d'])
+    departmentId = serializers.IntegerField(required=False, source='department_id')
+    doctorIds = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False, source='doctor_ids'
+    )
+
+    def validate(self, attrs):
+        if attrs['end_date'] < attrs['start_date']:
+            raise serializers.ValidationError(_("Ngày kết thúc phải sau ngày bắt đầu."))
+        if (attrs['end_date'] - attrs['start_date']).days >= AVAILABILITY_BATCH_MAX_DAYS:
+            raise serializers.ValidationError(
+                _("Khoảng ngày không được vượt quá %(days)s ngày.") % {'days': AVAILABILITY_BATCH_MAX_DAYS}
+            )
+        if not attrs.get('department_id') and not attrs.get('doctor_ids'):
+            raise serializers.ValidationError(_("Cần chỉ định departmentId hoặc doctorIds."))
+        return attrs
+
+
+class AppointmentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     appointmentId = serializers.IntegerField(source='id', read_only=True)
     doctorId = serializers.IntegerField(source='doctor.id', read_only=True)
     patientId = serializers.IntegerField(source='patient.id', read_only=True)
@@ -249,6 +295,9 @@ class AppointmentSerializer(serializers.ModelSerializer):
     appointment_notes = AppointmentNoteSerializer(many=True, read_only=True)
     service_orders = ServiceOrderSerializer(many=True, read_only=True, source='service_order')
 
+    select_related_fields = ('doctor', 'patient__user') + SCHEDULE_RELATED
+    prefetch_related_fields = ('patient__emergencycontact_set', 'appointment_notes')
+
     class Meta:
         model = Appointment
         fields = [
@@ -270,13 +319,16 @@ class AppointmentSerializer(serializers.ModelSerializer):
         ]
 
 
-class AppointmentDetailSerializer(serializers.ModelSerializer):
+class AppointmentDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     patientInfo = PatientSerializer(source='patient', read_only=True)
     doctorInfo = DoctorSerializer(source='doctor', read_only=True)
     schedule = ScheduleSerializer()
     appointmentNotes = serializers.SerializerMethodField()
     note = serializers.CharField(read_only=True)
 
+    select_related_fields = ('doctor', 'patient__user') + SCHEDULE_RELATED
+    prefetch_related_fields = ('patient__emergencycontact_set', 'appointment_notes')
+
     class Meta:
         model = Appointment
         fields = [
@@ -286,15 +338,18 @@ class AppointmentDetailSerializer(serializers.ModelSerializer):
         ]
 
     def get_appointmentNotes(self, obj):
-        notes = AppointmentNote.objects.filter(appointment=obj)
+        notes = obj.appointment_notes.all()
         return AppointmentNoteSerializer(notes, many=True).data
 
 
-class AppointmentDoctorViewSerializer(serializers.ModelSerializer):
+class AppointmentDoctorViewSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     patientInfo = PatientSerializer(source='patient', read_only=True)
     schedule = ScheduleSerializer()
     note = serializers.CharField(read_only=True)
-    
+
+    select_related_fields = ('patient__user',) + SCHEDULE_RELATED
+    prefetch_related_fields = ('patient__emergencycontact_set',)
+
     class Meta:
         model = Appointment
         fields = [
@@ -303,7 +358,7 @@ class AppointmentDoctorViewSerializer(serializers.ModelSerializer):
         ]
 
 
-class AppointmentPatientViewSerializer(serializers.ModelSerializer):
+class AppointmentPatientViewSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     doctorInfo = DoctorSerializer(source='doctor', read_only=True)
     schedule = ScheduleSerializer()
     doctorId = serializers.IntegerField(source='doctor.id', read_only=True)
@@ -311,6 +366,14 @@ class AppointmentPatientViewSerializer(serializers.ModelSerializer):
     prescriptionId = serializers.SerializerMethodField()
     note = serializers.CharField(read_only=True)
 
+    select_related_fields = ('doctor',) + SCHEDULE_RELATED
+    prefetch_related_fields = (
+        Prefetch(
+            'prescription_set',
+            queryset=Prescription.objects.only('id', 'appointment_id').order_by('id'),
+        ),
+    )
+
     class Meta:
         model = Appointment
         fields = [
@@ -320,8 +383,9 @@ class AppointmentPatientViewSerializer(serializers.ModelSerializer):
         ]
 
     def get_prescriptionId(self, obj):
-        prescription = obj.prescription_set.first()
-        return prescription.id if prescription else None
+        # .first() sẽ order_by lại và bỏ qua cache prefetch
+        prescriptions = obj.prescription_set.all()
+        return prescriptions[0].id if prescriptions else None
 
 
 class CustomPageNumberPagination(PageNumberPagination):
@@ -346,6 +410,9 @@ class AppointmentFilterSerializer(serializers.Serializer):
     roomId = serializers.IntegerField(required=False, source='room_id')
     pageNo = serializers.IntegerField(default=PAGE_NO_DEFAULT, min_value=MIN_VALUE, source='page_no')
     pageSize = serializers.IntegerField(default=PAGE_SIZE_DEFAULT, min_value=MIN_VALUE, source='page_size')
+    # Có tham số cursor (kể cả rỗng cho trang đầu) thì dùng phân trang keyset
+    cursor = serializers.CharField(required=False, allow_blank=True)
+    withTotal = serializers.BooleanField(required=False, source='with_total')
 
 
 
@@ -353,6 +420,8 @@ class AppointmentPatientFilterSerializer(serializers.Serializer):
     pageNo = serializers.IntegerField(default=PAGE_NO_DEFAULT, min_value=MIN_VALUE, source='page_no')
     pageSize = serializers.IntegerField(default=PAGE_SIZE_DEFAULT, min_value=MIN_VALUE, source='page_size')
     status = serializers.CharField(required=False, allow_blank=True)
+    cursor = serializers.CharField(required=False, allow_blank=True)
+    withTotal = serializers.BooleanField(required=False, source='with_total')
 
 
 class CancelAppointmentRequestSerializer(serializers.Serializer):
@@ -1,23 +1,293 @@
-from datetime import datetime, date, timedelta
+import hashlib
+from datetime import datetime, date, time
+from functools import lru_cache
+from django.core.cache import cache
 from django.core.paginator import Paginator
 from django.core.files.uploadedfile import UploadedFile
 from django.core.files.storage import default_storage
 from django.shortcuts import get_object_or_404
-from django.db import transaction
-from django.db.models import Q  # Import Q object for complex queries
+from django.db import transaction, IntegrityError
+from django.db.models import Q, F, Case, When, Value, TimeField
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import Exact
 from uuid import uuid4
-from common.constants import PAGE_NO_DEFAULT, PAGE_SIZE_DEFAULT
+from common.constants import (
+    PAGE_NO_DEFAULT,
+    PAGE_SIZE_DEFAULT,
+    PAGE_COUNT_CACHE_SECONDS,
+    SCHEDULE_DEFAULTS,
+)
+from common.utils import encode_cursor, decode_cursor
 from doctors.models import Schedule, ScheduleStatus
-from .models import Appointment, AppointmentNote, ServiceOrder, Service
+from .models import (
+    Appointment,
+    AppointmentNote,
+    ServiceOrder,
+    Service,
+    ACTIVE_APPOINTMENT_STATUSES,
+)
 from .serializers import (
     ServiceOrderSerializer,
     AppointmentNoteSerializer,
     ServiceSerializer,
+    AppointmentSerializer,
+    AppointmentDoctorViewSerializer,
+    AppointmentPatientViewSerializer,
 )
 from common.enums import AppointmentStatus
+from .triage import schedule_triage
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+@lru_cache(maxsize=256)
+def _slot_labels(start_seconds, duration_seconds, count):
+    """Nhãn (slot_start, slot_end) dạng HH:MM:SS cho từng slot của một ca."""
+    labels = []
+    for index in range(count):
+        begin = (start_seconds + index * duration_seconds) % 86400
+        end = (begin + duration_seconds) % 86400
+        labels.append(
+            (
+                f"{begin // 3600:02d}:{begin % 3600 // 60:02d}:{begin % 60:02d}",
+                f"{end // 3600:02d}:{end % 3600 // 60:02d}:{end % 60:02d}",
+            )
+        )
+    return tuple(labels)
+
+
+class SlotReservationService:
+    """
+    Giữ chỗ trên Schedule bằng một câu UPDATE có điều kiện, không đọc-sửa-ghi
+    trong Python. Slot đã đặt được đánh dấu trong Schedule.booked_slots (bit i
+    ứng với slot thứ i); ràng buộc uniq_active_appointment_slot trên
+    Appointment vẫn là chốt chặn cuối cùng.
+    """
+
+    @staticmethod
+    def slot_count(schedule):
+        duration = schedule.default_appointment_duration_minutes * 60
+        if duration <= 0:
+            return 0
+        span = _seconds(schedule.end_time) - _seconds(schedule.start_time)
+        return max(0, span // duration)
+
+    @staticmethod
+    def slot_index(schedule, slot_start):
+        """Vị trí của slot_start trong ca, None nếu không khớp lưới slot."""
+        if slot_start is None:
+            return None
+        duration = schedule.default_appointment_duration_minutes * 60
+        delta = _seconds(slot_start) - _seconds(schedule.start_time)
+        if duration <= 0 or delta < 0 or delta % duration:
+            return None
+        index = delta // duration
+        if index >= SlotReservationService.slot_count(schedule):
+            return None
+        return index
+
+    @staticmethod
+    def _bit(schedule, slot_start):
+        if SlotReservationService.slot_count(schedule) > SCHEDULE_DEFAULTS["BITMAP_SLOTS"]:
+            return None
+        index = SlotReservationService.slot_index(schedule, slot_start)
+        return None if index is None else 1 << index
+
+    @staticmethod
+    def reserve(schedule, slot_start=None):
+        """
+        Tăng current_patients và bật bit của slot nếu còn chỗ và slot còn trống.
+        Trả về False khi không giữ được chỗ.
+        """
+        queryset = Schedule.objects.filter(
+            id=schedule.id,
+            current_patients__lt=F("max_patients"),
+        )
+        changes = {
+            "current_patients": F("current_patients") + 1,
+            # Vế phải của UPDATE đọc giá trị cũ của hàng
+            "status": Case(
+                When(
+                    current_patients__gte=F("max_patients") - 1,
+                    then=Value(ScheduleStatus.FULL.value),
+                ),
+                default=F("status"),
+            ),
+        }
+        bit = SlotReservationService._bit(schedule, slot_start)
+        if bit is not None:
+            queryset = queryset.filter(Exact(F("booked_slots").bitand(bit), 0))
+            changes["booked_slots"] = F("booked_slots").bitor(bit)
+        return queryset.update(**changes) == 1
+
+    @staticmethod
+    def release(schedule, slot_start=None):
+        """Giảm current_patients (không xuống dưới 0), tắt bit của slot và mở lại lịch."""
+        changes = {
+            "current_patients": Case(
+                When(current_patients__gt=0, then=F("current_patients") - 1),
+                default=F("current_patients"),
+            ),
+            "status": Case(
+                When(
+                    current_patients__lte=F("max_patients"),
+                    then=Value(ScheduleStatus.AVAILABLE.value),
+                ),
+                default=F("status"),
+            ),
+        }
+        bit = SlotReservationService._bit(schedule, slot_start)
+        if bit is not None:
+            changes["booked_slots"] = F("booked_slots").bitand(~bit)
+        Schedule.objects.filter(id=schedule.id).update(**changes)
+
+    @staticmethod
+    def rebuild_bitmap(schedule):
+        """Tính lại booked_slots từ các lịch hẹn còn hiệu lực."""
+        bitmap = 0
+        if SlotReservationService.slot_count(schedule) <= SCHEDULE_DEFAULTS["BITMAP_SLOTS"]:
+            slot_starts = Appointment.objects.filter(
+                schedule_id=schedule.id,
+                status__in=ACTIVE_APPOINTMENT_STATUSES,
+            ).values_list("slot_start", flat=True)
+            for slot_start in slot_starts:
+                bit = SlotReservationService._bit(schedule, slot_start)
+                if bit is not None:
+                    bitmap |= bit
+        Schedule.objects.filter(id=schedule.id).update(booked_slots=bitmap)
+        schedule.booked_slots = bitmap
+        return bitmap
+
+    @staticmethod
+    def bitmap_from_slot_starts(schedule, slot_starts):
+        """Dựng bitmap (không giới hạn số bit) từ danh sách slot_start đã đặt."""
+        bitmap = 0
+        for slot_start in slot_starts:
+            index = SlotReservationService.slot_index(schedule, slot_start)
+            if index is not None:
+                bitmap |= 1 << index
+        return bitmap
+
+    @staticmethod
+    def expand_slots(schedule, bitmap):
+        labels = _slot_labels(
+            _seconds(schedule.start_time),
+            schedule.default_appointment_duration_minutes * 60,
+            SlotReservationService.slot_count(schedule),
+        )
+        return [
+            {
+                "slot_start": slot_start,
+                "slot_end": slot_end,
+                "available": not (bitmap >> index) & 1,
+            }
+            for index, (slot_start, slot_end) in enumerate(labels)
+        ]
+
+    @staticmethod
+    def raise_rejected(schedule):
+        """Báo lỗi phù hợp khi reserve() không giữ được chỗ."""
+        if Schedule.objects.filter(
+            id=schedule.id, current_patients__lt=F("max_patients")
+        ).exists():
+            raise ValueError("Slot thời gian này đã có người đặt.")
+        raise ValueError("Lịch khám đã đầy, không thể đặt thêm cuộc hẹn.")
+
+    @staticmethod
+    def book(data):
+        with transaction.atomic():
+            schedule = data["schedule"]
+
+            if not SlotReservationService.reserve(schedule, data["slot_start"]):
+                SlotReservationService.raise_rejected(schedule)
+
+            try:
+                with transaction.atomic():
+                    appointment = Appointment.objects.create(
+                        doctor=data["doctor"],
+                        patient=data["patient"],
+                        schedule=schedule,
+                        symptoms=data["symptoms"],
+                        note=data.get("note", ""),
+                        slot_start=data["slot_start"],
+                        slot_end=data["slot_end"],
+                        status=AppointmentStatus.PENDING.value,
+                    )
+            except IntegrityError:
+                # Rời khỏi khối atomic ngoài sẽ hoàn tác phần giữ chỗ ở trên
+                raise ValueError("Slot thời gian này đã có người đặt.")
+
+            schedule.refresh_from_db(
+                fields=["current_patients", "status", "booked_slots"]
+            )
+            return appointment
 
 
 class AppointmentService:
+    CURSOR_SALT = "appointments.cursor"
+
+    @staticmethod
+    def _cached_count(queryset):
+        key = "appointments:count:" + hashlib.sha1(
+            str(queryset.order_by().query).encode()
+        ).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, PAGE_COUNT_CACHE_SECONDS)
+        return count
+
+    @staticmethod
+    def _paginate_by_cursor(queryset, cursor, page_size, descending=False, with_total=False):
+        """
+        Phân trang keyset theo (schedule__work_date, slot_start, id): không
+        OFFSET, không COUNT(*) trừ khi with_total, khi đó số lượng được cache.
+        """
+        queryset = queryset.annotate(
+            date_key=F("schedule__work_date"),
+            slot_key=Coalesce("slot_start", Value(time.min), output_field=TimeField()),
+        )
+        total = AppointmentService._cached_count(queryset) if with_total else None
+
+        if cursor:
+            work_date, slot_key, last_id = decode_cursor(
+                cursor, AppointmentService.CURSOR_SALT
+            )
+            work_date = date.fromisoformat(work_date)
+            slot_key = time.fromisoformat(slot_key)
+            op = "lt" if descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"date_key__{op}": work_date})
+                | Q(date_key=work_date, **{f"slot_key__{op}": slot_key})
+                | Q(date_key=work_date, slot_key=slot_key, **{f"id__{op}": last_id})
+            )
+
+        prefix = "-" if descending else ""
+        rows = list(
+            queryset.order_by(
+                f"{prefix}date_key", f"{prefix}slot_key", f"{prefix}id"
+            )[: page_size + 1]
+        )
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        next_cursor = None
+        if has_next:
+            tail = rows[-1]
+            next_cursor = encode_cursor(
+                [tail.date_key.isoformat(), tail.slot_key.isoformat(), tail.id],
+                AppointmentService.CURSOR_SALT,
+            )
+
+        return {
+            "results": rows,
+            "pageSize": page_size,
+            "totalElements": total,
+            "nextCursor": next_cursor,
+            "last": not has_next,
+        }
 
     @staticmethod
     def get_appointments_by_doctor_id_optimized(
@@ -28,8 +298,12 @@ class AppointmentService:
         room_id=None,
         page_no=PAGE_NO_DEFAULT,
         page_size=PAGE_SIZE_DEFAULT,
+        cursor=None,
+        with_total=False,
     ):
-        qs = Appointment.objects.filter(doctor_id=doctor_id)
+        qs = AppointmentDoctorViewSerializer.setup_eager_loading(
+            Appointment.objects.filter(doctor_id=doctor_id)
+        )
 
         if shift:
             qs = qs.filter(schedule__shift=shift)
@@ -43,6 +317,11 @@ class AppointmentService:
         if room_id:
             qs = qs.filter(schedule__room_id=room_id)
 
+        if cursor is not None:
+            return AppointmentService._paginate_by_cursor(
+                qs, cursor, page_size, with_total=with_total
+            )
+
         paginator = Paginator(qs.order_by("schedule__start_time"), page_size)
         page = paginator.get_page(page_no + 1)
 
@@ -63,11 +342,11 @@ class AppointmentService:
         appointment_type="all",
         appointment_status=None,
         current_datetime=None,
+        cursor=None,
+        with_total=False,
     ):
-        queryset = (
+        queryset = AppointmentPatientViewSerializer.setup_eager_loading(
             Appointment.objects.filter(patient_id=patient_id)
-            .select_related("doctor", "schedule")
-            .prefetch_related("prescription_set")
         )
 
         if current_datetime is None:
@@ -114,6 +393,16 @@ class AppointmentService:
                     queryset = queryset.filter(status=appointment_status)
             queryset = queryset.order_by("-created_at")
 
+        if cursor is not None:
+            # "upcoming" đi xuôi theo thời gian, các loại còn lại đi ngược
+            return AppointmentService._paginate_by_cursor(
+                queryset,
+                cursor,
+                page_size,
+                descending=appointment_type != "upcoming",
+                with_total=with_total,
+            )
+
         paginator = Paginator(queryset, page_size)
         page = paginator.get_page(page_no + 1)
 
@@ -160,9 +449,9 @@ class AppointmentService:
 
     @staticmethod
     def get_appointments_by_schedule_ordered(schedule_id):
-        return Appointment.objects.filter(schedule_id=schedule_id).order_by(
-            "slot_start"
-        )
+        return AppointmentSerializer.setup_eager_loading(
+            Appointment.objects.filter(schedule_id=schedule_id)
+        ).order_by("slot_start")
 
     @staticmethod
     def get_appointments_by_doctor_and_schedules(
@@ -177,166 +466,155 @@ class AppointmentService:
     @staticmethod
     def get_available_time_slots(schedule_id):
         schedule = get_object_or_404(Schedule, id=schedule_id)
-        schedule_start_dt = datetime.combine(schedule.work_date, schedule.start_time)
-        schedule_end_dt = datetime.combine(schedule.work_date, schedule.end_time)
-        total_duration_minutes = (
-            schedule_end_dt - schedule_start_dt
-        ).total_seconds() / 60
-        max_appointments_by_time = int(
-            total_duration_minutes / schedule.default_appointment_duration_minutes
-        )
-        effective_max_patients = min(schedule.max_patients, max_appointments_by_time)
-
-        booked_appointments = Appointment.objects.filter(
-            schedule_id=schedule_id,
-            status__in=[
-                AppointmentStatus.PENDING.value,
-                AppointmentStatus.CONFIRMED.value,
-                AppointmentStatus.IN_PROGRESS.value,
-            ],
-        ).values_list("slot_start", flat=True)
-
-        booked_slots_set = set(booked_appointments)
-
-        available_slots = []
-        current_slot_start_dt = schedule_start_dt
-
-        while (
-            current_slot_start_dt
-            + timedelta(minutes=schedule.default_appointment_duration_minutes)
-            <= schedule_end_dt
-        ):
-            slot_start_time = current_slot_start_dt.time()
-            slot_end_time = (
-                current_slot_start_dt
-                + timedelta(minutes=schedule.default_appointment_duration_minutes)
-            ).time()
-
-            is_booked = slot_start_time in booked_slots_set
-
-            available_slots.append(
-                {
-                    "slot_start": slot_start_time.strftime("%H:%M:%S"),
-                    "slot_end": slot_end_time.strftime("%H:%M:%S"),
-                    "available": not is_booked,
-                }
-            )
 
-            current_slot_start_dt += timedelta(
-                minutes=schedule.default_appointment_duration_minutes
+        if SlotReservationService.slot_count(schedule) <= SCHEDULE_DEFAULTS["BITMAP_SLOTS"]:
+            bitmap = schedule.booked_slots
+        else:
+            # Ca quá dài để lưu trong booked_slots: đọc trực tiếp từ Appointment
+            booked_appointments = Appointment.objects.filter(
+                schedule_id=schedule_id,
+                status__in=ACTIVE_APPOINTMENT_STATUSES,
+            ).values_list("slot_start", flat=True)
+            bitmap = SlotReservationService.bitmap_from_slot_starts(
+                schedule, booked_appointments
             )
 
-        return available_slots
+        return SlotReservationService.expand_slots(schedule, bitmap)
+
+    @staticmethod
+    def iter_available_time_slots(
+        start_date, end_date, department_id=None, doctor_ids=None, chunk_size=500
+    ):
+        """
+        Sinh lần lượt danh sách slot của mọi ca trong khoảng ngày, theo khoa
+        và/hoặc danh sách bác sĩ, bằng một truy vấn Schedule đọc theo chunk.
+        """
+        schedules = Schedule.objects.filter(work_date__range=(start_date, end_date))
+        if department_id:
+            schedules = schedules.filter(doctor__department_id=department_id)
+        if doctor_ids:
+            schedules = schedules.filter(doctor_id__in=doctor_ids)
+        schedules = schedules.only(
+            "id",
+            "doctor_id",
+            "room_id",
+            "work_date",
+            "shift",
+            "start_time",
+            "end_time",
+            "default_appointment_duration_minutes",
+            "booked_slots",
+        ).order_by("work_date", "start_time", "id")
+
+        chunk = []
+        for schedule in schedules.iterator(chunk_size=chunk_size):
+            chunk.append(schedule)
+            if len(chunk) == chunk_size:
+                yield from AppointmentService._expand_schedule_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from AppointmentService._expand_schedule_chunk(chunk)
+
+    @staticmethod
+    def _expand_schedule_chunk(schedules):
+        # Chỉ các ca quá dài cho booked_slots mới cần đọc Appointment, gộp một truy vấn
+        long_ids = [
+            schedule.id
+            for schedule in schedules
+            if SlotReservationService.slot_count(schedule) > SCHEDULE_DEFAULTS["BITMAP_SLOTS"]
+        ]
+        booked = {}
+        if long_ids:
+            rows = Appointment.objects.filter(
+                schedule_id__in=long_ids,
+                status__in=ACTIVE_APPOINTMENT_STATUSES,
+            ).values_list("schedule_id", "slot_start")
+            for schedule_id, slot_start in rows:
+                booked.setdefault(schedule_id, []).append(slot_start)
+
+        for schedule in schedules:
+            if schedule.id in booked:
+                bitmap = SlotReservationService.bitmap_from_slot_starts(
+                    schedule, booked[schedule.id]
+                )
+            else:
+                bitmap = schedule.booked_slots
+            yield {
+                "scheduleId": schedule.id,
+                "doctorId": schedule.doctor_id,
+                "roomId": schedule.room_id,
+                "workDate": schedule.work_date.isoformat(),
+                "shift": schedule.shift,
+                "slots": SlotReservationService.expand_slots(schedule, bitmap),
+            }
 
     @staticmethod
     def create_appointment(data):
-        with transaction.atomic():
-            schedule = data["schedule"]
+        appointment = SlotReservationService.book(data)
+        # Gọi dịch vụ dự đoán ở nền sau commit, không chờ trong request
+        schedule_triage(appointment)
+        return appointment
 
-            if schedule.current_patients >= schedule.max_patients:
-                raise ValueError("Lịch khám đã đầy, không thể đặt thêm cuộc hẹn.")
+    @staticmethod
+    def update_appointment(appointment_id, data):
+        with transaction.atomic():
+            appointment = get_object_or_404(
+                Appointment.objects.select_for_update().select_related("schedule"),
+                id=appointment_id,
+            )
 
-            existing_appointments_in_slot = Appointment.objects.filter(
-                schedule=schedule,
-                slot_start=data["slot_start"],
-                status__in=[
-                    AppointmentStatus.PENDING.value,
-                    AppointmentStatus.CONFIRMED.value,
-                    AppointmentStatus.IN_PROGRESS.value,
-                ],
-            ).count()
+            # Save old slot for transition logic
+            old_schedule = appointment.schedule
+            old_slot_start = appointment.slot_start
+            was_active = appointment.status in ACTIVE_APPOINTMENT_STATUSES
 
-            if existing_appointments_in_slot > 0:
-                raise ValueError("Slot thời gian này đã có người đặt.")
+            # Update all fields provided in data
+            for field, value in data.items():
+                if hasattr(appointment, field):
+                    setattr(appointment, field, value)
 
-            appointment = Appointment.objects.create(
-                doctor=data["doctor"],
-                patient=data["patient"],
-                schedule=schedule,
-                symptoms=data["symptoms"],
-                note=data.get("note", ""),
-                slot_start=data["slot_start"],
-                slot_end=data["slot_end"],
-                status=AppointmentStatus.PENDING.value,
+            is_active = appointment.status in ACTIVE_APPOINTMENT_STATUSES
+            slot_changed = (
+                appointment.schedule_id != old_schedule.id
+                or appointment.slot_start != old_slot_start
             )
 
-            schedule.current_patients += 1
-            if schedule.current_patients >= schedule.max_patients:
-                schedule.status = ScheduleStatus.FULL.value
-            schedule.save()
-
+            # Free the old slot when leaving it or when the appointment is no longer active
+            if was_active and (not is_active or slot_changed):
+                SlotReservationService.release(old_schedule, old_slot_start)
+            # Take the new slot when (re)activating or moving to another slot
+            if is_active and (not was_active or slot_changed):
+                if not SlotReservationService.reserve(
+                    appointment.schedule, appointment.slot_start
+                ):
+                    SlotReservationService.raise_rejected(appointment.schedule)
+
+            try:
+                with transaction.atomic():
+                    appointment.save()
+            except IntegrityError:
+                raise ValueError("Slot thời gian này đã có người đặt.")
             return appointment
 
     @staticmethod
-    def update_appointment(appointment_id, data):
-        appointment = get_object_or_404(Appointment, id=appointment_id)
-
-        # Save old status for transition logic
-        old_status = appointment.status
-        new_status = data.get("status", old_status)
-
-        # Update all fields provided in data
-        for field, value in data.items():
-            if hasattr(appointment, field):
-                setattr(appointment, field, value)
-
-        # Custom logic for status transitions
-        if old_status != new_status:
-            schedule = appointment.schedule
-            # If moving from active to completed/cancelled/no_show, decrement current_patients
-            if old_status in [
-                AppointmentStatus.PENDING.value,
-                AppointmentStatus.CONFIRMED.value,
-                AppointmentStatus.IN_PROGRESS.value,
-            ] and new_status in [
+    def cancel_appointment(appointment_id):
+        with transaction.atomic():
+            appointment = get_object_or_404(
+                Appointment.objects.select_for_update().select_related("schedule"),
+                id=appointment_id,
+            )
+
+            if appointment.status in [
                 AppointmentStatus.CANCELLED.value,
-                AppointmentStatus.NO_SHOW.value,
                 AppointmentStatus.COMPLETED.value,
-            ]:
-                if schedule.current_patients > 0:
-                    schedule.current_patients -= 1
-                if schedule.current_patients < schedule.max_patients:
-                    schedule.status = ScheduleStatus.AVAILABLE.value
-                schedule.save()
-            # If moving from cancelled/no_show to active, increment current_patients
-            elif old_status in [
-                AppointmentStatus.CANCELLED.value,
                 AppointmentStatus.NO_SHOW.value,
-            ] and new_status in [
-                AppointmentStatus.PENDING.value,
-                AppointmentStatus.CONFIRMED.value,
-                AppointmentStatus.IN_PROGRESS.value,
             ]:
-                if schedule.current_patients < schedule.max_patients:
-                    schedule.current_patients += 1
-                if schedule.current_patients >= schedule.max_patients:
-                    schedule.status = ScheduleStatus.FULL.value
-                schedule.save()
-
-        appointment.save()
-        return appointment
-
-    @staticmethod
-    def cancel_appointment(appointment_id):
-        appointment = get_object_or_404(Appointment, id=appointment_id)
-
-        if appointment.status in [
-            AppointmentStatus.CANCELLED.value,
-            AppointmentStatus.COMPLETED.value,
-            AppointmentStatus.NO_SHOW.value,
-        ]:
-            raise ValueError("Cuộc hẹn này đã được hủy hoặc hoàn thành.")
+                raise ValueError("Cuộc hẹn này đã được hủy hoặc hoàn thành.")
 
-        with transaction.atomic():
             appointment.status = AppointmentStatus.CANCELLED.value
             appointment.save()
 
-            schedule = appointment.schedule
-            if schedule.current_patients > 0:
-                schedule.current_patients -= 1
-            if schedule.current_patients < schedule.max_patients:
-                schedule.status = ScheduleStatus.AVAILABLE.value
-            schedule.save()
+            SlotReservationService.release(appointment.schedule, appointment.slot_start)
 
             return appointment
 
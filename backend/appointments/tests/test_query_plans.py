@@ -0,0 +1,118 @@
+from io import StringIO
+from datetime import date, time, datetime
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from appointments.models import Appointment, Service, ServiceOrder
+from doctors.models import Doctor, Department, Schedule, ExaminationRoom
+from patients.models import Patient
+from payments.models import Bill, Transaction
+from users.models import User
+from common.enums import (
+    AppointmentStatus, OrderStatus, ServiceType, Gender, AcademicDegree, DoctorType,
+    RoomType, Shift, UserRole, PaymentStatus, PaymentMethod, TransactionStatus,
+)
+
+
+class CheckQueryPlansTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email='plans@example.com', password='testpass123', role=UserRole.PATIENT.value
+        )
+        patient = Patient.objects.create(
+            user=user,
+            first_name='Test',
+            last_name='Patient',
+            identity_number='111222333',
+            insurance_number='INS123456',
+            birthday=date(1990, 1, 1),
+            gender=Gender.FEMALE.value
+        )
+        department = Department.objects.create(department_name="Cardiology")
+        doctor = Doctor.objects.create(
+            user=user,
+            first_name="John",
+            last_name="Doe",
+            identity_number="123456789",
+            birthday=date(1980, 1, 1),
+            gender=Gender.MALE.value,
+            academic_degree=AcademicDegree.BS_CKI.value,
+            specialization="Cardiologist",
+            type=DoctorType.EXAMINATION.value,
+            department=department,
+            price=100.00
+        )
+        room = ExaminationRoom.objects.create(
+            department=department, type=RoomType.EXAMINATION.value, building="A", floor=1
+        )
+        schedule = Schedule.objects.create(
+            doctor=doctor,
+            room=room,
+            work_date=date(2025, 8, 26),
+            start_time=time(8, 0),
+            end_time=time(12, 0),
+            shift=Shift.MORNING.value,
+        )
+        appointment = Appointment.objects.create(
+            doctor=doctor,
+            patient=patient,
+            schedule=schedule,
+            slot_start=time(8, 0),
+            slot_end=time(8, 30),
+            status=AppointmentStatus.CONFIRMED.value
+        )
+        service = Service.objects.create(
+            service_name="Blood Test", service_type=ServiceType.TEST.value, price=50.00
+        )
+        ServiceOrder.objects.create(
+            appointment=appointment,
+            room=room,
+            service=service,
+            status=OrderStatus.ORDERED.value,
+            order_time=timezone.make_aware(datetime(2025, 8, 26, 9, 0))
+        )
+        bill = Bill.objects.create(
+            appointment=appointment,
+            patient=patient,
+            total_cost=150.00,
+            amount=150.00,
+            status=PaymentStatus.UNPAID.value
+        )
+        Transaction.objects.create(
+            bill=bill,
+            amount=150.00,
+            payment_method=PaymentMethod.CASH.value,
+            transaction_date=timezone.now(),
+            status=TransactionStatus.PENDING.value
+        )
+
+    def _run(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        return out.getvalue()
+
+    def test_hot_queries_do_not_scan(self):
+        output = self._run()
+        self.assertNotIn('SEQ', output)
+        self.assertNotIn('SKIP', output)
+
+    def test_composite_indexes_are_chosen(self):
+        output = self._run()
+        for name, index in [
+            ('appointments_by_slot', 'appt_schedule_slot_status_idx'),
+            ('schedules_by_doctor', 'schedule_doctor_date_idx'),
+            ('schedules_by_range', 'schedule_date_start_idx'),
+            ('orders_by_room', 'order_room_status_time_idx'),
+            ('latest_transaction', 'txn_bill_created_idx'),
+            ('due_reminders', 'schedule_date_start_idx'),
+            ('bills_sorted_by_created_at', 'bill_created_idx'),
+            ('bills_sorted_by_status', 'bill_status_created_idx'),
+            ('bills_sorted_by_amount', 'bill_amount_idx'),
+            ('bills_sorted_by_total_cost', 'bill_total_cost_idx'),
+            ('bills_by_status', 'bill_status_created_idx'),
+            ('bills_by_patient', 'bill_patient_created_idx'),
+            ('bills_by_day', 'bill_created_idx'),
+        ]:
+            line = next(line for line in output.splitlines() if f' {name}:' in line)
+            self.assertIn(index, line)
@@ -0,0 +1,161 @@
+import uuid
+from datetime import date, time, datetime
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from appointments.models import Appointment, AppointmentReminder
+from appointments.reminders import send_due_reminders, reminder_message
+from doctors.models import Doctor, Department, Schedule, ExaminationRoom
+from notifications.models import Notification
+from patients.models import Patient
+from users.models import User
+from common.enums import (
+    AppointmentStatus, Gender, AcademicDegree, DoctorType, RoomType, Shift, UserRole, NotificationType,
+)
+
+# 10:00 ngày 25/08/2025; lịch khám cần nhắc nằm trong 24 giờ tới
+NOW = timezone.make_aware(datetime(2025, 8, 25, 10, 0))
+
+
+@override_settings(FCM_PUSH_WORKERS=0)
+class AppointmentReminderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = User.objects.create_user(
+            email='doctor@example.com', password='testpass123', role=UserRole.DOCTOR.value
+        )
+        department = Department.objects.create(department_name="Cardiology")
+        cls.doctor = Doctor.objects.create(
+            user=doctor_user,
+            first_name="John",
+            last_name="Doe",
+            identity_number="123456789",
+            birthday=date(1980, 1, 1),
+            gender=Gender.MALE.value,
+            academic_degree=AcademicDegree.BS_CKI.value,
+            specialization="Cardiologist",
+            type=DoctorType.EXAMINATION.value,
+            department=department,
+        )
+        cls.room = ExaminationRoom.objects.create(
+            department=department, type=RoomType.EXAMINATION.value, building="A", floor=1
+        )
+        cls.patients = []
+        for i in range(4):
+            user = User.objects.create_user(
+                email=f'patient{i}@example.com', password='testpass123', role=UserRole.PATIENT.value
+            )
+            cls.patients.append(Patient.objects.create(
+                user=user,
+                first_name='Test',
+                last_name=f'Patient {i}',
+                identity_number=f'11122233{i}',
+                insurance_number=f'INS12345{i}',
+                birthday=date(1990, 1, 1),
+                gender=Gender.FEMALE.value,
+            ))
+
+    def _appointment(self, patient, work_date, slot_start, status=AppointmentStatus.CONFIRMED.value):
+        schedule = Schedule.objects.create(
+            doctor=self.doctor,
+            room=self.room,
+            work_date=work_date,
+            start_time=time(7, 0),
+            end_time=time(17, 0),
+            shift=Shift.MORNING.value,
+        )
+        return Appointment.objects.create(
+            doctor=self.doctor,
+            patient=patient,
+            schedule=schedule,
+            slot_start=slot_start,
+            slot_end=slot_start,
+            status=status,
+        )
+
+    def _send(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return send_due_reminders(now=NOW, **kwargs)
+
+    def test_only_appointments_in_window_are_reminded(self):
+        later_today = self._appointment(self.patients[0], date(2025, 8, 25), time(14, 0))
+        tomorrow_morning = self._appointment(self.patients[1], date(2025, 8, 26), time(9, 30))
+        self._appointment(self.patients[2], date(2025, 8, 25), time(9, 0))  # đã qua
+        self._appointment(self.patients[2], date(2025, 8, 26), time(10, 0))  # ngoài 24 giờ
+        self._appointment(self.patients[3], date(2025, 8, 25), time(15, 0), AppointmentStatus.CANCELLED.value)
+
+        self.assertEqual(self._send(), (2, 2))
+        self.assertEqual(
+            set(AppointmentReminder.objects.values_list('appointment_id', flat=True)),
+            {later_today.id, tomorrow_morning.id},
+        )
+        notification = Notification.objects.get(user=self.patients[1].user)
+        self.assertEqual(notification.type, NotificationType.APPOINTMENT.value)
+        self.assertEqual(notification.message, reminder_message(date(2025, 8, 26), time(9, 30)))
+
+    def test_falls_back_to_schedule_start_time(self):
+        appointment = self._appointment(self.patients[0], date(2025, 8, 26), None)
+        self.assertEqual(self._send(), (1, 1))
+        self.assertEqual(
+            Notification.objects.get().message,
+            reminder_message(appointment.schedule.work_date, time(7, 0)),
+        )
+
+    def test_rerun_does_not_remind_twice(self):
+        self._appointment(self.patients[0], date(2025, 8, 25), time(14, 0))
+        self.assertEqual(self._send(), (1, 1))
+        self.assertEqual(self._send(), (0, 0))
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_concurrently_claimed_rows_are_skipped(self):
+        first = self._appointment(self.patients[0], date(2025, 8, 25), time(14, 0))
+        self._appointment(self.patients[1], date(2025, 8, 25), time(15, 0))
+        original = AppointmentReminder.objects.bulk_create
+
+        def race(objs, **kwargs):
+            # Một lượt quét khác vừa giành lịch hẹn đầu tiên
+            AppointmentReminder.objects.create(
+                appointment=first, lead_minutes=objs[0].lead_minutes, claim_id=uuid.uuid4()
+            )
+            return original(objs, **kwargs)
+
+        with patch.object(AppointmentReminder.objects, 'bulk_create', side_effect=race):
+            self.assertEqual(self._send(), (2, 1))
+        self.assertFalse(Notification.objects.filter(user=self.patients[0].user).exists())
+
+    def test_same_time_slot_is_one_notification_call(self):
+        for patient in self.patients:
+            self._appointment(patient, date(2025, 8, 26), time(8, 0))
+        with patch('appointments.reminders.NotificationService.create_many') as create_many:
+            self._send()
+        create_many.assert_called_once()
+        self.assertEqual(len(create_many.call_args.args[0]), len(self.patients))
+
+    def test_query_count_does_not_grow_with_appointments(self):
+        def count(extra):
+            AppointmentReminder.objects.all().delete()
+            for i in range(extra):
+                self._appointment(self.patients[i % 4], date(2025, 8, 26), time(8, 0))
+            with CaptureQueriesContext(connection) as ctx:
+                self._send()
+            return len(ctx)
+
+        self.assertEqual(count(1), count(5))
+
+    def test_batches_cover_every_appointment(self):
+        for i in range(5):
+            self._appointment(self.patients[i % 4], date(2025, 8, 26), time(8, i))
+        self.assertEqual(self._send(batch_size=2), (5, 5))
+        self.assertEqual(AppointmentReminder.objects.count(), 5)
+
+    def test_command_reports_counts(self):
+        self._appointment(self.patients[0], date(2025, 8, 25), time(14, 0))
+        out = StringIO()
+        with patch('appointments.reminders.timezone.now', return_value=NOW), \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command('send_appointment_reminders', stdout=out)
+        self.assertIn('Đã quét 1 lịch hẹn, nhắc 1', out.getvalue())
@@ -2,7 +2,7 @@ from django.test import TestCase
 from django.utils import timezone
 from datetime import date, time, datetime, timedelta
 from unittest.mock import patch
-from appointments.services import AppointmentService, AppointmentNoteService, ServiceOrderService, ServicesService
+from appointments.services import AppointmentService, AppointmentNoteService, ServiceOrderService, ServicesService, SlotReservationService
 from appointments.models import Appointment, AppointmentNote, Service, ServiceOrder
 from doctors.models import Doctor, Department, Schedule, ExaminationRoom
 from patients.models import Patient
@@ -10,6 +10,7 @@ from users.models import User
 from common.enums import AppointmentStatus, NoteType, OrderStatus, ServiceType, Gender, AcademicDegree, DoctorType, RoomType, Shift, UserRole
 from common.constants import PAGE_NO_DEFAULT, PAGE_SIZE_DEFAULT, SCHEDULE_DEFAULTS, DECIMAL_MAX_DIGITS, DECIMAL_DECIMAL_PLACES
 from django.core.files.uploadedfile import UploadedFile
+from rest_framework.exceptions import ValidationError
 
 class AppointmentServiceTest(TestCase):
     @classmethod
@@ -70,6 +71,7 @@ class AppointmentServiceTest(TestCase):
             slot_end=time(8, 30),
             status=AppointmentStatus.CONFIRMED.value
         )
+        SlotReservationService.rebuild_bitmap(cls.schedule)
 
     def test_get_appointments_by_doctor_id_optimized(self):
         result = AppointmentService.get_appointments_by_doctor_id_optimized(
@@ -198,6 +200,225 @@ class AppointmentServiceTest(TestCase):
         with self.assertRaises(ValueError):
             AppointmentService.cancel_appointment(self.appointment.id)
 
+class SlotReservationServiceTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reserve@example.com',
+            password='testpass123',
+            role=UserRole.PATIENT.value
+        )
+        cls.patient = Patient.objects.create(
+            user=cls.user,
+            first_name='Test',
+            last_name='Patient',
+            identity_number='444555666',
+            insurance_number='INS654321',
+            birthday=date(1990, 1, 1),
+            gender=Gender.FEMALE.value
+        )
+        cls.department = Department.objects.create(department_name="Cardiology")
+        cls.doctor = Doctor.objects.create(
+            user=cls.user,
+            first_name="John",
+            last_name="Doe",
+            identity_number="987654321",
+            birthday=date(1980, 1, 1),
+            gender=Gender.MALE.value,
+            academic_degree=AcademicDegree.BS_CKI.value,
+            specialization="Cardiologist",
+            type=DoctorType.EXAMINATION.value,
+            department=cls.department,
+            price=100.00
+        )
+        cls.room = ExaminationRoom.objects.create(
+            department=cls.department,
+            type=RoomType.EXAMINATION.value,
+            building="A",
+            floor=1
+        )
+        cls.schedule = Schedule.objects.create(
+            doctor=cls.doctor,
+            room=cls.room,
+            work_date=date(2025, 8, 26),
+            start_time=time(8, 0),
+            end_time=time(12, 0),
+            shift=Shift.MORNING.value,
+            max_patients=2,
+            current_patients=0,
+            status="AVAILABLE",
+            default_appointment_duration_minutes=30
+        )
+
+    def _data(self, slot_start, slot_end):
+        return {
+            'doctor': self.doctor,
+            'patient': self.patient,
+            'schedule': self.schedule,
+            'symptoms': "Headache",
+            'slot_start': slot_start,
+            'slot_end': slot_end
+        }
+
+    def test_reserve_until_full(self):
+        self.assertTrue(SlotReservationService.reserve(self.schedule, time(8, 0)))
+        self.assertTrue(SlotReservationService.reserve(self.schedule, time(8, 30)))
+        self.assertFalse(SlotReservationService.reserve(self.schedule, time(9, 0)))
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.current_patients, 2)
+        self.assertEqual(self.schedule.status, "FULL")
+        self.assertEqual(self.schedule.booked_slots, 0b11)
+
+    def test_reserve_taken_slot(self):
+        self.assertTrue(SlotReservationService.reserve(self.schedule, time(9, 0)))
+        self.assertFalse(SlotReservationService.reserve(self.schedule, time(9, 0)))
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.current_patients, 1)
+        self.assertEqual(self.schedule.booked_slots, 1 << 2)
+
+    def test_release_does_not_go_below_zero(self):
+        SlotReservationService.release(self.schedule, time(8, 0))
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.current_patients, 0)
+        self.assertEqual(self.schedule.status, "AVAILABLE")
+
+    def test_booked_slot_does_not_consume_capacity(self):
+        AppointmentService.create_appointment(self._data(time(8, 0), time(8, 30)))
+        with self.assertRaises(ValueError):
+            AppointmentService.create_appointment(self._data(time(8, 0), time(8, 30)))
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.current_patients, 1)
+        self.assertEqual(Appointment.objects.filter(schedule=self.schedule).count(), 1)
+
+    def test_cancelled_slot_can_be_booked_again(self):
+        appointment = AppointmentService.create_appointment(self._data(time(8, 0), time(8, 30)))
+        AppointmentService.cancel_appointment(appointment.id)
+        AppointmentService.create_appointment(self._data(time(8, 0), time(8, 30)))
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.current_patients, 1)
+
+    def test_availability_follows_bitmap(self):
+        appointment = AppointmentService.create_appointment(self._data(time(9, 0), time(9, 30)))
+        slots = AppointmentService.get_available_time_slots(self.schedule.id)
+        self.assertEqual(len(slots), 8)
+        self.assertEqual(slots[2]['slot_start'], "09:00:00")
+        self.assertFalse(slots[2]['available'])
+        self.assertTrue(all(slot['available'] for i, slot in enumerate(slots) if i != 2))
+
+        AppointmentService.update_appointment(
+            appointment.id, {'status': AppointmentStatus.COMPLETED.value}
+        )
+        slots = AppointmentService.get_available_time_slots(self.schedule.id)
+        self.assertTrue(slots[2]['available'])
+
+    def test_moving_appointment_moves_bit(self):
+        appointment = AppointmentService.create_appointment(self._data(time(8, 0), time(8, 30)))
+        AppointmentService.update_appointment(
+            appointment.id, {'slot_start': time(10, 0), 'slot_end': time(10, 30)}
+        )
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.booked_slots, 1 << 4)
+        self.assertEqual(self.schedule.current_patients, 1)
+
+    def test_rebuild_bitmap(self):
+        Appointment.objects.create(
+            doctor=self.doctor, patient=self.patient, schedule=self.schedule,
+            slot_start=time(11, 30), slot_end=time(12, 0),
+            status=AppointmentStatus.CONFIRMED.value
+        )
+        Appointment.objects.create(
+            doctor=self.doctor, patient=self.patient, schedule=self.schedule,
+            slot_start=time(8, 0), slot_end=time(8, 30),
+            status=AppointmentStatus.CANCELLED.value
+        )
+        self.assertEqual(SlotReservationService.rebuild_bitmap(self.schedule), 1 << 7)
+
+    def test_iter_available_time_slots(self):
+        AppointmentService.create_appointment(self._data(time(8, 30), time(9, 0)))
+        long_schedule = Schedule.objects.create(
+            doctor=self.doctor,
+            room=self.room,
+            work_date=date(2025, 8, 27),
+            start_time=time(0, 0),
+            end_time=time(23, 0),
+            shift=Shift.NIGHT.value,
+            max_patients=100,
+            default_appointment_duration_minutes=15
+        )
+        AppointmentService.create_appointment({
+            **self._data(time(22, 45), time(23, 0)), 'schedule': long_schedule
+        })
+        Schedule.objects.create(
+            doctor=self.doctor,
+            room=self.room,
+            work_date=date(2025, 9, 10),
+            start_time=time(8, 0),
+            end_time=time(12, 0),
+            shift=Shift.MORNING.value
+        )
+
+        with self.assertNumQueries(2):
+            rows = list(AppointmentService.iter_available_time_slots(
+                date(2025, 8, 25), date(2025, 8, 31), doctor_ids=[self.doctor.id]
+            ))
+        self.assertEqual([row['scheduleId'] for row in rows], [self.schedule.id, long_schedule.id])
+        self.assertFalse(rows[0]['slots'][1]['available'])
+        self.assertEqual(len(rows[1]['slots']), 92)
+        self.assertFalse(rows[1]['slots'][-1]['available'])
+        self.assertEqual(rows[1]['slots'][-1]['slot_end'], "23:00:00")
+
+    def test_cursor_pagination_walks_all_pages(self):
+        expected = []
+        for work_date in [date(2025, 8, 26), date(2025, 8, 27)]:
+            schedule = Schedule.objects.create(
+                doctor=self.doctor, room=self.room, work_date=work_date,
+                start_time=time(8, 0), end_time=time(12, 0), shift=Shift.MORNING.value
+            )
+            for hour in [10, 8, 9]:
+                expected.append((work_date, hour, Appointment.objects.create(
+                    doctor=self.doctor, patient=self.patient, schedule=schedule,
+                    slot_start=time(hour, 0), slot_end=time(hour, 30),
+                    status=AppointmentStatus.PENDING.value
+                ).id))
+        expected = [appointment_id for _, _, appointment_id in sorted(expected)]
+
+        seen, cursor = [], ""
+        while True:
+            page = AppointmentService.get_appointments_by_doctor_id_optimized(
+                doctor_id=self.doctor.id, page_size=4, cursor=cursor
+            )
+            seen.extend(appointment.id for appointment in page['results'])
+            self.assertIsNone(page['totalElements'])
+            if page['last']:
+                self.assertIsNone(page['nextCursor'])
+                break
+            cursor = page['nextCursor']
+        self.assertEqual(seen, expected)
+
+        page = AppointmentService.get_appointments_by_patient_id_optimized(
+            self.patient.id, PAGE_NO_DEFAULT, 4, appointment_type="past",
+            current_datetime=datetime(2030, 1, 1), cursor="", with_total=True
+        )
+        self.assertEqual(page['totalElements'], 6)
+        self.assertEqual([a.id for a in page['results']], expected[::-1][:4])
+
+    def test_cursor_pagination_rejects_tampered_token(self):
+        with self.assertRaises(ValidationError):
+            AppointmentService.get_appointments_by_doctor_id_optimized(
+                doctor_id=self.doctor.id, cursor="not-a-cursor"
+            )
+
+    def test_reactivate_into_taken_slot(self):
+        appointment = AppointmentService.create_appointment(self._data(time(8, 0), time(8, 30)))
+        AppointmentService.cancel_appointment(appointment.id)
+        AppointmentService.create_appointment(self._data(time(8, 0), time(8, 30)))
+        with self.assertRaises(ValueError):
+            AppointmentService.update_appointment(
+                appointment.id, {'status': AppointmentStatus.PENDING.value}
+            )
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.current_patients, 1)
+
 class AppointmentNoteServiceTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -0,0 +1,290 @@
+import threading
+import time as clock
+from datetime import date, time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import requests
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from appointments.models import AppointmentTriage
+from appointments.services import AppointmentService
+from appointments.triage import (
+    CircuitBreaker, CircuitOpenError, PredictionServiceClient, PredictionServiceError, triage_appointment,
+)
+from doctors.models import Doctor, Department, Schedule, ExaminationRoom
+from patients.models import Patient
+from users.models import User
+from common.enums import (
+    AcademicDegree, DoctorType, Gender, RoomType, Shift, TriageStatus, UserRole,
+)
+
+PREDICTION = {
+    'predicted_disease': 'flu',
+    'predicted_disease_vn': 'Cúm',
+    'confidence': 0.8,
+    'top_predictions': [
+        {'disease': 'flu', 'disease_vn': 'Cúm', 'probability': 0.8},
+        {'disease': 'common cold', 'disease_vn': 'Cảm lạnh thông thường', 'probability': 0.2},
+    ],
+}
+
+
+def fake_response(status_code=200, data=None):
+    return SimpleNamespace(status_code=status_code, json=lambda: data)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingDict(dict):
+    """Đếm số lần tra cứu lời gọi đang chạy, để biết các luồng đã tới điểm gộp."""
+
+    def __init__(self):
+        super().__init__()
+        self.lookups = 0
+
+    def get(self, key, default=None):
+        self.lookups += 1
+        return super().get(key, default)
+
+
+class FakeClient:
+    def __init__(self, matched, error=None):
+        self.matched = matched
+        self.error = error
+        self.predicted = []
+
+    def parse_symptoms(self, text):
+        if self.error:
+            raise self.error
+        return {'matched_symptoms': self.matched}
+
+    def predict(self, symptoms):
+        self.predicted.append(symptoms)
+        return PREDICTION
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30, clock=self.clock)
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_lets_one_trial_through(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 30
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock.now = 59
+        self.assertFalse(self.breaker.allow())
+
+
+class PredictionServiceClientTest(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30, clock=FakeClock())
+        self.client = PredictionServiceClient('http://triage.test/', breaker=self.breaker)
+
+    def test_posts_with_timeouts(self):
+        with patch.object(self.client.session, 'post', return_value=fake_response(data=PREDICTION)) as post:
+            self.assertEqual(self.client.predict(['fever']), PREDICTION)
+        post.assert_called_once_with(
+            'http://triage.test/api/predict', json={'symptoms': ['fever']}, timeout=self.client.timeout
+        )
+
+    def test_server_errors_open_the_circuit(self):
+        with patch.object(self.client.session, 'post', return_value=fake_response(503)) as post:
+            for _ in range(2):
+                with self.assertRaises(PredictionServiceError):
+                    self.client.parse_symptoms('sốt')
+            with self.assertRaises(CircuitOpenError):
+                self.client.parse_symptoms('sốt')
+        self.assertEqual(post.call_count, 2)
+
+    def test_connection_errors_count_as_failures(self):
+        with patch.object(self.client.session, 'post', side_effect=requests.ConnectTimeout('timeout')):
+            with self.assertRaises(PredictionServiceError):
+                self.client.parse_symptoms('sốt')
+        self.assertEqual(self.breaker.failures, 1)
+
+    def test_client_errors_do_not_open_the_circuit(self):
+        with patch.object(self.client.session, 'post', return_value=fake_response(400, {'error': 'x'})):
+            for _ in range(3):
+                with self.assertRaises(PredictionServiceError):
+                    self.client.predict([])
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_identical_concurrent_calls_are_coalesced(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow_post(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return fake_response(data=PREDICTION)
+
+        results = []
+        self.client._in_flight = CountingDict()
+        with patch.object(self.client.session, 'post', side_effect=slow_post) as post:
+            leader = threading.Thread(target=lambda: results.append(self.client.predict(['fever'])))
+            leader.start()
+            started.wait(5)
+            followers = [
+                threading.Thread(target=lambda: results.append(self.client.predict(['fever'])))
+                for _ in range(4)
+            ]
+            for thread in followers:
+                thread.start()
+            # Các follower đã thấy lời gọi đang chạy trước khi thả leader
+            while self.client._in_flight.lookups < 5:
+                clock.sleep(0.001)
+            release.set()
+            for thread in [leader, *followers]:
+                thread.join(5)
+
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(results, [PREDICTION] * 5)
+        self.assertEqual(self.client._in_flight, {})
+
+
+@override_settings(PREDICTION_SERVICE_URL='http://triage.test', TRIAGE_WORKERS=0)
+class AppointmentTriageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email='patient@example.com', password='testpass123', role=UserRole.PATIENT.value
+        )
+        cls.patient = Patient.objects.create(
+            user=user,
+            first_name='Test',
+            last_name='Patient',
+            identity_number='111222333',
+            insurance_number='INS123456',
+            birthday=date(1990, 1, 1),
+            gender=Gender.FEMALE.value,
+        )
+        doctor_user = User.objects.create_user(
+            email='doctor@example.com', password='testpass123', role=UserRole.DOCTOR.value
+        )
+        department = Department.objects.create(department_name="Cardiology")
+        cls.doctor = Doctor.objects.create(
+            user=doctor_user,
+            first_name="John",
+            last_name="Doe",
+            identity_number="123456789",
+            birthday=date(1980, 1, 1),
+            gender=Gender.MALE.value,
+            academic_degree=AcademicDegree.BS_CKI.value,
+            specialization="Cardiologist",
+            type=DoctorType.EXAMINATION.value,
+            department=department,
+        )
+        room = ExaminationRoom.objects.create(
+            department=department, type=RoomType.EXAMINATION.value, building="A", floor=1
+        )
+        cls.schedule = Schedule.objects.create(
+            doctor=cls.doctor,
+            room=room,
+            work_date=date(2025, 8, 26),
+            start_time=time(8, 0),
+            end_time=time(12, 0),
+            shift=Shift.MORNING.value,
+            max_patients=10,
+            current_patients=0,
+        )
+
+    def book(self, symptoms):
+        return AppointmentService.create_appointment({
+            'doctor': self.doctor,
+            'patient': self.patient,
+            'schedule': self.schedule,
+            'symptoms': symptoms,
+            'slot_start': time(9, 0),
+            'slot_end': time(9, 30),
+        })
+
+    def test_booking_classifies_symptoms_after_commit(self):
+        client = FakeClient(['fever', 'cough'])
+        with patch('appointments.triage.get_client', return_value=client):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                appointment = self.book("Sốt và ho hai ngày")
+                self.assertFalse(AppointmentTriage.objects.exists())
+
+        self.assertEqual(len(callbacks), 1)
+        triage = appointment.triage
+        self.assertEqual(triage.status, TriageStatus.CLASSIFIED.value)
+        self.assertEqual(triage.matched_symptoms, ['fever', 'cough'])
+        self.assertEqual(triage.predicted_disease, 'flu')
+        self.assertEqual(triage.confidence, 0.8)
+        self.assertEqual(triage.top_predictions, PREDICTION['top_predictions'])
+        self.assertEqual(client.predicted, [['fever', 'cough']])
+
+    def test_unrecognized_symptoms_skip_prediction(self):
+        client = FakeClient([])
+        with patch('appointments.triage.get_client', return_value=client):
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment = self.book("Khó chịu trong người")
+
+        self.assertEqual(appointment.triage.status, TriageStatus.NO_MATCH.value)
+        self.assertEqual(client.predicted, [])
+
+    def test_service_failure_is_recorded(self):
+        client = FakeClient([], error=CircuitOpenError("open"))
+        with patch('appointments.triage.get_client', return_value=client):
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment = self.book("Sốt")
+
+        self.assertEqual(appointment.triage.status, TriageStatus.FAILED.value)
+        self.assertEqual(appointment.triage.error, "open")
+
+    def test_retriage_replaces_previous_result(self):
+        with patch('appointments.triage.get_client', return_value=FakeClient([], error=CircuitOpenError("open"))):
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment = self.book("Sốt")
+        triage_appointment(appointment.id, "Sốt", client=FakeClient(['fever']))
+
+        triage = AppointmentTriage.objects.get(appointment=appointment)
+        self.assertEqual(triage.status, TriageStatus.CLASSIFIED.value)
+        self.assertIsNone(triage.error)
+
+    def test_blank_symptoms_are_not_sent(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.book("  ")
+        self.assertEqual(callbacks, [])
+
+    @override_settings(PREDICTION_SERVICE_URL='')
+    def test_disabled_without_service_url(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.book("Sốt")
+        self.assertEqual(callbacks, [])
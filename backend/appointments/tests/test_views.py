@@ -3,12 +3,16 @@ from rest_framework import status
 from django.urls import reverse
 from django.utils import timezone
 from datetime import date, time, timedelta
+import json
 from unittest.mock import patch
 from io import BytesIO
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from appointments.models import Appointment, AppointmentNote, Service, ServiceOrder
 from doctors.models import Doctor, Department, Schedule, ExaminationRoom
-from patients.models import Patient
+from patients.models import Patient, EmergencyContact
+from pharmacy.models import Prescription
 from users.models import User
 from common.enums import AppointmentStatus, NoteType, OrderStatus, ServiceType, Gender, AcademicDegree, DoctorType, RoomType, Shift, UserRole
 from common.constants import PAGE_NO_DEFAULT, PAGE_SIZE_DEFAULT, SCHEDULE_DEFAULTS
@@ -129,6 +133,19 @@ class AppointmentViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['content']), 1)
 
+    def test_get_by_doctor_with_cursor(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('appointment-get-by-doctor', kwargs={'doctor_id': self.doctor.id})
+        response = self.client.get(url, {'cursor': '', 'withTotal': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['content']), 1)
+        self.assertEqual(response.data['totalElements'], 1)
+        self.assertIsNone(response.data['nextCursor'])
+        self.assertTrue(response.data['last'])
+
+        response = self.client.get(url, {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_get_by_patient(self):
         self.client.force_authenticate(user=self.patient_user)
         response = self.client.get(reverse('appointment-get-by-patient', kwargs={'patient_id': self.patient.id}))
@@ -142,6 +159,26 @@ class AppointmentViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 8)  # Assuming 8 slots
 
+    def test_available_slots_batch(self):
+        self.client.force_authenticate(user=self.user)
+        Schedule.objects.filter(id=self.schedule.id).update(booked_slots=1)
+        url = reverse('appointment-available-slots-batch')
+        data = {'startDate': '2025-08-25', 'endDate': '2025-08-31', 'departmentId': self.department.id}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['scheduleId'], self.schedule.id)
+        self.assertEqual(len(rows[0]['slots']), 8)
+        self.assertFalse(rows[0]['slots'][0]['available'])
+        self.assertTrue(rows[0]['slots'][1]['available'])
+
+    def test_available_slots_batch_requires_scope(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('appointment-available-slots-batch')
+        response = self.client.post(url, {'startDate': '2025-08-25', 'endDate': '2025-08-31'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_add_note(self):
         self.client.force_authenticate(user=self.user)
         data = {
@@ -160,6 +197,134 @@ class AppointmentViewSetTest(APITestCase):
         self.appointment.refresh_from_db()
         self.assertEqual(self.appointment.status, AppointmentStatus.CANCELLED.value)
 
+class AppointmentQueryCountTest(APITestCase):
+    """Mỗi list endpoint phải chạy cùng một số query dù trang có 1 hay nhiều dòng."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='qc-doctor@example.com', password='testpass123', role=UserRole.DOCTOR.value
+        )
+        cls.department = Department.objects.create(department_name="Cardiology")
+        cls.doctor = cls._make_doctor(cls.user, 0)
+        cls.patient = cls._make_patient(0)
+        cls.schedule = cls._make_schedule(cls.doctor, date(2025, 8, 1))
+        cls._make_appointment(cls.doctor, cls.patient, cls.schedule, time(8, 0))
+
+    @classmethod
+    def _make_doctor(cls, user, index):
+        return Doctor.objects.create(
+            user=user,
+            first_name="Doctor",
+            last_name=str(index),
+            identity_number=f"9{index:08d}",
+            birthday=date(1980, 1, 1),
+            gender=Gender.MALE.value,
+            academic_degree=AcademicDegree.BS_CKI.value,
+            specialization="Cardiologist",
+            type=DoctorType.EXAMINATION.value,
+            department=cls.department,
+            price=100.00
+        )
+
+    @classmethod
+    def _make_patient(cls, index):
+        user = User.objects.create_user(
+            email=f'qc-patient{index}@example.com', password='testpass123', role=UserRole.PATIENT.value
+        )
+        patient = Patient.objects.create(
+            user=user,
+            first_name='Patient',
+            last_name=str(index),
+            identity_number=f"8{index:08d}",
+            insurance_number=f"INS{index:06d}",
+            birthday=date(1990, 1, 1),
+            gender=Gender.FEMALE.value
+        )
+        EmergencyContact.objects.create(
+            patient=patient, contact_name="Contact", contact_phone="0900000000", relationship="Mother"
+        )
+        return patient
+
+    @classmethod
+    def _make_schedule(cls, doctor, work_date):
+        room = ExaminationRoom.objects.create(
+            department=cls.department, type=RoomType.EXAMINATION.value, building="A", floor=1
+        )
+        return Schedule.objects.create(
+            doctor=doctor,
+            room=room,
+            work_date=work_date,
+            start_time=time(8, 0),
+            end_time=time(12, 0),
+            shift=Shift.MORNING.value,
+            max_patients=10,
+            default_appointment_duration_minutes=30
+        )
+
+    @staticmethod
+    def _make_appointment(doctor, patient, schedule, slot_start):
+        appointment = Appointment.objects.create(
+            doctor=doctor,
+            patient=patient,
+            schedule=schedule,
+            symptoms="Fever",
+            slot_start=slot_start,
+            slot_end=time(slot_start.hour, 30),
+            status=AppointmentStatus.CONFIRMED.value
+        )
+        AppointmentNote.objects.create(
+            appointment=appointment, note_type=NoteType.DOCTOR.value, note_text="Note"
+        )
+        Prescription.objects.create(appointment=appointment, patient=patient, diagnosis="Flu")
+        return appointment
+
+    def _grow(self, count):
+        """Thêm dòng có quan hệ riêng (bệnh nhân, bác sĩ, lịch, phòng) cho từng endpoint."""
+        for index in range(1, count + 1):
+            patient = self._make_patient(index)
+            schedule = self._make_schedule(self.doctor, date(2025, 8, 1) + timedelta(days=index))
+            self._make_appointment(self.doctor, patient, schedule, time(8, 0))
+
+            doctor_user = User.objects.create_user(
+                email=f'qc-doctor{index}@example.com', password='testpass123', role=UserRole.DOCTOR.value
+            )
+            doctor = self._make_doctor(doctor_user, index)
+            schedule = self._make_schedule(doctor, date(2025, 8, 1) + timedelta(days=index))
+            self._make_appointment(doctor, self.patient, schedule, time(8, 0))
+
+            self._make_appointment(self.doctor, patient, self.schedule, time(8 + index, 0))
+
+    def _count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, params=None):
+        self.client.force_authenticate(user=self.user)
+        baseline = self._count_queries(url, params)
+        self._grow(3)
+        self.assertEqual(self._count_queries(url, params), baseline)
+
+    def test_list_query_count(self):
+        self.assertConstantQueries(reverse('appointment-list'))
+
+    def test_get_by_doctor_query_count(self):
+        self.assertConstantQueries(reverse('appointment-get-by-doctor', kwargs={'doctor_id': self.doctor.id}))
+
+    def test_get_by_doctor_cursor_query_count(self):
+        self.assertConstantQueries(
+            reverse('appointment-get-by-doctor', kwargs={'doctor_id': self.doctor.id}), {'cursor': ''}
+        )
+
+    def test_get_by_patient_query_count(self):
+        self.assertConstantQueries(reverse('appointment-get-by-patient', kwargs={'patient_id': self.patient.id}))
+
+    def test_get_by_schedule_query_count(self):
+        self.assertConstantQueries(reverse('appointment-get-by-schedule', kwargs={'schedule_id': self.schedule.id}))
+
+
 class ServiceOrderViewSetTest(APITestCase):
     @classmethod
     def setUpTestData(cls):
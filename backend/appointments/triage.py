@@ -0,0 +1,231 @@
+"""
+Phân loại sơ bộ triệu chứng lịch hẹn qua disease-prediction-service.
+
+Đặt lịch chỉ đăng ký một callback ``on_commit``; việc gọi dịch vụ chạy ở luồng
+nền (``settings.TRIAGE_WORKERS``) nên không làm chậm ``create_appointment``.
+Kết quả lưu vào AppointmentTriage, kể cả khi dịch vụ lỗi (trạng thái FAILED).
+
+``PredictionServiceClient`` dùng chung trong tiến trình:
+
+- Một ``requests.Session`` với pool kết nối keep-alive, timeout kết nối/đọc.
+- Circuit breaker: sau ``FAILURE_THRESHOLD`` lỗi liên tiếp thì từ chối ngay
+  trong ``RESET_SECONDS``, rồi cho một request thử lại trước khi đóng mạch.
+- Gộp request: các lời gọi giống hệt nhau đang chạy đồng thời chỉ gửi một
+  request và cùng nhận kết quả.
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from common.constants import PREDICTION_SERVICE
+from common.enums import TriageStatus
+from .models import AppointmentTriage
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionServiceError(Exception):
+    pass
+
+
+class CircuitOpenError(PredictionServiceError):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_seconds, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Request được gửi hay không; khi hết thời gian ngắt chỉ cho một request thử."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class PredictionServiceClient:
+    def __init__(self, base_url, connect_timeout=None, read_timeout=None, pool_size=None, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (
+            connect_timeout or PREDICTION_SERVICE["CONNECT_TIMEOUT_SECONDS"],
+            read_timeout or PREDICTION_SERVICE["READ_TIMEOUT_SECONDS"],
+        )
+        self.breaker = breaker or CircuitBreaker(
+            PREDICTION_SERVICE["FAILURE_THRESHOLD"], PREDICTION_SERVICE["RESET_SECONDS"]
+        )
+        pool_size = pool_size or PREDICTION_SERVICE["POOL_SIZE"]
+        # Không tự thử lại: lỗi được đếm vào circuit breaker thay vì nhân đôi tải
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def parse_symptoms(self, text):
+        return self._post("/api/parse-symptoms", {"text": text})
+
+    def predict(self, symptoms):
+        return self._post("/api/predict", {"symptoms": list(symptoms)})
+
+    def _post(self, path, payload):
+        key = (path, json.dumps(payload, sort_keys=True))
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = Future()
+        if not leader:
+            return call.result()
+
+        try:
+            call.set_result(self._send(path, payload))
+        except Exception as e:
+            call.set_exception(e)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return call.result()
+
+    def _send(self, path, payload):
+        if not self.breaker.allow():
+            raise CircuitOpenError("Dịch vụ dự đoán tạm ngắt do lỗi liên tiếp.")
+        try:
+            response = self.session.post(self.base_url + path, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise PredictionServiceError(str(e)) from e
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            raise PredictionServiceError(f"{path} trả về {response.status_code}")
+        # 4xx là lỗi của dữ liệu gửi đi, dịch vụ vẫn hoạt động
+        self.breaker.record_success()
+        if response.status_code >= 400:
+            raise PredictionServiceError(f"{path} trả về {response.status_code}")
+        try:
+            return response.json()
+        except ValueError as e:
+            raise PredictionServiceError(f"{path} trả về dữ liệu không phải JSON") from e
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Client dùng chung của tiến trình, None khi chưa cấu hình PREDICTION_SERVICE_URL."""
+    global _client
+    url = settings.PREDICTION_SERVICE_URL
+    if not url:
+        return None
+    with _client_lock:
+        if _client is None or _client.base_url != url.rstrip("/"):
+            _client = PredictionServiceClient(url)
+    return _client
+
+
+def classify_symptoms(client, text):
+    """Trả về các trường của AppointmentTriage cho một đoạn mô tả triệu chứng."""
+    matched = client.parse_symptoms(text).get("matched_symptoms") or []
+    if not matched:
+        return {"status": TriageStatus.NO_MATCH.value, "matched_symptoms": []}
+    prediction = client.predict(matched)
+    return {
+        "status": TriageStatus.CLASSIFIED.value,
+        "matched_symptoms": matched,
+        "predicted_disease": prediction.get("predicted_disease"),
+        "confidence": prediction.get("confidence"),
+        "top_predictions": prediction.get("top_predictions") or [],
+    }
+
+
+def triage_appointment(appointment_id, symptoms, client=None):
+    client = client or get_client()
+    if client is None:
+        return None
+    try:
+        fields = classify_symptoms(client, symptoms)
+    except PredictionServiceError as e:
+        fields = {"status": TriageStatus.FAILED.value, "error": str(e)}
+    fields = {
+        "matched_symptoms": [],
+        "predicted_disease": None,
+        "confidence": None,
+        "top_predictions": [],
+        "error": None,
+        **fields,
+    }
+    triage, _ = AppointmentTriage.objects.update_or_create(
+        appointment_id=appointment_id, defaults=fields
+    )
+    return triage
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _triage_in_background(appointment_id, symptoms):
+    close_old_connections()
+    try:
+        triage_appointment(appointment_id, symptoms)
+    except Exception:
+        logger.exception("Triage of appointment %s crashed", appointment_id)
+    finally:
+        close_old_connections()
+
+
+def dispatch_triage(appointment_id, symptoms):
+    workers = settings.TRIAGE_WORKERS
+    if workers <= 0:
+        triage_appointment(appointment_id, symptoms)
+        return
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="triage")
+    _executor.submit(_triage_in_background, appointment_id, symptoms)
+
+
+def schedule_triage(appointment):
+    """Lên lịch phân loại triệu chứng sau khi lịch hẹn được commit."""
+    symptoms = (appointment.symptoms or "").strip()
+    if not symptoms or not settings.PREDICTION_SERVICE_URL:
+        return
+    transaction.on_commit(partial(dispatch_triage, appointment.id, symptoms))
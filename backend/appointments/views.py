@@ -3,8 +3,9 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, JSONParser
 from rest_framework.permissions import IsAuthenticated
-from django.db.models.functions import TruncDate
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.utils.dateparse import parse_date
 from common.constants import PAGE_NO_DEFAULT, PAGE_SIZE_DEFAULT
 from django.utils.translation import gettext as _
@@ -26,6 +27,7 @@ from .serializers import (
   AppointmentPatientViewSerializer,
   AvailableSlotSerializer, 
   ScheduleTimeSerializer, 
+  ScheduleAvailabilityBatchSerializer,
   CustomPageNumberPagination,
   AppointmentNoteSerializer,
   ServiceOrderSerializer,
@@ -40,15 +42,38 @@ from .services import (
   ServicesService
 )
 from common.enums import AppointmentStatus
+from common.utils import stream_json_array
 
 logger = logging.getLogger(__name__) 
 
+
+def _page_response(content, result_page):
+  if 'nextCursor' in result_page:
+      return {
+          "content": content,
+          "pageSize": result_page['pageSize'],
+          "totalElements": result_page['totalElements'],
+          "nextCursor": result_page['nextCursor'],
+          "last": result_page['last'],
+      }
+  return {
+      "content": content,
+      "pageNo": result_page['pageNo'],
+      "pageSize": result_page['pageSize'],
+      "totalElements": result_page['totalElements'],
+      "totalPages": result_page['totalPages'],
+      "last": result_page['last'],
+  }
+
 class AppointmentViewSet(viewsets.ModelViewSet):
   queryset = Appointment.objects.all().order_by("-created_at")
   serializer_class = AppointmentSerializer
   pagination_class = CustomPageNumberPagination
   permission_classes = [IsAuthenticated]
 
+  def get_queryset(self):
+      return AppointmentSerializer.setup_eager_loading(super().get_queryset())
+
   def get_serializer_class(self):
       if self.action == 'create':
           return AppointmentCreateSerializer
@@ -75,18 +100,13 @@ class AppointmentViewSet(viewsets.ModelViewSet):
           appointment_status=validated.get('appointment_status'),
           room_id=validated.get('room_id'),
           page_no=validated['page_no'],
-          page_size=validated['page_size']
+          page_size=validated['page_size'],
+          cursor=validated.get('cursor'),
+          with_total=validated.get('with_total', False),
       )
 
       serializer = AppointmentDoctorViewSerializer(result_page['results'], many=True)
-      return Response({
-          "content": serializer.data,
-          "pageNo": result_page['pageNo'],
-          "pageSize": result_page['pageSize'],
-          "totalElements": result_page['totalElements'],
-          "totalPages": result_page['totalPages'],
-          "last": result_page['last'],
-      })
+      return Response(_page_response(serializer.data, result_page))
 
   @action(detail=False, methods=['get'], url_path='patient/(?P<patient_id>[^/.]+)')
   def get_by_patient(self, request, patient_id):
@@ -101,17 +121,12 @@ class AppointmentViewSet(viewsets.ModelViewSet):
           validated['page_no'],
           validated['page_size'],
           appointment_type='all',
-          appointment_status=appointment_status
+          appointment_status=appointment_status,
+          cursor=validated.get('cursor'),
+          with_total=validated.get('with_total', False),
       )
       response_serializer = AppointmentPatientViewSerializer(result_page['results'], many=True)
-      return Response({
-          "content": response_serializer.data,
-          "pageNo": result_page['pageNo'],
-          "pageSize": result_page['pageSize'],
-          "totalElements": result_page['totalElements'],
-          "totalPages": result_page['totalPages'],
-          "last": result_page['last']
-      })
+      return Response(_page_response(response_serializer.data, result_page))
 
   @action(detail=False, methods=['get'], url_path='my')
   def my_appointments(self, request):
@@ -128,17 +143,12 @@ class AppointmentViewSet(viewsets.ModelViewSet):
           validated['page_no'],
           validated['page_size'],
           appointment_type='past',
-          appointment_status=appointment_status
+          appointment_status=appointment_status,
+          cursor=validated.get('cursor'),
+          with_total=validated.get('with_total', False),
       )
       response_serializer = AppointmentPatientViewSerializer(result_page['results'], many=True)
-      return Response({
-          "content": response_serializer.data,
-          "pageNo": result_page['pageNo'],
-          "pageSize": result_page['pageSize'],
-          "totalElements": result_page['totalElements'],
-          "totalPages": result_page['totalPages'],
-          "last": result_page['last']
-      })
+      return Response(_page_response(response_serializer.data, result_page))
 
   @action(detail=False, methods=['get'], url_path='upcoming')
   def upcoming_appointments(self, request):
@@ -245,11 +255,14 @@ class AppointmentViewSet(viewsets.ModelViewSet):
               'IN_PROGRESS': AppointmentStatus.IN_PROGRESS.value
           }
           
-          appointment.status = status_mapping[appointment_status]
-          appointment.save()
+          appointment = AppointmentService.update_appointment(
+              appointment.id, {'status': status_mapping[appointment_status]}
+          )
           
           return Response(AppointmentSerializer(appointment).data)
           
+      except ValueError as e:
+          return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
       except Exception as e:
           logger.exception("Error updating appointment status:")
           return Response(
@@ -283,6 +296,20 @@ class AppointmentViewSet(viewsets.ModelViewSet):
       result = AppointmentService.get_available_time_slots(schedule_id)
       return Response(result)
 
+  @action(detail=False, methods=['post'], url_path='schedule/available-slots/batch')
+  def available_slots_batch(self, request):
+      serializer = ScheduleAvailabilityBatchSerializer(data=request.data)
+      serializer.is_valid(raise_exception=True)
+      validated = serializer.validated_data
+
+      rows = AppointmentService.iter_available_time_slots(
+          validated['start_date'],
+          validated['end_date'],
+          department_id=validated.get('department_id'),
+          doctor_ids=validated.get('doctor_ids'),
+      )
+      return StreamingHttpResponse(stream_json_array(rows), content_type='application/json')
+
   @action(detail=False, methods=['get'], url_path='schedule/(?P<schedule_id>[^/.]+)')
   def get_by_schedule(self, request, schedule_id):
       result = AppointmentService.get_appointments_by_schedule_ordered(schedule_id)
@@ -400,7 +427,9 @@ class ServiceOrderViewSet(viewsets.ViewSet):
         if status_param:
             orders = orders.filter(status=status_param)
         if order_date:
-            orders = orders.annotate(order_date_only=TruncDate('order_time')).filter(order_date_only=order_date)
+            # Lọc theo khoảng thời gian để dùng được index (room, status, order_time)
+            day_start = timezone.make_aware(datetime.combine(order_date, datetime.min.time()))
+            orders = orders.filter(order_time__gte=day_start, order_time__lt=day_start + timedelta(days=1))
 
         serializer = ServiceOrderSerializer(orders, many=True, context={'request': request})
         return Response(serializer.data)
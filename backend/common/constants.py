@@ -17,6 +17,8 @@ DECIMAL_DEFAULT = 0
 PAGE_NO_DEFAULT = 0
 PAGE_SIZE_DEFAULT = 30
 MIN_VALUE = 1
+# Thời gian cache số bản ghi (totalElements) ở chế độ phân trang cursor
+PAGE_COUNT_CACHE_SECONDS = 60
 
 # ======================
 # Regex patterns
@@ -48,6 +50,14 @@ COMMON_LENGTH = {
     "INSURANCE_NUMBER": 50,
     "OTP": 6,
     "RESET_TOKEN": 6,
+    "TOKEN_NAMESPACE": 32,
+}
+
+# Thời gian sống (giây) của dữ liệu trong kho token ngắn hạn
+EPHEMERAL_TTL = {
+    "REGISTRATION": 600,
+    "OTP": 600,
+    "RESET_TOKEN": 600,
 }
 
 # ======================
@@ -125,4 +135,70 @@ SCHEDULE_DEFAULTS = {
     "CURRENT_PATIENTS": 0,
     "APPOINTMENT_DURATION_MINUTES": 30,
     "MINUTES": 60,
+    # Số slot tối đa lưu được trong Schedule.booked_slots (BigInteger có dấu)
+    "BITMAP_SLOTS": 63,
+}
+
+# Khoảng ngày tối đa cho một lần tra cứu slot trống theo lô
+AVAILABILITY_BATCH_MAX_DAYS = 31
+
+# Hàng đợi email gửi đi (notifications.email_queue)
+EMAIL_QUEUE = {
+    "BATCH_SIZE": 50,
+    "MAX_ATTEMPTS": 5,
+    "BACKOFF_BASE_SECONDS": 30,
+    "BACKOFF_MAX_SECONDS": 3600,
+    "LEASE_SECONDS": 300,
+    "POLL_SECONDS": 5,
+}
+
+# Hộp thư webhook PayOS (payments.webhooks)
+PAYOS_WEBHOOK = {
+    "BATCH_SIZE": 20,
+    "MAX_ATTEMPTS": 8,
+    "BACKOFF_BASE_SECONDS": 5,
+    "BACKOFF_MAX_SECONDS": 600,
+    "LEASE_SECONDS": 60,
+    "POLL_SECONDS": 2,
+}
+
+BULK_BILLING = {
+    "CHUNK_SIZE": 500,  # số lịch hẹn lập hóa đơn trong một transaction
+}
+
+PAYOS_CLIENT = {
+    "CONNECT_TIMEOUT_SECONDS": 3,
+    "READ_TIMEOUT_SECONDS": 10,
+    "MAX_RETRIES": 1,
+    "POOL_SIZE": 10,  # số kết nối keep-alive tới PayOS giữ lại
+    "KEEPALIVE_SECONDS": 30,
+    "INFO_CACHE_SECONDS": 5,  # link còn chờ thanh toán: trang checkout hỏi lại liên tục
+    "FINAL_INFO_CACHE_SECONDS": 3600,  # PAID/CANCELLED/EXPIRED không đổi nữa
+    "BATCH_MAX": 50,  # số orderCode tối đa trong một lần hỏi trạng thái
+}
+
+EMAIL_LENGTH = {
+    "SUBJECT": 255,
+    "FROM": 255,
+}
+
+# Gửi thông báo đẩy FCM (notifications.push)
+FCM = {
+    "MULTICAST_BATCH": 500,  # giới hạn token của một MulticastMessage
+}
+
+# Nhắc lịch khám (appointments.reminders)
+APPOINTMENT_REMINDER = {
+    "LEAD_HOURS": 24,  # nhắc mọi lịch hẹn bắt đầu trong khoảng này tính từ hiện tại
+    "BATCH_SIZE": 1000,
+    "POLL_SECONDS": 300,
+}
+
+# Gọi disease-prediction-service để phân loại sơ bộ triệu chứng (appointments.triage)
+PREDICTION_SERVICE = {
+    "CONNECT_TIMEOUT_SECONDS": 0.5,
+    "READ_TIMEOUT_SECONDS": 3,
+    "POOL_SIZE": 10,  # số kết nối keep-alive giữ lại
+    "FAILURE_THRESHOLD": 5,  # số lỗi liên tiếp trước khi ngắt mạch
+    "RESET_SECONDS": 30,  # thời gian ngắt mạch trước khi cho một request thử lại
 }
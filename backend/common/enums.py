@@ -43,6 +43,13 @@ class ServiceType(Enum):
     CONSULTATION = "C"
     OTHER = "O"
 
+class BillItemType(Enum):
+    TEST = "T"
+    IMAGING = "I"
+    CONSULTATION = "C"
+    OTHER = "O"
+    MEDICINE = "M"
+
 class OrderStatus(Enum):
     ORDERED = "O"
     COMPLETED = "C"
@@ -66,6 +73,23 @@ class TransactionStatus(Enum):
     FAILED = "F"
     PENDING = "P"
 
+class TriageStatus(Enum):
+    CLASSIFIED = "C"
+    NO_MATCH = "N"
+    FAILED = "F"
+
+class EmailStatus(Enum):
+    PENDING = "P"
+    SENDING = "I"
+    SENT = "S"
+    FAILED = "F"
+
+class WebhookStatus(Enum):
+    PENDING = "P"
+    PROCESSING = "I"
+    PROCESSED = "S"
+    FAILED = "F"
+
 class NotificationType(Enum):
     SYSTEM = "S"
     BILL = "B"
@@ -1,5 +1,26 @@
+import json
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
 
 def enum_to_choices(enum_class):
     """Chuyển Enum thành tuple choices (value, Label)"""
     return [(e.value, _(str(e.name).capitalize())) for e in enum_class]
+
+def stream_json_array(items):
+    """Sinh từng đoạn của một mảng JSON để dùng với StreamingHttpResponse"""
+    yield "["
+    for index, item in enumerate(items):
+        yield ("," if index else "") + json.dumps(item, cls=DjangoJSONEncoder)
+    yield "]"
+
+def encode_cursor(values, salt):
+    """Đóng gói khóa phân trang thành token mờ, có chữ ký"""
+    return signing.dumps(values, salt=salt, compress=True)
+
+def decode_cursor(token, salt):
+    try:
+        return signing.loads(token, salt=salt)
+    except signing.BadSignature:
+        raise ValidationError({"cursor": _("Cursor phân trang không hợp lệ.")})
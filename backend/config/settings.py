@@ -214,11 +214,28 @@ EMAIL_PORT = config('EMAIL_PORT', default=2525, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+# Số luồng nền trong tiến trình web gửi email ngay sau commit; đặt 0 khi
+# đã chạy riêng `manage.py run_email_worker`.
+EMAIL_QUEUE_EAGER_WORKERS = config('EMAIL_QUEUE_EAGER_WORKERS', default=2, cast=int)
+# Số luồng nền xử lý webhook PayOS ngay sau khi nhận; đặt 0 khi đã chạy riêng
+# `manage.py process_payment_webhooks`.
+PAYOS_WEBHOOK_EAGER_WORKERS = config('PAYOS_WEBHOOK_EAGER_WORKERS', default=2, cast=int)
+
+# Số luồng gửi FCM multicast; 0 thì gửi ngay trong callback on_commit
+FCM_PUSH_WORKERS = config('FCM_PUSH_WORKERS', default=4, cast=int)
+
+# disease-prediction-service, vd. http://localhost:5001; để trống thì không phân loại triệu chứng
+PREDICTION_SERVICE_URL = config('PREDICTION_SERVICE_URL', default='')
+# Số luồng gọi dịch vụ dự đoán sau khi đặt lịch; 0 thì gọi ngay trong callback on_commit
+TRIAGE_WORKERS = config('TRIAGE_WORKERS', default=2, cast=int)
 
 PAYOS = {
     'client_id': config('PAYOS_CLIENT_ID'),
     'api_key': config('PAYOS_API_KEY'),
     'checksum_key': config('PAYOS_CHECKSUM_KEY'),
+    'connect_timeout': config('PAYOS_CONNECT_TIMEOUT_SECONDS', default=3, cast=float),
+    'read_timeout': config('PAYOS_READ_TIMEOUT_SECONDS', default=10, cast=float),
+    'max_retries': config('PAYOS_MAX_RETRIES', default=1, cast=int),
 }
 
 CLOUDINARY = {
@@ -242,6 +259,24 @@ AUTHENTICATION_BACKENDS = [
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS').split(',')
 
+# Đặt REDIS_URL để cache (và kho token) dùng chung giữa các worker
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+EPHEMERAL_TOKEN_STORE = {
+    'BACKEND': config(
+        'EPHEMERAL_TOKEN_STORE_BACKEND',
+        default='users.token_store.CacheTokenStore' if REDIS_URL else 'users.token_store.DatabaseTokenStore',
+    ),
+    'OPTIONS': {},
+}
+
 PAYMENT_CANCEL_URL = config('PAYMENT_CANCEL_URL')
 PAYMENT_SUCCESS_URL = config('PAYMENT_SUCCESS_URL')
 
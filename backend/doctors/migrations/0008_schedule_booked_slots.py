@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+ACTIVE_STATUSES = ["P", "C", "I"]
+BITMAP_SLOTS = 63
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def fill_booked_slots(apps, schema_editor):
+    Schedule = apps.get_model("doctors", "Schedule")
+    Appointment = apps.get_model("appointments", "Appointment")
+
+    bitmaps = {}
+    rows = Appointment.objects.filter(
+        status__in=ACTIVE_STATUSES, slot_start__isnull=False
+    ).values_list(
+        "schedule_id",
+        "slot_start",
+        "schedule__start_time",
+        "schedule__end_time",
+        "schedule__default_appointment_duration_minutes",
+    )
+    for schedule_id, slot_start, start, end, minutes in rows.iterator():
+        duration = minutes * 60
+        if duration <= 0:
+            continue
+        count = max(0, (_seconds(end) - _seconds(start)) // duration)
+        delta = _seconds(slot_start) - _seconds(start)
+        if count > BITMAP_SLOTS or delta < 0 or delta % duration:
+            continue
+        index = delta // duration
+        if index < count:
+            bitmaps[schedule_id] = bitmaps.get(schedule_id, 0) | (1 << index)
+
+    for schedule_id, bitmap in bitmaps.items():
+        Schedule.objects.filter(id=schedule_id).update(booked_slots=bitmap)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doctors", "0007_alter_doctor_department"),
+        ("appointments", "0008_appointment_uniq_active_slot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="schedule",
+            name="booked_slots",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_booked_slots, migrations.RunPython.noop),
+    ]
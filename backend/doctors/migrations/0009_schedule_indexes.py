@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doctors", "0008_schedule_booked_slots"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="schedule",
+            index=models.Index(
+                fields=["doctor", "work_date", "start_time"],
+                name="schedule_doctor_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="schedule",
+            index=models.Index(
+                fields=["work_date", "start_time"], name="schedule_date_start_idx"
+            ),
+        ),
+    ]
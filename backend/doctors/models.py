@@ -101,6 +101,15 @@ class Schedule(BaseModel):
     default_appointment_duration_minutes = models.IntegerField(
         default=SCHEDULE_DEFAULTS["APPOINTMENT_DURATION_MINUTES"]
     )
+    # Bit thứ i bật khi slot thứ i của ca đang có lịch hẹn còn hiệu lực
+    booked_slots = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["doctor", "work_date", "start_time"], name="schedule_doctor_date_idx"),
+            # Tra cứu theo khoảng ngày không có doctor (lịch trống theo khoa, danh sách admin)
+            models.Index(fields=["work_date", "start_time"], name="schedule_date_start_idx"),
+        ]
 
     def __str__(self):
         return f"Schedule {self.doctor} {self.work_date} {self.shift}"
@@ -5,6 +5,7 @@ from django.http import Http404
 from rest_framework.exceptions import ValidationError # Added for ScheduleService
 from .models import Doctor, Department, ExaminationRoom, Schedule, ScheduleStatus
 from appointments.models import Appointment
+from appointments.services import SlotReservationService
 from patients.models import Patient
 from users.models import User
 from users.services import UserService
@@ -262,6 +263,9 @@ class ExaminationRoomService:
         return query.order_by('building', 'floor')
 
 class ScheduleService:
+    # Cột do SlotReservationService duy trì, không ghi từ dữ liệu người dùng
+    MAINTAINED_FIELDS = ('current_patients', 'booked_slots')
+
     def get_all_schedules(self, doctor_id, shift, work_date, room_id):
         query = Schedule.objects.filter(doctor_id=doctor_id) if doctor_id else Schedule.objects.all()
         if shift:
@@ -301,20 +305,32 @@ class ScheduleService:
 
         return Schedule.objects.create(**data)
 
+    @transaction.atomic
     def update_schedule(self, doctor_id, schedule_id, data):
-        schedule = self.get_schedule_by_id(schedule_id)
-        if schedule.doctor.id != doctor_id:
+        # Khóa dòng để đổi lưới slot không xen vào giữa một lần đặt/hủy lịch
+        schedule = get_object_or_404(Schedule.objects.select_for_update(), pk=schedule_id)
+        if schedule.doctor_id != doctor_id:
             raise Http404
 
+        update_fields = ['updated_at']
         if 'doctor' in data:
             schedule.doctor = data.pop('doctor')
+            update_fields.append('doctor')
         if 'room' in data:
             schedule.room = data.pop('room')
+            update_fields.append('room')
 
         for key, value in data.items():
-            if key not in ['current_patients']:
+            if key not in self.MAINTAINED_FIELDS:
                 setattr(schedule, key, value)
-        schedule.save()
+                update_fields.append(key)
+        # current_patients/booked_slots do SlotReservationService cập nhật bằng
+        # UPDATE có điều kiện; không ghi lại giá trị cũ trong bộ nhớ
+        schedule.save(update_fields=update_fields)
+
+        # Lưới slot thay đổi thì vị trí bit trong booked_slots cũng thay đổi
+        if {'start_time', 'end_time', 'default_appointment_duration_minutes'} & data.keys():
+            SlotReservationService.rebuild_bitmap(schedule)
         return schedule
 
     def delete_schedule(self, doctor_id, schedule_id):
@@ -331,7 +347,7 @@ class ScheduleService:
 
     @transaction.atomic
     def update_current_patients_count(self, schedule_id):
-        schedule = self.get_schedule_by_id(schedule_id)
+        schedule = get_object_or_404(Schedule.objects.select_for_update(), pk=schedule_id)
         active_statuses = [
             AppointmentStatus.PENDING.value,
             AppointmentStatus.CONFIRMED.value,
@@ -351,5 +367,6 @@ class ScheduleService:
         else:
             schedule.status = ScheduleStatus.AVAILABLE.value
 
-        schedule.save()
+        schedule.save(update_fields=['current_patients', 'status', 'updated_at'])
+        SlotReservationService.rebuild_bitmap(schedule)
         return schedule
@@ -246,6 +246,15 @@ class ScheduleServiceTest(TestCase):
         updated_schedule = self.service.update_schedule(self.doctor.id, self.schedule.id, data)
         self.assertEqual(updated_schedule.shift, Shift.AFTERNOON.value)
 
+    def test_update_schedule_keeps_maintained_columns(self):
+        # Giá trị do SlotReservationService ghi sau khi schedule được đọc
+        Schedule.objects.filter(id=self.schedule.id).update(current_patients=3, booked_slots=0b101)
+        data = {'shift': Shift.AFTERNOON.value, 'current_patients': 0, 'booked_slots': 0}
+        self.service.update_schedule(self.doctor.id, self.schedule.id, data)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.shift, Shift.AFTERNOON.value)
+        self.assertEqual((self.schedule.current_patients, self.schedule.booked_slots), (3, 0b101))
+
     def test_delete_schedule(self):
         self.service.delete_schedule(self.doctor.id, self.schedule.id)
         self.assertFalse(Schedule.objects.filter(id=self.schedule.id).exists())
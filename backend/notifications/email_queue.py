@@ -0,0 +1,179 @@
+"""
+Hàng đợi email gửi đi, lưu trong bảng OutboundEmail nên không cần broker ngoài.
+
+Request chỉ ghi một dòng (cùng transaction với nghiệp vụ) rồi trả về ngay.
+Việc gửi do worker đảm nhận:
+
+- ``manage.py run_email_worker``: tiến trình riêng với nhiều luồng.
+- Luồng nền trong tiến trình web (``settings.EMAIL_QUEUE_EAGER_WORKERS``),
+  được đánh thức sau khi transaction commit.
+
+Mỗi lượt worker nhận một lô, gửi qua một kết nối SMTP dùng chung cho cả lô.
+Lỗi được thử lại với backoff lũy thừa cho tới ``EMAIL_QUEUE["MAX_ATTEMPTS"]``.
+"""
+import logging
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from common.constants import EMAIL_QUEUE
+from common.enums import EmailStatus
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+CLAIMABLE_STATUSES = [EmailStatus.PENDING.value, EmailStatus.SENDING.value]
+RESULT_FIELDS = ["status", "attempts", "available_at", "lease_id", "sent_at", "last_error"]
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """Tương tự ``send_mail`` nhưng chỉ xếp hàng, không chờ SMTP."""
+    email = OutboundEmail.objects.create(
+        subject=str(subject),
+        body=str(message),
+        from_email=from_email or "",
+        recipients=list(recipient_list),
+    )
+    transaction.on_commit(wake_workers)
+    return email
+
+
+def backoff_seconds(attempts):
+    delay = min(
+        EMAIL_QUEUE["BACKOFF_BASE_SECONDS"] * 2 ** (attempts - 1),
+        EMAIL_QUEUE["BACKOFF_MAX_SECONDS"],
+    )
+    # Jitter để các email lỗi cùng lúc không dồn lại cùng một nhịp thử lại
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_batch(batch_size=None):
+    """
+    Giữ chỗ tối đa ``batch_size`` email đến hạn. Bản ghi SENDING quá hạn giữ chỗ
+    (worker chết giữa chừng) cũng được nhận lại.
+    """
+    batch_size = batch_size or EMAIL_QUEUE["BATCH_SIZE"]
+    now = timezone.now()
+    lease_id = uuid.uuid4()
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=CLAIMABLE_STATUSES, available_at__lte=now)
+            .order_by("available_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        # Điều kiện lặp lại để hai worker không cùng nhận một dòng trên DB
+        # không hỗ trợ SKIP LOCKED
+        OutboundEmail.objects.filter(
+            id__in=ids, status__in=CLAIMABLE_STATUSES, available_at__lte=now
+        ).update(
+            status=EmailStatus.SENDING.value,
+            available_at=now + timedelta(seconds=EMAIL_QUEUE["LEASE_SECONDS"]),
+            lease_id=lease_id,
+        )
+    return list(OutboundEmail.objects.filter(lease_id=lease_id).order_by("id"))
+
+
+def _mark_failed(email, error, now):
+    email.attempts += 1
+    email.lease_id = None
+    email.last_error = str(error)
+    if email.attempts >= EMAIL_QUEUE["MAX_ATTEMPTS"]:
+        email.status = EmailStatus.FAILED.value
+        logger.error("Email %s failed after %s attempts: %s", email.pk, email.attempts, error)
+    else:
+        email.status = EmailStatus.PENDING.value
+        email.available_at = now + timedelta(seconds=backoff_seconds(email.attempts))
+
+
+def send_batch(emails):
+    """
+    Gửi một lô qua một kết nối SMTP rồi ghi kết quả bằng một bulk_update.
+
+    Worker khác chỉ nhận lại được dòng khi giữ chỗ đã hết hạn, nên email chưa gửi
+    lúc hết hạn bị bỏ lại cho lượt nhận sau, và kết quả chỉ ghi vào các dòng còn
+    mang ``lease_id`` của lô này.
+    """
+    if not emails:
+        return 0
+    lease_id = emails[0].lease_id
+    lease_expires = min(email.available_at for email in emails)
+    attempted = []
+    try:
+        with get_connection() as connection:
+            for email in emails:
+                if timezone.now() >= lease_expires:
+                    logger.warning("Email lease %s expired, leaving %s for another worker", lease_id, email.pk)
+                    break
+                attempted.append(email)
+                try:
+                    EmailMessage(
+                        email.subject,
+                        email.body,
+                        email.from_email or None,
+                        email.recipients,
+                        connection=connection,
+                    ).send()
+                except Exception as e:
+                    _mark_failed(email, e, timezone.now())
+                else:
+                    email.status = EmailStatus.SENT.value
+                    email.attempts += 1
+                    email.lease_id = None
+                    email.sent_at = timezone.now()
+                    email.last_error = None
+    except Exception as e:
+        # Không mở được kết nối: cả lô chưa gửi được
+        now = timezone.now()
+        attempted = emails
+        for email in emails:
+            if email.status == EmailStatus.SENDING.value:
+                _mark_failed(email, e, now)
+
+    OutboundEmail.objects.filter(lease_id=lease_id).bulk_update(attempted, RESULT_FIELDS)
+    return sum(1 for email in attempted if email.status == EmailStatus.SENT.value)
+
+
+def drain(batch_size=None):
+    """Xử lý cho tới khi hết email đến hạn. Trả về (đã xử lý, gửi thành công)."""
+    processed = sent = 0
+    while True:
+        emails = claim_batch(batch_size)
+        if not emails:
+            return processed, sent
+        sent += send_batch(emails)
+        processed += len(emails)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _drain_in_background():
+    close_old_connections()
+    try:
+        drain()
+    except Exception:
+        logger.exception("Email queue worker crashed")
+    finally:
+        close_old_connections()
+
+
+def wake_workers():
+    workers = settings.EMAIL_QUEUE_EAGER_WORKERS
+    if workers <= 0:
+        return
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="email-queue")
+    _executor.submit(_drain_in_background)
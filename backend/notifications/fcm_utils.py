@@ -1,21 +1,30 @@
 # notifications/fcm_utils.py
 
-from firebase_admin import messaging
+from firebase_admin import exceptions, messaging
+
+from .firebase_config import initialize_firebase
+
+# Lỗi cho biết token không còn dùng được (app gỡ cài đặt, token sai định dạng...)
+INVALID_TOKEN_ERRORS = (messaging.UnregisteredError, messaging.SenderIdMismatchError)
+
 
 def send_to_devices(tokens: list[str], title: str, body: str):
     """
     Gửi notification đến danh sách thiết bị (FCM tokens) bằng MulticastMessage.
+    Tối đa 500 token mỗi lần gọi; trả về BatchResponse với kết quả từng token.
     """
     if not tokens:
         return None  # không gửi nếu không có token
 
+    initialize_firebase()
     message = messaging.MulticastMessage(
         notification=messaging.Notification(title=title, body=body),
         tokens=tokens,
     )
-    try:
-        response = messaging.send_multicast(message)
-        return response  # là một đối tượng SendResponse
-    except Exception as e:
-        print("Firebase send error:", e)
-        raise
+    return messaging.send_each_for_multicast(message)
+
+
+def is_invalid_token_error(error) -> bool:
+    if isinstance(error, INVALID_TOKEN_ERRORS):
+        return True
+    return isinstance(error, exceptions.InvalidArgumentError) and "registration token" in str(error)
@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from common.constants import EMAIL_QUEUE
+from notifications.email_queue import drain
+
+
+class Command(BaseCommand):
+    help = (
+        "Chạy pool worker gửi email từ bảng OutboundEmail. Mỗi luồng nhận một lô, "
+        "gửi qua một kết nối SMTP và thử lại với backoff khi lỗi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=EMAIL_QUEUE["BATCH_SIZE"])
+        parser.add_argument("--poll-interval", type=float, default=EMAIL_QUEUE["POLL_SECONDS"])
+        parser.add_argument(
+            "--once", action="store_true", help="Gửi hết email đang đến hạn rồi thoát"
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        totals = {"processed": 0, "sent": 0}
+        lock = threading.Lock()
+
+        def work():
+            try:
+                while not stop.is_set():
+                    close_old_connections()
+                    processed, sent = drain(options["batch_size"])
+                    with lock:
+                        totals["processed"] += processed
+                        totals["sent"] += sent
+                    if options["once"]:
+                        return
+                    if not processed:
+                        stop.wait(options["poll_interval"])
+            finally:
+                connection.close()
+
+        self.stdout.write(f"Email worker: {options['workers']} luồng, lô {options['batch_size']}")
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = [pool.submit(work) for _ in range(options["workers"])]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                stop.set()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Đã xử lý {totals['processed']} email, gửi thành công {totals['sent']}."
+            )
+        )
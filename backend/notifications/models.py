@@ -1,8 +1,9 @@
 from django.db import models
 from core.models import BaseModel
 from users.models import User
-from common.enums import NotificationType
-from common.constants import COMMON_LENGTH, ENUM_LENGTH
+from django.utils import timezone
+from common.enums import NotificationType, EmailStatus
+from common.constants import COMMON_LENGTH, ENUM_LENGTH, EMAIL_LENGTH
 
 class Notification(BaseModel):
     user = models.ForeignKey(User, on_delete=models.RESTRICT)
@@ -24,3 +25,41 @@ class Token(BaseModel):
     def __str__(self):
         return f"Token {self.pk}"
 
+
+class NotificationDelivery(models.Model):
+    """Kết quả gửi một Notification tới một token FCM."""
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='deliveries')
+    token = models.CharField(max_length=COMMON_LENGTH["TOKEN"])
+    success = models.BooleanField()
+    message_id = models.CharField(max_length=COMMON_LENGTH["TOKEN"], blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Delivery {self.pk} of notification {self.notification_id}"
+
+
+class OutboundEmail(BaseModel):
+    subject = models.CharField(max_length=EMAIL_LENGTH["SUBJECT"])
+    body = models.TextField()
+    from_email = models.CharField(max_length=EMAIL_LENGTH["FROM"], blank=True)
+    recipients = models.JSONField()
+    status = models.CharField(
+        max_length=ENUM_LENGTH["DEFAULT"],
+        choices=[(s.value, s.name) for s in EmailStatus],
+        default=EmailStatus.PENDING.value,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    # Lúc sớm nhất được gửi (PENDING) hoặc lúc hết hạn giữ chỗ của worker (SENDING)
+    available_at = models.DateTimeField(default=timezone.now)
+    lease_id = models.UUIDField(blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Email {self.pk} to {', '.join(self.recipients)}"
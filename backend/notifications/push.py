@@ -0,0 +1,112 @@
+"""
+Gửi thông báo đẩy (FCM) tới nhiều người dùng mà không chặn request.
+
+``notify_users`` tạo Notification cho từng người bằng một bulk_create, gom
+token thành các lô multicast (``FCM["MULTICAST_BATCH"]``) và chuyển các lô cho
+pool worker sau khi transaction commit. Kết quả từng token được lưu vào
+NotificationDelivery; token FCM báo không còn hợp lệ bị xóa khỏi bảng Token.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from common.constants import FCM
+from .fcm_utils import send_to_devices, is_invalid_token_error
+from .models import Notification, NotificationDelivery, Token
+
+logger = logging.getLogger(__name__)
+
+
+def notify_users(users, title, message, type):
+    """
+    Tạo thông báo cho danh sách người dùng (instance hoặc id) và lên lịch gửi đẩy.
+    Trả về các Notification vừa tạo; việc gửi diễn ra ở nền.
+    """
+    user_ids = list(dict.fromkeys(getattr(user, 'id', user) for user in users))
+    if not user_ids:
+        return []
+
+    now = timezone.now()
+    notifications = Notification.objects.bulk_create([
+        Notification(user_id=user_id, title=title, message=message, type=type, sent_at=now)
+        for user_id in user_ids
+    ])
+    notification_ids = {notification.user_id: notification.id for notification in notifications}
+
+    targets = {}
+    for token, user_id in Token.objects.filter(user_id__in=user_ids).values_list('token', 'user_id'):
+        # Một thiết bị có thể đăng ký trùng token, chỉ gửi một lần
+        targets.setdefault(token, notification_ids[user_id])
+    targets = list(targets.items())
+
+    size = FCM["MULTICAST_BATCH"]
+    batches = [targets[i:i + size] for i in range(0, len(targets), size)]
+    if batches:
+        transaction.on_commit(partial(dispatch_batches, batches, title, message))
+    return notifications
+
+
+def deliver_batch(batch, title, body):
+    """
+    Gửi một lô (token, notification_id) bằng một multicast, lưu kết quả và
+    xóa token không hợp lệ. Trả về số token gửi thành công.
+    """
+    tokens = [token for token, _ in batch]
+    try:
+        results = send_to_devices(tokens, title, body).responses
+    except Exception as e:
+        logger.exception("FCM multicast failed for %s tokens", len(tokens))
+        results = [SimpleNamespace(success=False, message_id=None, exception=e)] * len(tokens)
+
+    deliveries = []
+    invalid_tokens = []
+    for (token, notification_id), result in zip(batch, results):
+        deliveries.append(NotificationDelivery(
+            notification_id=notification_id,
+            token=token,
+            success=result.success,
+            message_id=result.message_id,
+            error=None if result.success else str(result.exception),
+        ))
+        if not result.success and is_invalid_token_error(result.exception):
+            invalid_tokens.append(token)
+
+    NotificationDelivery.objects.bulk_create(deliveries)
+    if invalid_tokens:
+        Token.objects.filter(token__in=invalid_tokens).delete()
+    return sum(1 for delivery in deliveries if delivery.success)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _deliver_in_background(batch, title, body):
+    close_old_connections()
+    try:
+        deliver_batch(batch, title, body)
+    except Exception:
+        logger.exception("FCM push worker crashed")
+    finally:
+        close_old_connections()
+
+
+def dispatch_batches(batches, title, body):
+    workers = settings.FCM_PUSH_WORKERS
+    if workers <= 0:
+        for batch in batches:
+            deliver_batch(batch, title, body)
+        return
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fcm-push")
+    for batch in batches:
+        _executor.submit(_deliver_in_background, batch, title, body)
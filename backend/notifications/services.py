@@ -1,9 +1,8 @@
 # notifications/services.py
 
-from datetime import datetime
 from .models import Notification, Token
 from .firebase_config import initialize_firebase
-from .fcm_utils import send_to_devices
+from .push import notify_users
 
 # Đảm bảo Firebase được khởi tạo
 initialize_firebase()
@@ -11,19 +10,16 @@ initialize_firebase()
 class NotificationService:
     @staticmethod
     def create(data: dict) -> Notification:
-        tokens = TokenService.get_tokens_by_user_id(data['user'].id)
-
-        firebase_response = send_to_devices(tokens, data['title'], data['message']) if tokens else None
-
-        notification = Notification.objects.create(
-            user=data['user'],
-            title=data['title'],
-            message=data['message'],
-            type=data['type'],
-            sent_at=datetime.now(),
-            response=firebase_response.__dict__ if firebase_response else None
-        )
-        return notification
+        return NotificationService.create_many(
+            [data['user']], data['title'], data['message'], data['type']
+        )[0]
+
+    @staticmethod
+    def create_many(users, title: str, message: str, type: str) -> list[Notification]:
+        """
+        Tạo thông báo cho nhiều người dùng; FCM được gửi theo lô ở nền sau khi commit.
+        """
+        return notify_users(users, title, message, type)
 
     @staticmethod
     def get_all_notifications():
@@ -0,0 +1,180 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from common.constants import EMAIL_QUEUE
+from common.enums import EmailStatus
+from .email_queue import queue_mail, claim_batch, drain, backoff_seconds, send_batch
+from .models import OutboundEmail
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailQueueTest(TestCase):
+    def _queue(self, count=1):
+        return [
+            queue_mail('Subject', f'Body {i}', 'noreply@example.com', [f'user{i}@example.com'])
+            for i in range(count)
+        ]
+
+    def test_queue_mail_does_not_send(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            email = queue_mail('Subject', 'Body', 'noreply@example.com', ['a@example.com'])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(email.status, EmailStatus.PENDING.value)
+        self.assertEqual(email.recipients, ['a@example.com'])
+
+    def test_drain_sends_and_marks_sent(self):
+        self._queue(3)
+        processed, sent = drain()
+        self.assertEqual((processed, sent), (3, 3))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status=EmailStatus.SENT.value).exists())
+        self.assertEqual(drain(), (0, 0))
+
+    def test_one_connection_per_batch(self):
+        self._queue(5)
+        with patch('notifications.email_queue.get_connection', wraps=mail.get_connection) as get_connection:
+            drain(batch_size=2)
+        self.assertEqual(get_connection.call_count, 3)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_failure_is_retried_with_backoff(self):
+        email, = self._queue()
+        with patch('notifications.email_queue.EmailMessage.send', side_effect=OSError('smtp down')):
+            self.assertEqual(drain(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailStatus.PENDING.value)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, 'smtp down')
+        self.assertGreater(email.available_at, timezone.now())
+        # Chưa tới hạn thử lại
+        self.assertEqual(drain(), (0, 0))
+
+        OutboundEmail.objects.filter(pk=email.pk).update(available_at=timezone.now())
+        self.assertEqual(drain(), (1, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailStatus.SENT.value)
+        self.assertEqual(email.attempts, 2)
+
+    def test_connection_failure_fails_whole_batch(self):
+        self._queue(2)
+        with patch('notifications.email_queue.get_connection', side_effect=OSError('refused')):
+            self.assertEqual(drain(), (2, 0))
+        self.assertEqual(
+            OutboundEmail.objects.filter(status=EmailStatus.PENDING.value, attempts=1).count(), 2
+        )
+
+    def test_gives_up_after_max_attempts(self):
+        email, = self._queue()
+        OutboundEmail.objects.filter(pk=email.pk).update(attempts=EMAIL_QUEUE["MAX_ATTEMPTS"] - 1)
+        with patch('notifications.email_queue.EmailMessage.send', side_effect=OSError('smtp down')), \
+                self.assertLogs('notifications.email_queue', level='ERROR'):
+            drain()
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailStatus.FAILED.value)
+
+    def test_expired_lease_is_reclaimed(self):
+        email, = self._queue()
+        self.assertEqual(len(claim_batch()), 1)
+        self.assertEqual(claim_batch(), [])
+        OutboundEmail.objects.filter(pk=email.pk).update(available_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([e.pk for e in claim_batch()], [email.pk])
+
+    def test_expired_lease_is_not_sent(self):
+        email, = self._queue()
+        stale = claim_batch()
+        OutboundEmail.objects.filter(pk=email.pk).update(available_at=timezone.now() - timedelta(seconds=1))
+        # Worker khác nhận lại và gửi trước
+        self.assertEqual(drain(), (1, 1))
+
+        after_lease = stale[0].available_at + timedelta(seconds=1)
+        with patch('notifications.email_queue.timezone.now', return_value=after_lease):
+            self.assertEqual(send_batch(stale), 0)
+        self.assertEqual(len(mail.outbox), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (EmailStatus.SENT.value, 1))
+
+    def test_result_is_not_written_to_reclaimed_row(self):
+        email, = self._queue()
+        stale = claim_batch()
+        reclaimed = []
+
+        def lease_lost(*args, **kwargs):
+            # Giữ chỗ hết hạn khi đang gửi và worker khác đã nhận lại dòng
+            OutboundEmail.objects.filter(pk=email.pk).update(available_at=timezone.now())
+            reclaimed.extend(claim_batch())
+            return 1
+
+        with patch('notifications.email_queue.EmailMessage.send', side_effect=lease_lost):
+            send_batch(stale)
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailStatus.SENDING.value)
+        self.assertEqual(email.lease_id, reclaimed[0].lease_id)
+        self.assertEqual(email.attempts, 0)
+
+    def test_interleaved_workers_send_each_email_once(self):
+        emails = self._queue(6)
+        # Ba worker nhận lô xen kẽ; lô của worker đầu hết hạn trước khi gửi
+        first, second, third = claim_batch(2), claim_batch(2), claim_batch(2)
+        self.assertEqual(claim_batch(2), [])
+        OutboundEmail.objects.filter(pk__in=[e.pk for e in first]).update(
+            available_at=timezone.now() - timedelta(seconds=1)
+        )
+        reclaimed = claim_batch(2)
+        self.assertEqual({e.pk for e in reclaimed}, {e.pk for e in first})
+
+        send_batch(third)
+        send_batch(reclaimed)
+        with patch('notifications.email_queue.timezone.now',
+                   return_value=first[0].available_at + timedelta(seconds=1)):
+            send_batch(first)
+        send_batch(second)
+
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox), sorted(e.recipients[0] for e in emails)
+        )
+        self.assertEqual(
+            OutboundEmail.objects.filter(status=EmailStatus.SENT.value, attempts=1).count(), 6
+        )
+
+    def test_backoff_grows_and_is_capped(self):
+        with patch('notifications.email_queue.random.uniform', return_value=1):
+            self.assertEqual(backoff_seconds(1), EMAIL_QUEUE["BACKOFF_BASE_SECONDS"])
+            self.assertEqual(backoff_seconds(2), EMAIL_QUEUE["BACKOFF_BASE_SECONDS"] * 2)
+            self.assertEqual(backoff_seconds(50), EMAIL_QUEUE["BACKOFF_MAX_SECONDS"])
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_QUEUE_EAGER_WORKERS=0,
+)
+class RunEmailWorkerCommandTest(TransactionTestCase):
+    # Worker chạy trong luồng riêng nên dữ liệu phải được commit thật
+
+    def test_run_email_worker_once(self):
+        for i in range(3):
+            queue_mail('Subject', 'Body', 'noreply@example.com', [f'user{i}@example.com'])
+        out = StringIO()
+        call_command('run_email_worker', '--once', '--workers', '1', stdout=out)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutboundEmail.objects.filter(status=EmailStatus.SENT.value).count(), 3)
+        self.assertIn('3', out.getvalue())
+
+    # SQLite khóa cả bảng giữa các kết nối của DB test trong bộ nhớ; nhiều luồng
+    # chỉ chạy được trên DB có khóa dòng SKIP LOCKED (PostgreSQL)
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_concurrent_workers_send_each_email_once(self):
+        recipients = [f'user{i}@example.com' for i in range(12)]
+        for recipient in recipients:
+            queue_mail('Subject', 'Body', 'noreply@example.com', [recipient])
+        out = StringIO()
+        call_command('run_email_worker', '--once', '--workers', '3', '--batch-size', '2', stdout=out)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(recipients))
+        self.assertEqual(
+            OutboundEmail.objects.filter(status=EmailStatus.SENT.value, attempts=1).count(), 12
+        )
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from firebase_admin import messaging
+from common.constants import FCM
+from common.enums import NotificationType, UserRole
+from users.models import User
+from .models import Notification, NotificationDelivery, Token
+from .push import notify_users
+
+
+class FakeFcm:
+    """Giả lập send_to_devices: token bắt đầu bằng 'dead' bị FCM báo hủy đăng ký."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, tokens, title, body):
+        self.calls.append(list(tokens))
+        return SimpleNamespace(responses=[
+            SimpleNamespace(success=False, message_id=None, exception=messaging.UnregisteredError('unregistered'))
+            if token.startswith('dead') else
+            SimpleNamespace(success=True, message_id=f'msg-{token}', exception=None)
+            for token in tokens
+        ])
+
+
+@override_settings(FCM_PUSH_WORKERS=0)
+class NotifyUsersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(email=f'user{i}@example.com', password='testpass123', role=UserRole.PATIENT.value)
+            for i in range(3)
+        ]
+
+    def _notify(self, users=None):
+        return notify_users(users or self.users, 'Nhắc lịch', 'Bạn có lịch khám ngày mai', NotificationType.APPOINTMENT.value)
+
+    def test_creates_one_notification_per_user_and_defers_sending(self):
+        Token.objects.create(user=self.users[0], token='token-0')
+        fcm = FakeFcm()
+        with patch('notifications.push.send_to_devices', new=fcm), \
+                self.captureOnCommitCallbacks() as callbacks:
+            notifications = self._notify(self.users + [self.users[0].id])
+        self.assertEqual(len(notifications), 3)
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(fcm.calls, [])
+
+    def test_tokens_are_sent_in_multicast_batches(self):
+        count = FCM["MULTICAST_BATCH"] * 2 + 1
+        Token.objects.bulk_create([
+            Token(user=self.users[i % 3], token=f'token-{i}') for i in range(count)
+        ])
+        fcm = FakeFcm()
+        with patch('notifications.push.send_to_devices', new=fcm), \
+                self.captureOnCommitCallbacks(execute=True):
+            self._notify()
+        self.assertEqual([len(call) for call in fcm.calls], [FCM["MULTICAST_BATCH"], FCM["MULTICAST_BATCH"], 1])
+        self.assertEqual(NotificationDelivery.objects.filter(success=True).count(), count)
+
+    def test_invalid_tokens_are_pruned_and_results_saved(self):
+        Token.objects.create(user=self.users[0], token='live-0')
+        Token.objects.create(user=self.users[1], token='dead-1')
+        fcm = FakeFcm()
+        with patch('notifications.push.send_to_devices', new=fcm), \
+                self.captureOnCommitCallbacks(execute=True):
+            self._notify()
+        self.assertEqual(list(Token.objects.values_list('token', flat=True)), ['live-0'])
+        failed = NotificationDelivery.objects.get(token='dead-1')
+        self.assertFalse(failed.success)
+        self.assertEqual(failed.notification.user, self.users[1])
+        self.assertEqual(NotificationDelivery.objects.get(token='live-0').message_id, 'msg-live-0')
+
+    def test_transport_error_keeps_tokens(self):
+        Token.objects.create(user=self.users[0], token='live-0')
+        with patch('notifications.push.send_to_devices', side_effect=OSError('network down')), \
+                self.assertLogs('notifications.push', level='ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self._notify()
+        self.assertTrue(Token.objects.filter(token='live-0').exists())
+        delivery = NotificationDelivery.objects.get()
+        self.assertFalse(delivery.success)
+        self.assertEqual(delivery.error, 'network down')
+
+    def test_users_without_tokens_schedule_nothing(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self._notify()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(Notification.objects.count(), 3)
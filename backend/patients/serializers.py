@@ -76,5 +76,6 @@ class PatientSerializer(serializers.ModelSerializer):
         }
     
     def get_emergency_contacts(self, obj):
-        emergency_contacts = EmergencyContact.objects.filter(patient=obj)
+        # Dùng reverse manager để tận dụng prefetch_related khi serialize danh sách
+        emergency_contacts = obj.emergencycontact_set.all()
         return EmergencyContactSerializer(emergency_contacts, many=True).data
@@ -0,0 +1,215 @@
+"""
+Lập hóa đơn hàng loạt (cuối ngày) cho các lịch hẹn đã hoàn thành.
+
+Lịch hẹn đặt qua ứng dụng đã có hóa đơn đặt lịch (chỉ phí khám, chưa có dòng chi
+tiết, UNPAID hoặc BOOKING_PAID). Hóa đơn đó được bổ sung dòng chi tiết thay vì lập
+hóa đơn mới. Lịch hẹn đã có hóa đơn PAID hoặc hóa đơn có dòng chi tiết thì coi như
+đã lập xong và bị bỏ qua.
+
+Mỗi lô ``BULK_BILLING["CHUNK_SIZE"]`` lịch hẹn chạy trong một transaction với số
+query cố định, không phụ thuộc số lịch hẹn:
+
+- Khóa các lịch hẹn của lô và hóa đơn đã có của chúng, bỏ những lịch hẹn đã lập
+  xong (lần chạy song song).
+- Phí khám: một dòng CONSULTATION theo ``Doctor.price``, hoặc theo ``total_cost``
+  đã tính lúc đặt lịch với hóa đơn đặt lịch.
+- Phí dịch vụ: tổng ``ServiceOrder`` → ``Service.price`` theo lịch hẹn (GROUP BY).
+- Tiền thuốc: các dòng ``PrescriptionDetail`` → ``Medicine.price``, mỗi dòng một
+  BillDetail loại MEDICINE; giảm trừ ``Medicine.insurance_discount`` khi thuốc
+  được bảo hiểm chi trả và bệnh nhân có số bảo hiểm.
+- Ghi Bill mới bằng ``bulk_create``, tổng tiền hóa đơn đặt lịch bằng
+  ``bulk_update``, rồi BillDetail bằng ``bulk_create``.
+
+``bulk_create`` không gọi ``Bill.save`` hay signal nên ``service_fee`` và
+``outstanding`` của hóa đơn mới được tính sẵn ở đây theo cùng quy tắc (xem
+``payments.totals``). Hóa đơn đặt lịch đã có ``service_fee`` và ``paid_amount``
+do signal duy trì, chỉ ``outstanding`` được tính lại trên cột.
+Phí dịch vụ chỉ nằm ở ``service_fee``, không thành BillDetail, để không bị tính
+hai lần vào ``outstanding``.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Sum
+from django.utils import timezone
+
+from appointments.models import Appointment, ServiceOrder
+from pharmacy.models import PrescriptionDetail
+from common.constants import BULK_BILLING
+from common.enums import AppointmentStatus, BillItemType, PaymentStatus
+from .models import Bill, BillDetail
+
+ZERO = Decimal("0")
+CONSULTATION_ITEM_TYPE = BillItemType.CONSULTATION.value
+MEDICINE_ITEM_TYPE = BillItemType.MEDICINE.value
+BILL_TOTAL_FIELDS = ["total_cost", "insurance_discount", "amount", "updated_at"]
+
+
+def _has_details():
+    return Exists(BillDetail.objects.filter(bill_id=OuterRef("pk")))
+
+
+def billable_appointments(day=None, appointment_ids=None):
+    """
+    Lịch hẹn COMPLETED chưa lập hóa đơn xong (không có hóa đơn, hoặc chỉ có hóa đơn
+    đặt lịch chưa có dòng chi tiết), lọc theo ngày khám và/hoặc danh sách id.
+    """
+    closed_bills = Bill.objects.filter(Q(status=PaymentStatus.PAID.value) | _has_details())
+    appointments = Appointment.objects.filter(status=AppointmentStatus.COMPLETED.value).filter(
+        ~Exists(closed_bills.filter(appointment_id=OuterRef("pk")))
+    )
+    if day is not None:
+        appointments = appointments.filter(schedule__work_date=day)
+    if appointment_ids is not None:
+        appointments = appointments.filter(pk__in=appointment_ids)
+    return appointments
+
+
+def _service_fees(appointment_ids):
+    return dict(
+        ServiceOrder.objects.filter(appointment_id__in=appointment_ids)
+        .order_by()
+        .values("appointment_id")
+        .annotate(total=Sum("service__price"))
+        .values_list("appointment_id", "total")
+    )
+
+
+def _medicine_lines(appointment_ids):
+    lines = {}
+    rows = (
+        PrescriptionDetail.objects.filter(
+            prescription__appointment_id__in=appointment_ids, prescription__is_deleted=False
+        )
+        .order_by("id")
+        .values_list(
+            "prescription__appointment_id",
+            "quantity",
+            "medicine__price",
+            "medicine__is_insurance_covered",
+            "medicine__insurance_discount",
+            "prescription__patient__insurance_number",
+        )
+    )
+    for appointment_id, quantity, price, covered, unit_discount, insurance_number in rows:
+        discount = (unit_discount or ZERO) * quantity if covered and insurance_number else ZERO
+        lines.setdefault(appointment_id, []).append(
+            BillDetail(
+                item_type=MEDICINE_ITEM_TYPE,
+                quantity=quantity,
+                unit_price=price,
+                total_price=price * quantity,
+                insurance_discount=discount,
+            )
+        )
+    return lines
+
+
+def bill_chunk(appointment_ids):
+    """
+    Lập hóa đơn cho một lô lịch hẹn trong một transaction. Trả về (hóa đơn đã lập
+    hoặc bổ sung, dòng chi tiết).
+    """
+    with transaction.atomic():
+        appointments = list(
+            Appointment.objects.select_for_update(of=("self",))
+            .filter(pk__in=appointment_ids, status=AppointmentStatus.COMPLETED.value)
+            .order_by("pk")
+            .values_list("pk", "patient_id", "doctor__price")
+        )
+        existing = (
+            Bill.objects.select_for_update()
+            .filter(appointment_id__in=[row[0] for row in appointments])
+            .annotate(has_details=_has_details())
+            .order_by("pk")
+            .values_list("appointment_id", "pk", "total_cost", "status", "has_details")
+        )
+        closed, booking_bills = set(), {}
+        for appointment_id, bill_id, total_cost, bill_status, has_details in existing:
+            if has_details or bill_status == PaymentStatus.PAID.value:
+                closed.add(appointment_id)
+            else:
+                booking_bills.setdefault(appointment_id, (bill_id, total_cost))
+        appointments = [row for row in appointments if row[0] not in closed]
+        if not appointments:
+            return 0, 0
+
+        ids = [row[0] for row in appointments]
+        service_fees = _service_fees(ids)
+        medicine_lines = _medicine_lines(ids)
+
+        now = timezone.now()
+        bills, updated, details = [], [], []
+        for appointment_id, patient_id, doctor_price in appointments:
+            lines = medicine_lines.get(appointment_id, [])
+            booking_bill = booking_bills.get(appointment_id)
+            # Hóa đơn đặt lịch giữ phí khám đã tính lúc đặt (có thể là booking_fee)
+            consultation = booking_bill[1] if booking_bill else doctor_price
+            if consultation:
+                lines.insert(0, BillDetail(
+                    item_type=CONSULTATION_ITEM_TYPE,
+                    quantity=1,
+                    unit_price=consultation,
+                    total_price=consultation,
+                    insurance_discount=ZERO,
+                ))
+            total_cost = sum((line.total_price for line in lines), ZERO)
+            insurance_discount = sum((line.insurance_discount for line in lines), ZERO)
+            amount = total_cost - insurance_discount
+            if booking_bill:
+                if not lines:
+                    continue
+                bill = Bill(
+                    pk=booking_bill[0],
+                    total_cost=total_cost,
+                    insurance_discount=insurance_discount,
+                    amount=amount,
+                    updated_at=now,
+                )
+                updated.append(bill)
+            else:
+                service_fee = service_fees.get(appointment_id) or ZERO
+                bill = Bill(
+                    appointment_id=appointment_id,
+                    patient_id=patient_id,
+                    total_cost=total_cost,
+                    insurance_discount=insurance_discount,
+                    amount=amount,
+                    status=PaymentStatus.UNPAID.value,
+                    service_fee=service_fee,
+                    paid_amount=ZERO,
+                    outstanding=amount + service_fee,
+                )
+                bills.append(bill)
+            details.append((bill, lines))
+
+        Bill.objects.bulk_create(bills)
+        if updated:
+            Bill.objects.bulk_update(updated, BILL_TOTAL_FIELDS)
+            Bill.objects.filter(pk__in=[bill.pk for bill in updated]).update(
+                outstanding=F("amount") + F("service_fee") - F("paid_amount")
+            )
+        rows = []
+        for bill, lines in details:
+            for line in lines:
+                line.bill = bill
+                rows.append(line)
+        BillDetail.objects.bulk_create(rows)
+        return len(bills) + len(updated), len(rows)
+
+
+def bill_appointments(day=None, appointment_ids=None, chunk_size=None):
+    """
+    Lập hóa đơn cho mọi lịch hẹn ``billable_appointments(day, appointment_ids)``,
+    mỗi lô một transaction. Trả về (hóa đơn, dòng chi tiết) đã ghi.
+    """
+    chunk_size = chunk_size or BULK_BILLING["CHUNK_SIZE"]
+    ids = list(
+        billable_appointments(day, appointment_ids).order_by("pk").values_list("pk", flat=True)
+    )
+    bills = details = 0
+    for start in range(0, len(ids), chunk_size):
+        created_bills, created_details = bill_chunk(ids[start:start + chunk_size])
+        bills += created_bills
+        details += created_details
+    return bills, details
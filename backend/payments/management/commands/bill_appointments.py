@@ -0,0 +1,56 @@
+import time as perf_time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from common.constants import BULK_BILLING
+from payments.billing import bill_appointments, billable_appointments
+
+
+class Command(BaseCommand):
+    help = (
+        "Lập hóa đơn hàng loạt cho các lịch hẹn đã hoàn thành, theo ngày khám hoặc danh sách "
+        "lịch hẹn, trong từng lô transaction. Lịch hẹn đã có hóa đơn đặt lịch (chưa có dòng chi "
+        "tiết, chưa PAID) được bổ sung phí khám, tiền thuốc và phí dịch vụ vào hóa đơn đó."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date", help="Ngày khám (YYYY-MM-DD); mặc định hôm nay nếu không truyền --appointments"
+        )
+        parser.add_argument(
+            "--appointments", type=int, nargs="+", metavar="ID", help="Chỉ lập hóa đơn cho các lịch hẹn này"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=BULK_BILLING["CHUNK_SIZE"], help="Số lịch hẹn mỗi transaction"
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm lịch hẹn cần lập hóa đơn")
+
+    def handle(self, *args, **options):
+        day = None
+        if options["date"]:
+            try:
+                day = date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError("Ngày không hợp lệ, cần dạng YYYY-MM-DD")
+        elif not options["appointments"]:
+            day = timezone.localdate()
+        if options["chunk_size"] <= 0:
+            raise CommandError("--chunk-size phải lớn hơn 0")
+
+        if options["dry_run"]:
+            count = billable_appointments(day, options["appointments"]).count()
+            self.stdout.write(f"{count} lịch hẹn cần lập hóa đơn (chưa ghi).")
+            return
+
+        started = perf_time.perf_counter()
+        bills, details = bill_appointments(day, options["appointments"], options["chunk_size"])
+        elapsed = perf_time.perf_counter() - started
+        rate = bills / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Đã lập hoặc bổ sung {bills} hóa đơn, {details} dòng chi tiết trong {elapsed:.2f}s "
+                f"({rate:.0f} hóa đơn/s)."
+            )
+        )
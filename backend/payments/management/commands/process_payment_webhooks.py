@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from common.constants import PAYOS_WEBHOOK
+from payments.webhooks import drain
+
+
+class Command(BaseCommand):
+    help = (
+        "Chạy pool worker xử lý hộp thư webhook PayOS. Mỗi sự kiện được áp dụng "
+        "trong transaction khóa hóa đơn và thử lại với backoff khi lỗi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--batch-size", type=int, default=PAYOS_WEBHOOK["BATCH_SIZE"])
+        parser.add_argument("--poll-interval", type=float, default=PAYOS_WEBHOOK["POLL_SECONDS"])
+        parser.add_argument(
+            "--once", action="store_true", help="Xử lý hết sự kiện đang đến hạn rồi thoát"
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        totals = {"processed": 0, "succeeded": 0}
+        lock = threading.Lock()
+
+        def work():
+            try:
+                while not stop.is_set():
+                    close_old_connections()
+                    processed, succeeded = drain(options["batch_size"])
+                    with lock:
+                        totals["processed"] += processed
+                        totals["succeeded"] += succeeded
+                    if options["once"]:
+                        return
+                    if not processed:
+                        stop.wait(options["poll_interval"])
+            finally:
+                connection.close()
+
+        self.stdout.write(f"Webhook worker: {options['workers']} luồng, lô {options['batch_size']}")
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = [pool.submit(work) for _ in range(options["workers"])]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                stop.set()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Đã xử lý {totals['processed']} webhook, thành công {totals['succeeded']}."
+            )
+        )
@@ -0,0 +1,39 @@
+import time as perf_time
+
+from django.core.management.base import BaseCommand
+
+from payments.totals import drifted, rebuild_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Đối soát service_fee, paid_amount và outstanding của hóa đơn với ServiceOrder và "
+        "Transaction, rồi tính lại toàn bộ bằng một câu UPDATE với subquery GROUP BY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Chỉ đếm và liệt kê các hóa đơn lệch, không sửa"
+        )
+        parser.add_argument("--show", type=int, default=20, help="Số hóa đơn lệch in ra")
+
+    def handle(self, *args, **options):
+        started = perf_time.perf_counter()
+        bills = drifted().order_by("id")
+        count = bills.count()
+        for bill in bills[:options["show"]]:
+            self.stdout.write(
+                f"Hóa đơn {bill.id}: service_fee {bill.service_fee} → {bill.expected_service_fee}, "
+                f"paid_amount {bill.paid_amount} → {bill.expected_paid_amount}"
+            )
+        if options["dry_run"]:
+            self.stdout.write(f"{count} hóa đơn lệch (chưa sửa).")
+            return
+
+        updated = rebuild_totals() if count else 0
+        elapsed = perf_time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Đã tính lại {updated} hóa đơn, {count} hóa đơn lệch trong {elapsed:.2f}s."
+            )
+        )
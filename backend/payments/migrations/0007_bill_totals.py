@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:59
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    """Cùng phép tính với payments.totals.rebuild_totals, trên model lịch sử."""
+    Bill = apps.get_model("payments", "Bill")
+    ServiceOrder = apps.get_model("appointments", "ServiceOrder")
+    Transaction = apps.get_model("payments", "Transaction")
+    money = models.DecimalField(max_digits=10, decimal_places=2)
+    fees = (
+        ServiceOrder.objects.filter(appointment_id=OuterRef("appointment_id"))
+        .order_by()
+        .values("appointment_id")
+        .annotate(total=Sum("service__price"))
+        .values("total")
+    )
+    paid = (
+        Transaction.objects.filter(bill_id=OuterRef("pk"), status="S")
+        .order_by()
+        .values("bill_id")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    service_fee = Coalesce(Subquery(fees), Value(Decimal("0")), output_field=money)
+    paid_amount = Coalesce(Subquery(paid), Value(Decimal("0")), output_field=money)
+    Bill.objects.update(
+        service_fee=service_fee,
+        paid_amount=paid_amount,
+        outstanding=F("amount") + service_fee - paid_amount,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointments", "0011_appointmenttriage"),
+        ("payments", "0006_transaction_bill_created_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bill",
+            name="outstanding",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0"), max_digits=10
+            ),
+        ),
+        migrations.AddField(
+            model_name="bill",
+            name="paid_amount",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0"), max_digits=10
+            ),
+        ),
+        migrations.AddField(
+            model_name="bill",
+            name="service_fee",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0"), max_digits=10
+            ),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("appointments", "0011_appointmenttriage"),
+        ("patients", "0003_patient_avatar_alter_patient_gender"),
+        ("payments", "0007_bill_totals"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bill",
+            index=models.Index(fields=["created_at", "id"], name="bill_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="bill",
+            index=models.Index(
+                fields=["status", "created_at", "id"], name="bill_status_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bill",
+            index=models.Index(
+                fields=["patient", "created_at", "id"], name="bill_patient_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bill",
+            index=models.Index(fields=["amount", "id"], name="bill_amount_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="bill",
+            index=models.Index(fields=["total_cost", "id"], name="bill_total_cost_idx"),
+        ),
+    ]
@@ -1,8 +1,12 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import F, Sum
+from django.db.models.expressions import Combinable
+from django.utils import timezone
 from core.models import BaseModel
-from appointments.models import Appointment
+from appointments.models import Appointment, ServiceOrder
 from patients.models import Patient
-from common.enums import PaymentStatus, PaymentMethod, TransactionStatus
+from common.enums import PaymentStatus, PaymentMethod, TransactionStatus, WebhookStatus
 from common.constants import PAYMENT_LENGTH, DECIMAL_MAX_DIGITS, DECIMAL_DECIMAL_PLACES, ENUM_LENGTH
 
 class Bill(BaseModel):
@@ -12,10 +16,58 @@ class Bill(BaseModel):
     insurance_discount = models.DecimalField(max_digits=DECIMAL_MAX_DIGITS, decimal_places=DECIMAL_DECIMAL_PLACES, blank=True, null=True)
     amount = models.DecimalField(max_digits=DECIMAL_MAX_DIGITS, decimal_places=DECIMAL_DECIMAL_PLACES)
     status = models.CharField(max_length=ENUM_LENGTH["DEFAULT"], choices=[(p.value, p.name) for p in PaymentStatus])
+    # Cột tổng hợp, cộng dồn bằng UPDATE ... F() (payments.totals); save() không ghi đè
+    service_fee = models.DecimalField(max_digits=DECIMAL_MAX_DIGITS, decimal_places=DECIMAL_DECIMAL_PLACES, default=Decimal("0"))
+    paid_amount = models.DecimalField(max_digits=DECIMAL_MAX_DIGITS, decimal_places=DECIMAL_DECIMAL_PLACES, default=Decimal("0"))
+    # amount + service_fee - paid_amount, âm khi trả thừa
+    outstanding = models.DecimalField(max_digits=DECIMAL_MAX_DIGITS, decimal_places=DECIMAL_DECIMAL_PLACES, default=Decimal("0"))
+
+    MAINTAINED_TOTALS = ("service_fee", "paid_amount", "outstanding")
+
+    class Meta:
+        indexes = [
+            # Khóa keyset của BillService.get_all_bills (BillService.SORT_KEYS),
+            # mỗi cách sắp xếp một index, kết thúc bằng id để thứ tự là duy nhất
+            models.Index(fields=["created_at", "id"], name="bill_created_idx"),
+            models.Index(fields=["status", "created_at", "id"], name="bill_status_created_idx"),
+            models.Index(fields=["patient", "created_at", "id"], name="bill_patient_created_idx"),
+            models.Index(fields=["amount", "id"], name="bill_amount_idx"),
+            models.Index(fields=["total_cost", "id"], name="bill_total_cost_idx"),
+        ]
 
     def __str__(self):
         return f"Bill {self.pk}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            # Hóa đơn lập sau khi đã chỉ định dịch vụ cho lịch hẹn
+            if self.appointment_id is not None and not self.service_fee:
+                self.service_fee = ServiceOrder.objects.filter(
+                    appointment_id=self.appointment_id
+                ).aggregate(total=Sum("service__price"))["total"] or Decimal("0")
+            amount, service_fee, paid_amount = (
+                self._meta.get_field(name).to_python(value or 0)
+                for name, value in (("amount", self.amount), ("service_fee", self.service_fee), ("paid_amount", self.paid_amount))
+            )
+            self.outstanding = amount + service_fee - paid_amount
+            super().save(*args, **kwargs)
+            return
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            update_fields = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.MAINTAINED_TOTALS
+            ]
+        if "amount" in update_fields and "outstanding" not in update_fields:
+            # Tính trên dòng đang khóa, không dùng giá trị tổng hợp cũ trong bộ nhớ
+            self.outstanding = F("service_fee") - F("paid_amount") + self.amount
+            update_fields = [*update_fields, "outstanding"]
+        kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+        if isinstance(self.outstanding, Combinable):
+            self.refresh_from_db(fields=self.MAINTAINED_TOTALS)
+
 
 class BillDetail(BaseModel):
     bill = models.ForeignKey(Bill, on_delete=models.RESTRICT, related_name='details')
@@ -35,6 +87,40 @@ class Transaction(BaseModel):
     payment_method = models.CharField(max_length=ENUM_LENGTH["DEFAULT"], choices=[(m.value, m.name) for m in PaymentMethod])
     transaction_date = models.DateTimeField()
     status = models.CharField(max_length=ENUM_LENGTH["DEFAULT"], choices=[(t.value, t.name) for t in TransactionStatus])
+    # orderCode của link thanh toán PayOS tạo ra giao dịch này
+    order_code = models.BigIntegerField(blank=True, null=True, unique=True)
+
+    class Meta:
+        indexes = [
+            # Giao dịch mới nhất của hóa đơn: filter(bill=...).order_by('-created_at')
+            models.Index(fields=["bill", "-created_at"], name="txn_bill_created_idx"),
+        ]
 
     def __str__(self):
         return f"Transaction {self.pk}"
+
+
+class PaymentWebhookEvent(BaseModel):
+    """Webhook PayOS đã xác thực chữ ký, chờ xử lý (payments.webhooks)."""
+    # PayOS gửi lại cùng orderCode khi thử lại; chỉ giữ bản đầu tiên
+    order_code = models.BigIntegerField(unique=True)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=ENUM_LENGTH["DEFAULT"],
+        choices=[(s.value, s.name) for s in WebhookStatus],
+        default=WebhookStatus.PENDING.value,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    # Lúc sớm nhất được xử lý (PENDING) hoặc lúc hết hạn giữ chỗ của worker (PROCESSING)
+    available_at = models.DateTimeField(default=timezone.now)
+    lease_id = models.UUIDField(blank=True, null=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="webhook_event_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"Webhook {self.order_code}"
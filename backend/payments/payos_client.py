@@ -0,0 +1,169 @@
+"""
+Client PayOS dùng chung trong tiến trình và cache trạng thái link thanh toán.
+
+``get_payos_client`` tạo ``payos.PayOS`` một lần cho mỗi tiến trình, trên một
+``httpx.Client`` giữ kết nối keep-alive (``PAYOS_CLIENT["POOL_SIZE"]``) với
+timeout kết nối/đọc lấy từ ``settings.PAYOS``.
+
+Trang checkout hỏi trạng thái link liên tục, nên ``get_link_info`` đọc qua
+Django cache: link còn chờ thanh toán giữ ``INFO_CACHE_SECONDS``, link đã ở
+trạng thái cuối giữ ``FINAL_INFO_CACHE_SECONDS``. Các lời gọi giống nhau đang
+chạy đồng thời chỉ gửi một request. ``get_link_statuses`` hỏi nhiều orderCode
+một lần: đọc cache bằng ``get_many`` rồi gọi song song các mã còn thiếu.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import httpx
+import payos
+from django.conf import settings
+from django.core.cache import cache
+
+from common.constants import PAYOS_CLIENT
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = {"PAID", "CANCELLED", "EXPIRED"}
+CACHE_KEY = "payos:link:{}"
+
+_client = None
+_http_client = None
+_client_lock = threading.Lock()
+
+
+def _build_client(config):
+    read_timeout = config.get("read_timeout") or PAYOS_CLIENT["READ_TIMEOUT_SECONDS"]
+    connect_timeout = config.get("connect_timeout") or PAYOS_CLIENT["CONNECT_TIMEOUT_SECONDS"]
+    max_retries = config.get("max_retries", PAYOS_CLIENT["MAX_RETRIES"])
+    # Các hàm kiểu cũ (getPaymentLinkInformation, cancelPaymentLink, ...) gọi thẳng
+    # http_client nên timeout phải đặt trên chính httpx.Client
+    http_client = httpx.Client(
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        limits=httpx.Limits(
+            max_connections=PAYOS_CLIENT["POOL_SIZE"],
+            max_keepalive_connections=PAYOS_CLIENT["POOL_SIZE"],
+            keepalive_expiry=PAYOS_CLIENT["KEEPALIVE_SECONDS"],
+        ),
+    )
+    client = payos.PayOS(
+        client_id=config["client_id"],
+        api_key=config["api_key"],
+        checksum_key=config["checksum_key"],
+        timeout=read_timeout,
+        max_retries=max_retries,
+        http_client=http_client,
+    )
+    return client, http_client
+
+
+def get_payos_client():
+    """Client PayOS dùng chung của tiến trình."""
+    global _client, _http_client
+    with _client_lock:
+        if _client is None:
+            _client, _http_client = _build_client(settings.PAYOS)
+    return _client
+
+
+def reset_client():
+    """Bỏ client hiện tại và đóng các kết nối (đổi cấu hình, test)."""
+    global _client, _http_client
+    with _client_lock:
+        http_client, _client, _http_client = _http_client, None, None
+    if http_client is not None:
+        http_client.close()
+
+
+def cache_key(order_code):
+    return CACHE_KEY.format(int(order_code))
+
+
+def _snapshot(result):
+    return {
+        "orderCode": getattr(result, "orderCode", None),
+        "status": getattr(result, "status", None),
+        "amount": getattr(result, "amount", None),
+        "amountPaid": getattr(result, "amountPaid", None),
+        "description": getattr(result, "description", None),
+    }
+
+
+def _fetch(order_code):
+    info = _snapshot(get_payos_client().getPaymentLinkInformation(orderId=order_code))
+    timeout = (
+        PAYOS_CLIENT["FINAL_INFO_CACHE_SECONDS"]
+        if info["status"] in FINAL_STATUSES
+        else PAYOS_CLIENT["INFO_CACHE_SECONDS"]
+    )
+    cache.set(cache_key(order_code), info, timeout)
+    return info
+
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _fetch_once(order_code):
+    with _in_flight_lock:
+        call = _in_flight.get(order_code)
+        leader = call is None
+        if leader:
+            call = _in_flight[order_code] = Future()
+    if not leader:
+        return call.result()
+
+    try:
+        call.set_result(_fetch(order_code))
+    except Exception as e:
+        call.set_exception(e)
+    finally:
+        with _in_flight_lock:
+            del _in_flight[order_code]
+    return call.result()
+
+
+def get_link_info(order_code):
+    """Thông tin link thanh toán (orderCode, status, amount, ...) qua cache."""
+    info = cache.get(cache_key(order_code))
+    if info is None:
+        info = _fetch_once(int(order_code))
+    return info
+
+
+def forget_link_info(order_code):
+    cache.delete(cache_key(order_code))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _status_or_none(order_code):
+    try:
+        return _fetch_once(order_code)["status"]
+    except Exception as e:
+        logger.warning("Could not fetch PayOS status for %s: %s", order_code, e)
+        return None
+
+
+def get_link_statuses(order_codes):
+    """
+    Trạng thái PayOS của nhiều link: ``{orderCode: status}``, None với mã không
+    lấy được. Mã chưa có trong cache được gọi song song trên pool kết nối chung.
+    """
+    codes = list(dict.fromkeys(int(code) for code in order_codes))
+    keys = {cache_key(code): code for code in codes}
+    statuses = {keys[key]: info["status"] for key, info in cache.get_many(list(keys)).items()}
+    missing = [code for code in codes if code not in statuses]
+    if len(missing) == 1:
+        statuses[missing[0]] = _status_or_none(missing[0])
+    elif missing:
+        global _executor
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=PAYOS_CLIENT["POOL_SIZE"], thread_name_prefix="payos-status"
+                )
+        statuses.update(zip(missing, _executor.map(_status_or_none, missing)))
+    return {code: statuses[code] for code in codes}
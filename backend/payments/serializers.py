@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import Bill, BillDetail, Transaction
-from common.enums import PaymentStatus, ServiceType
-from common.constants import PAYMENT_LENGTH, DECIMAL_MAX_DIGITS, DECIMAL_DECIMAL_PLACES, COMMON_LENGTH
+from common.enums import BillItemType, PaymentStatus
+from common.constants import PAYMENT_LENGTH, DECIMAL_MAX_DIGITS, DECIMAL_DECIMAL_PLACES, COMMON_LENGTH, PAYOS_CLIENT
 
 class TransactionDTOSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,7 +9,7 @@ class TransactionDTOSerializer(serializers.ModelSerializer):
         fields = ['id', 'bill_id', 'amount', 'payment_method', 'transaction_date', 'status', 'created_at', 'updated_at']
 
 class NewBillDetailRequestSerializer(serializers.Serializer):
-    item_type = serializers.ChoiceField(choices=[(i.value, i.name) for i in ServiceType])
+    item_type = serializers.ChoiceField(choices=[(i.value, i.name) for i in BillItemType])
     quantity = serializers.IntegerField(min_value=1)
     unit_price = serializers.DecimalField(max_digits=DECIMAL_MAX_DIGITS, decimal_places=DECIMAL_DECIMAL_PLACES)
     insurance_discount = serializers.DecimalField(max_digits=DECIMAL_MAX_DIGITS, decimal_places=DECIMAL_DECIMAL_PLACES, allow_null=True)
@@ -27,6 +27,38 @@ class UpdateBillRequestSerializer(serializers.Serializer):
     appointment_id = serializers.IntegerField(required=False)
     status = serializers.ChoiceField(choices=[(s.value, s.name) for s in PaymentStatus], required=False)
 
+class BillFilterSerializer(serializers.Serializer):
+    # Cursor rỗng hoặc không có là trang đầu; trang sau dùng nextCursor của trang trước
+    cursor = serializers.CharField(required=False, allow_blank=True)
+    size = serializers.IntegerField(required=False, min_value=1, max_value=100)
+    sort_by = serializers.ChoiceField(choices=['created_at', 'status', 'amount', 'total_cost'], required=False)
+    sort_order = serializers.ChoiceField(choices=['asc', 'desc'], required=False)
+    status = serializers.ChoiceField(choices=[(s.value, s.name) for s in PaymentStatus], required=False)
+    patient_id = serializers.IntegerField(required=False)
+    appointment_id = serializers.IntegerField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError({"date_to": "Ngày kết thúc phải sau ngày bắt đầu"})
+        return attrs
+
+class PaymentStatusQuerySerializer(serializers.Serializer):
+    # order_codes=1001,2002,...
+    order_codes = serializers.CharField()
+
+    def validate_order_codes(self, value):
+        try:
+            codes = list(dict.fromkeys(int(code) for code in value.split(',') if code.strip()))
+        except ValueError:
+            raise serializers.ValidationError("orderCode phải là số nguyên")
+        if not codes:
+            raise serializers.ValidationError("Cần ít nhất một orderCode")
+        if len(codes) > PAYOS_CLIENT["BATCH_MAX"]:
+            raise serializers.ValidationError(f"Tối đa {PAYOS_CLIENT['BATCH_MAX']} orderCode mỗi lần")
+        return codes
+
 class BillDetailResponseSerializer(serializers.ModelSerializer):
     class Meta:
         model = BillDetail
@@ -45,17 +77,13 @@ class BillResponseSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'appointment', 'patient',
             'total_cost', 'insurance_discount', 'amount',
+            'service_fee', 'paid_amount', 'outstanding',
             'status', 'created_at', 'updated_at', 'bill_details'
         ]
 
     def get_amount(self, obj):
         booking_fee = getattr(obj.appointment, "booking_fee", 0)
-        service_fee = sum(
-            float(order.service.price)
-            for order in obj.appointment.serviceorder_set.all()
-            if order.service and order.service.price
-        )
-        return booking_fee + service_fee - (obj.insurance_discount or 0)
+        return booking_fee + obj.service_fee - (obj.insurance_discount or 0)
 
 
 # class BillSerializer(serializers.ModelSerializer):
@@ -95,8 +123,10 @@ class BillResponseSerializer(serializers.ModelSerializer):
 # serializers.py
 class BillSerializer(serializers.ModelSerializer):
     booking_fee = serializers.SerializerMethodField()
-    service_fee = serializers.SerializerMethodField()
-    amount = serializers.SerializerMethodField()  # vẫn giữ tính toán từ transaction
+    # Số đã thanh toán (tổng giao dịch SUCCESS), lấy từ cột tổng hợp
+    amount = serializers.DecimalField(
+        source='paid_amount', max_digits=DECIMAL_MAX_DIGITS, decimal_places=DECIMAL_DECIMAL_PLACES, read_only=True
+    )
 
     class Meta:
         model = Bill
@@ -111,18 +141,9 @@ class BillSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at',
             'booking_fee',
-            'service_fee'
+            'service_fee',
+            'outstanding'
         ]
 
     def get_booking_fee(self, obj):
         return getattr(obj.appointment, "booking_fee", 0)
-
-    def get_service_fee(self, obj):
-        orders = obj.appointment.serviceorder_set.all()
-        return sum(float(order.service.price) for order in orders if order.service and order.service.price)
-
-    def get_amount(self, obj):
-        return sum(
-            float(t.amount) for t in obj.transaction_set.all()
-            if t.status == "SUCCESS"
-        )
@@ -1,50 +1,135 @@
-import payos
 import logging
+from datetime import datetime, timedelta
+from decimal import Decimal
 from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction as django_transaction
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from payos.types import CreatePaymentLinkRequest, ItemData
+from rest_framework.exceptions import ValidationError
 
 from appointments.models import Appointment 
 
 from .models import Bill, BillDetail, Transaction
+from .payos_client import forget_link_info, get_link_info, get_link_statuses, get_payos_client
 from .serializers import TransactionDTOSerializer
-from common.enums import PaymentStatus, TransactionStatus, ServiceType, PaymentMethod, AppointmentStatus # THÊM AppointmentStatus
+from .totals import rebuild_totals
+from .webhooks import apply_payment, bill_id_from_order_code, record_webhook
+from common.utils import encode_cursor, decode_cursor
+from common.enums import PaymentStatus, TransactionStatus, ServiceType, PaymentMethod
 from appointments.serializers import AppointmentSerializer
 
 logger = logging.getLogger(__name__)
 
 class BillService:
-    def get_all_bills(self, page, size, sort_by='created_at', sort_order='desc'):
-        if page <= 0:
-            raise ValueError(_("Số trang không được nhỏ hơn hoặc bằng 0"))
-        if size < 1 or size > 100:
-            size = 10
-        valid_sort_fields = ['created_at', 'total_cost', 'amount', 'status']
-        if sort_by not in valid_sort_fields:
+    CURSOR_SALT = "payments.bills.cursor"
+    # Cách sắp xếp cho phép -> khóa keyset, khớp với các index trong Bill.Meta
+    SORT_KEYS = {
+        'created_at': ('created_at', 'id'),
+        'status': ('status', 'created_at', 'id'),
+        'amount': ('amount', 'id'),
+        'total_cost': ('total_cost', 'id'),
+    }
+    DEFAULT_PAGE_SIZE = 10
+    MAX_PAGE_SIZE = 100
+
+    @staticmethod
+    def keyset_filter(fields, values, op):
+        """
+        Điều kiện "đứng sau" (fields) > (values) theo thứ tự từ điển, viết dạng
+        a <= x AND (a < x OR (b <= y AND ...)) để cột đầu là một khoảng trên index.
+        """
+        field, value = fields[0], values[0]
+        if len(fields) == 1:
+            return Q(**{f"{field}__{op}": value})
+        return Q(**{f"{field}__{op}e": value}) & (
+            Q(**{f"{field}__{op}": value}) | BillService.keyset_filter(fields[1:], values[1:], op)
+        )
+
+    def get_all_bills(
+        self,
+        size=DEFAULT_PAGE_SIZE,
+        cursor=None,
+        sort_by='created_at',
+        sort_order='desc',
+        status=None,
+        patient_id=None,
+        appointment_id=None,
+        date_from=None,
+        date_to=None,
+    ):
+        """
+        Phân trang keyset theo SORT_KEYS[sort_by]: lấy size + 1 dòng, không
+        OFFSET, không COUNT(*). Cursor có chữ ký gắn với cách sắp xếp.
+        """
+        if size < 1 or size > self.MAX_PAGE_SIZE:
+            size = self.DEFAULT_PAGE_SIZE
+        if sort_by not in self.SORT_KEYS:
             sort_by = 'created_at'
-        order_prefix = '-' if sort_order.lower() == 'desc' else ''
-        return Bill.objects.all().order_by(f"{order_prefix}{sort_by}")[(page - 1) * size:page * size]
+        descending = sort_order.lower() == 'desc'
+        keys = self.SORT_KEYS[sort_by]
+        salt = f"{self.CURSOR_SALT}:{sort_by}:{'desc' if descending else 'asc'}"
+
+        queryset = Bill.objects.select_related('appointment')
+        if status:
+            queryset = queryset.filter(status=status)
+        if patient_id:
+            queryset = queryset.filter(patient_id=patient_id)
+        if appointment_id:
+            queryset = queryset.filter(appointment_id=appointment_id)
+        # Khoảng nửa mở trên created_at thay vì created_at__date để dùng được index
+        if date_from:
+            queryset = queryset.filter(created_at__gte=self._start_of_day(date_from))
+        if date_to:
+            queryset = queryset.filter(created_at__lt=self._start_of_day(date_to + timedelta(days=1)))
+
+        fields = [Bill._meta.get_field(key) for key in keys]
+        if cursor:
+            values = decode_cursor(cursor, salt)
+            try:
+                values = [field.to_python(value) for field, value in zip(fields, values, strict=True)]
+            except (TypeError, ValueError, DjangoValidationError):
+                raise ValidationError({"cursor": _("Cursor phân trang không hợp lệ.")})
+            queryset = queryset.filter(self.keyset_filter(keys, values, 'lt' if descending else 'gt'))
+
+        prefix = '-' if descending else ''
+        rows = list(queryset.order_by(*(f"{prefix}{key}" for key in keys))[:size + 1])
+        has_next = len(rows) > size
+        rows = rows[:size]
+
+        next_cursor = None
+        if has_next:
+            next_cursor = encode_cursor([field.value_to_string(rows[-1]) for field in fields], salt)
+
+        return {
+            "results": rows,
+            "pageSize": size,
+            "nextCursor": next_cursor,
+            "last": not has_next,
+        }
+
+    @staticmethod
+    def _start_of_day(day):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
 
     @django_transaction.atomic
     def create_bill(self, data):
         bill = Bill(
             appointment_id=data['appointment_id'],
             patient_id=data['patient_id'],
-            total_cost=0,   # sẽ tính lại
             insurance_discount=data['insurance_discount'],
-            amount=0,
             status=data['status']
         )
-        bill.save()
 
         # Nếu có bill_details (luồng admin)
         if data.get('bill_details'):
             bill_details = [
                 BillDetail(
-                    bill=bill,
                     item_type=detail_data['item_type'],
                     quantity=detail_data['quantity'],
                     unit_price=detail_data['unit_price'],
@@ -53,17 +138,18 @@ class BillService:
                 )
                 for detail_data in data['bill_details']
             ]
+            # ✅ Tổng tiền từ chính các dòng sắp ghi, không đọc lại từ DB
+            bill.total_cost = sum(d.total_price for d in bill_details)
+            bill.insurance_discount = sum(d.insurance_discount for d in bill_details)
+            bill.amount = bill.total_cost - bill.insurance_discount
+            bill.save()
+            for detail in bill_details:
+                detail.bill = bill
             BillDetail.objects.bulk_create(bill_details)
 
-            # ✅ Tính lại tổng tiền từ bill_details
-            bill_details_qs = bill.details.all()
-            bill.total_cost = sum(d.total_price for d in bill_details_qs)
-            bill.insurance_discount = sum(d.insurance_discount or 0 for d in bill_details_qs)
-            bill.amount = bill.total_cost - (bill.insurance_discount or 0)
-
         else:
             # ✅ Luồng booking (bệnh nhân đặt lịch, chưa có service)
-            appointment = Appointment.objects.get(pk=data['appointment_id'])
+            appointment = Appointment.objects.select_related('doctor').get(pk=data['appointment_id'])
             doctor_price = getattr(appointment.doctor, "price", 0) or 0
             booking_fee = getattr(appointment, "booking_fee", 0) or 0
 
@@ -72,17 +158,23 @@ class BillService:
             bill.total_cost = base_price
             bill.insurance_discount = 0   # sau này nếu có tính bảo hiểm thì set vào đây
             bill.amount = base_price - bill.insurance_discount
+            bill.save()
 
-        bill.save()
         return bill
 
     @django_transaction.atomic
     def update_bill(self, id, data):
-        bill = get_object_or_404(Bill, pk=id)
+        # Khóa hóa đơn để save() toàn bộ không ghi đè cập nhật đồng thời
+        bill = get_object_or_404(Bill.objects.select_for_update(), pk=id)
+        old_appointment_id = bill.appointment_id
         for key, value in data.items():
             if value is not None:
                 setattr(bill, key, value)
         bill.save()
+        if bill.appointment_id != old_appointment_id:
+            # Phí dịch vụ đi theo lịch hẹn mới
+            rebuild_totals(Bill.objects.filter(pk=bill.pk))
+            bill.refresh_from_db(fields=Bill.MAINTAINED_TOTALS)
         return bill
 
     def get_bill_by_id(self, id):
@@ -94,7 +186,9 @@ class BillService:
 
     @django_transaction.atomic
     def create_bill_detail(self, bill_id, data):
-        bill = get_object_or_404(Bill, pk=bill_id)
+        # Khóa hóa đơn tới hết transaction để các lần thêm chi tiết đồng thời
+        # tổng hợp lần lượt, không làm mất dòng của nhau
+        bill = get_object_or_404(Bill.objects.select_for_update(), pk=bill_id)
         bill_details = [
             BillDetail(
                 bill=bill,
@@ -108,11 +202,14 @@ class BillService:
         ]
         if bill_details:
             BillDetail.objects.bulk_create(bill_details)
-        bill_details_qs = bill.details.all()
-        bill.total_cost = sum(d.total_price for d in bill_details_qs)
-        bill.insurance_discount = sum(d.insurance_discount or 0 for d in bill_details_qs)
-        bill.amount = bill.total_cost - (bill.insurance_discount or 0)
-        bill.save()
+        totals = bill.details.aggregate(
+            total_cost=Coalesce(Sum('total_price'), Value(Decimal('0'))),
+            insurance_discount=Coalesce(Sum('insurance_discount'), Value(Decimal('0'))),
+        )
+        bill.total_cost = totals['total_cost']
+        bill.insurance_discount = totals['insurance_discount']
+        bill.amount = bill.total_cost - bill.insurance_discount
+        bill.save(update_fields=['total_cost', 'insurance_discount', 'amount', 'updated_at'])
         return bill
 
     def get_detail_by_bill(self, bill_id):
@@ -123,14 +220,12 @@ class BillService:
         return details
 
     def get_bills_by_patient_id(self, patient_id):
-        return Bill.objects.filter(patient_id=patient_id)
+        return Bill.objects.filter(patient_id=patient_id).select_related('appointment')
 
 class PayOSService:
     def __init__(self):
-        payos_config = settings.PAYOS
-        self.payos = payos.PayOS(client_id=payos_config['client_id'], 
-                            api_key=payos_config['api_key'], 
-                            checksum_key=payos_config['checksum_key'])
+        # Client và pool kết nối dùng chung cho cả tiến trình
+        self.payos = get_payos_client()
 
     def create_payment_link(self, bill_id):
         bill = get_object_or_404(Bill, pk=bill_id)
@@ -145,19 +240,19 @@ class PayOSService:
             raise ValueError(_("Số tiền thanh toán không hợp lệ"))
 
 
-        item = payos.ItemData(name=f"Hóa đơn #{bill_id}", quantity=1, price=amount)
+        item = ItemData(name=f"Hóa đơn #{bill_id}", quantity=1, price=amount)
         order_code = int(bill_id) * 1000 + (int(timezone.now().timestamp()) % 1000)
 
-        payment_data = payos.PaymentData(
-            orderCode=order_code,
+        payment_data = CreatePaymentLinkRequest(
+            order_code=order_code,
             description=f"Thanh toán hóa đơn #{bill_id}",
             amount=amount,
-            cancelUrl=f"{settings.PAYMENT_CANCEL_URL}/{bill_id}/cancel",
-            returnUrl=f"{settings.PAYMENT_SUCCESS_URL}/{bill_id}/success",
+            cancel_url=f"{settings.PAYMENT_CANCEL_URL}/{bill_id}/cancel",
+            return_url=f"{settings.PAYMENT_SUCCESS_URL}/{bill_id}/success",
             items=[item]
         )
 
-        response = self.payos.createPaymentLink(paymentData=payment_data)
+        response = self.payos.payment_requests.create(payment_data)
 
         # Ghi transaction với số tiền đúng
         transaction = Transaction.objects.create(
@@ -165,53 +260,19 @@ class PayOSService:
             amount=amount,
             payment_method=PaymentMethod.ONLINE_BANKING.value,
             transaction_date=timezone.now(),
-            status=TransactionStatus.PENDING.value
+            status=TransactionStatus.PENDING.value,
+            order_code=order_code,
         )
 
-        return response.checkoutUrl
+        return response.checkout_url
 
 
     def handle_payment_callback(self, webhook_data):
+        """Xác thực chữ ký rồi đưa webhook vào hộp thư; hóa đơn được cập nhật ở payments.webhooks."""
         try:
             data = self.payos.verifyPaymentWebhookData(webhook_data)
-    
-            bill_id = data.orderCode // 1000
-            bill = get_object_or_404(Bill, pk=bill_id)
-            transaction = Transaction.objects.filter(bill=bill).order_by('-created_at').first()
-
-            logger.info(f"Processing webhook for bill_id: {bill_id}, orderCode: {data.orderCode}")
-
-            is_success = (
-                webhook_data.get('success') is True or 
-                getattr(data, 'status', '') == 'PAID' or
-                webhook_data.get('status') == 'PAID'
-            )
-
-            paid_amount = int(transaction.amount or 0)
-
-            if is_success:
-                if paid_amount == int(bill.amount) and bill.details.count() == 0:
-                    bill.status = PaymentStatus.BOOKING_PAID.value
-                    if bill.appointment_id:
-                        appointment = get_object_or_404(Appointment, pk=bill.appointment_id)
-                        appointment.status = AppointmentStatus.CONFIRMED.value
-                        appointment.save()
-                    logger.info(f"Bill {bill_id} set to BOOKING_PAID and appointment confirmed.")
-                elif paid_amount >= int(bill.amount):
-                    bill.status = PaymentStatus.PAID.value
-                    logger.info(f"Bill {bill_id} set to PAID.")
-
-                if transaction:
-                    transaction.status = TransactionStatus.SUCCESS.value
-            else:
-                if transaction:
-                    transaction.status = TransactionStatus.FAILED.value
-                logger.info(f"Payment failed for bill {bill_id}")
-
-            bill.save()
-            if transaction:
-                transaction.save()
-
+            record_webhook(data.orderCode, webhook_data)
+            logger.info(f"Queued webhook for orderCode: {data.orderCode}")
             return data
         except Exception as e:
             logger.error(f"Error in handle_payment_callback: {str(e)}")
@@ -221,7 +282,7 @@ class PayOSService:
     def get_payment_info(self, order_id):
             try:
                 logger.info(f"Retrieving payment info for order_id {order_id}")
-                result = self.payos.getPaymentLinkInformation(orderId=order_id)
+                result = get_link_info(order_id)
 
                 # Trích xuất bill_id từ order_id
                 bill_id_from_order = int(order_id) // 1000
@@ -230,11 +291,11 @@ class PayOSService:
                 appointment = Appointment.objects.filter(id=bill.appointment_id).first()
                 
                 result_dict = {
-                    'orderCode': getattr(result, 'orderCode', None),
-                    'status': getattr(result, 'status', None),
+                    'orderCode': result['orderCode'],
+                    'status': result['status'],
                     'amount': bill.amount,
-                    # Lấy description từ đối tượng result của PayOS
-                    'description': getattr(result, 'description', f"Thanh toán hóa đơn #{bill_id_from_order}"), 
+                    # Lấy description từ thông tin link của PayOS
+                    'description': result['description'] or f"Thanh toán hóa đơn #{bill_id_from_order}", 
                     'createdAt': bill.created_at.isoformat(),
                     'appointment': AppointmentSerializer(appointment).data if appointment else None
                 }
@@ -247,6 +308,7 @@ class PayOSService:
     def cancel_payment(self, order_id):
         try:
             result = self.payos.cancelPaymentLink(orderId=order_id)
+            forget_link_info(order_id)
             result_dict = {
                 'orderCode': getattr(result, 'orderCode', None),
                 'status': getattr(result, 'status', None),
@@ -257,20 +319,36 @@ class PayOSService:
             logger.error(f"Error canceling payment for order_id {order_id}: {str(e)}")
             raise ValueError(_("Lỗi khi hủy thanh toán: {error}").format(error=str(e)))
 
+    def get_payment_statuses(self, order_codes):
+        """
+        Trạng thái nhiều link thanh toán trong một lần hỏi. Giao dịch đã có kết
+        quả (webhook hoặc trang return đã ghi nhận) trả lời từ DB bằng một query;
+        chỉ các mã còn PENDING mới hỏi PayOS (qua cache).
+        """
+        local_statuses = {
+            TransactionStatus.SUCCESS.value: "PAID",
+            TransactionStatus.FAILED.value: "CANCELLED",
+        }
+        statuses = {
+            order_code: local_statuses[txn_status]
+            for order_code, txn_status in Transaction.objects.filter(
+                order_code__in=order_codes, status__in=list(local_statuses)
+            ).values_list('order_code', 'status')
+        }
+        pending = [code for code in order_codes if code not in statuses]
+        if pending:
+            statuses.update(get_link_statuses(pending))
+        return [{'orderCode': code, 'status': statuses[code]} for code in order_codes]
+
 class TransactionService:
     def create_payment_link(self, bill_id):
         return PayOSService().create_payment_link(bill_id)
 
     @django_transaction.atomic
     def process_cash_payment(self, bill_id):
-        bill = get_object_or_404(Bill, pk=bill_id)
+        bill = get_object_or_404(Bill.objects.select_for_update(), pk=bill_id)
 
-        booking_fee = int(getattr(bill.appointment, "booking_fee", 0) or 0)
-        service_fee = int(sum(
-            float(o.service.price)
-            for o in bill.appointment.serviceorder_set.all()
-            if o.service and o.service.price
-        ))
+        service_fee = int(bill.service_fee)
 
         # 🔹 Nếu bill chưa trả booking thì không cho thanh toán cash
         if bill.status == PaymentStatus.UNPAID.value:
@@ -301,41 +379,26 @@ class TransactionService:
         # 🔹 Nếu status khác thì báo lỗi
         raise ValueError(_("Trạng thái hóa đơn không hợp lệ để thanh toán tiền mặt"))
 
-    @django_transaction.atomic
     def handle_payment_success(self, order_id):
-        bill_id = int(order_id) // 1000 if int(order_id) > 1000 else int(order_id)
-        bill = get_object_or_404(Bill, pk=bill_id)
-        transaction = Transaction.objects.filter(bill=bill).order_by('-created_at').first()
-
-        if not transaction or transaction.status != TransactionStatus.PENDING.value:
+        order_id = int(order_id)
+        # order_id > 1000 là orderCode của PayOS: chỉ cập nhật đúng giao dịch của link đó
+        if order_id > 1000:
+            bill_id, order_code = bill_id_from_order_code(order_id), order_id
+        else:
+            bill_id, order_code = order_id, None
+        try:
+            transaction = apply_payment(bill_id, order_code=order_code)
+        except Bill.DoesNotExist:
+            raise Http404(_("Không tìm thấy hóa đơn"))
+        if transaction is None:
             logger.warning(f"Payment success handler called for order {order_id} but transaction not in PENDING state or not found.")
-            return
-
-        paid_amount = int(transaction.amount or 0)
-
-        if paid_amount == int(bill.amount) and bill.details.count() == 0:
-            bill.status = PaymentStatus.BOOKING_PAID.value
-            if bill.appointment_id:
-                appointment = get_object_or_404(Appointment, pk=bill.appointment_id)
-                appointment.status = AppointmentStatus.CONFIRMED.value
-                appointment.save()
-            logger.info(f"Bill {bill.id} set to BOOKING_PAID and appointment confirmed by booking payment.")
-        elif paid_amount >= int(bill.amount):
-            bill.status = PaymentStatus.PAID.value
-            logger.info(f"Bill {bill.id} set to PAID by full payment.")
-
-
-        transaction.status = TransactionStatus.SUCCESS.value
-        bill.save()
-        transaction.save()
 
 
     def handle_payment_cancel(self, order_id):
-        bill = get_object_or_404(Bill, pk=order_id)
-        transaction = Transaction.objects.filter(bill=bill).order_by('-created_at').first()
-        if transaction and transaction.status == TransactionStatus.PENDING.value:
-            transaction.status = TransactionStatus.FAILED.value
-            transaction.save()
+        try:
+            apply_payment(order_id, success=False)
+        except Bill.DoesNotExist:
+            raise Http404(_("Không tìm thấy hóa đơn"))
 
     def get_transactions_by_bill_id(self, bill_id, sort_by='transaction_date', sort_order='desc'):
         try:
@@ -0,0 +1,95 @@
+"""
+Giữ các cột tổng hợp của Bill (payments.totals) khớp với ServiceOrder và Transaction.
+
+Khi nạp một instance, ta ghi lại phần nó đang đóng góp vào hóa đơn (lịch hẹn và
+dịch vụ của ServiceOrder; hóa đơn và số tiền SUCCESS của Transaction). Sau khi
+lưu hoặc xóa thì trừ phần cũ và cộng phần mới, chỉ khi có thay đổi, nên cập
+nhật trạng thái hay kết quả xét nghiệm không tốn thêm câu lệnh nào.
+
+``QuerySet.update()`` không phát signal; dùng ``manage.py reconcile_bill_totals``
+sau các thao tác như vậy.
+"""
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from appointments.models import ServiceOrder
+from common.enums import TransactionStatus
+from .models import Transaction
+from .totals import ZERO, add_payment, add_service_fee, service_price
+
+UNKNOWN = object()
+
+
+def _loaded(instance, *fields):
+    """Giá trị các trường đã nạp; UNKNOWN nếu có trường bị defer (tránh query thêm)."""
+    values = instance.__dict__
+    if any(field not in values for field in fields):
+        return UNKNOWN
+    return tuple(values[field] for field in fields)
+
+
+def _order_key(order):
+    return _loaded(order, "appointment_id", "service_id")
+
+
+def _payment_key(txn):
+    loaded = _loaded(txn, "bill_id", "status", "amount")
+    if loaded is UNKNOWN:
+        return UNKNOWN
+    bill_id, status, amount = loaded
+    return bill_id, (amount or ZERO) if status == TransactionStatus.SUCCESS.value else ZERO
+
+
+@receiver(post_init, sender=ServiceOrder)
+def remember_service_order(sender, instance, **kwargs):
+    instance._billed = _order_key(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=ServiceOrder)
+def service_order_saved(sender, instance, created, **kwargs):
+    old = None if created else getattr(instance, "_billed", UNKNOWN)
+    new = _order_key(instance)
+    if old is UNKNOWN or new is UNKNOWN or old == new:
+        instance._billed = new
+        return
+    if old is not None and old[0] is not None:
+        add_service_fee(old[0], -service_price(old[1]))
+    if new[0] is not None:
+        price = instance.service.price if ServiceOrder.service.is_cached(instance) else service_price(new[1])
+        add_service_fee(new[0], price)
+    instance._billed = new
+
+
+@receiver(post_delete, sender=ServiceOrder)
+def service_order_deleted(sender, instance, **kwargs):
+    old = getattr(instance, "_billed", UNKNOWN)
+    if old is UNKNOWN or old is None or old[0] is None:
+        return
+    add_service_fee(old[0], -service_price(old[1]))
+
+
+@receiver(post_init, sender=Transaction)
+def remember_transaction(sender, instance, **kwargs):
+    instance._paid = _payment_key(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_saved(sender, instance, created, **kwargs):
+    old = None if created else getattr(instance, "_paid", UNKNOWN)
+    new = _payment_key(instance)
+    if old is UNKNOWN or new is UNKNOWN or old == new:
+        instance._paid = new
+        return
+    if old is not None and old[1]:
+        add_payment(old[0], -old[1])
+    if new[1]:
+        add_payment(new[0], new[1])
+    instance._paid = new
+
+
+@receiver(post_delete, sender=Transaction)
+def transaction_deleted(sender, instance, **kwargs):
+    old = getattr(instance, "_paid", UNKNOWN)
+    if old is UNKNOWN or old is None or not old[1]:
+        return
+    add_payment(old[0], -old[1])
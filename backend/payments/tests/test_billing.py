@@ -0,0 +1,235 @@
+from datetime import date, time
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from appointments.models import Appointment, Service, ServiceOrder
+from doctors.models import Doctor, Department, ExaminationRoom, Schedule
+from patients.models import Patient
+from pharmacy.models import Medicine, Prescription, PrescriptionDetail
+from users.models import User
+from payments.billing import bill_appointments, bill_chunk, billable_appointments
+from payments.models import Bill, BillDetail, Transaction
+from payments.totals import drifted
+from common.enums import (
+    AcademicDegree, AppointmentStatus, BillItemType, DoctorType, Gender, OrderStatus, PaymentMethod,
+    PaymentStatus, RoomType, ServiceType, Shift, TransactionStatus, UserRole,
+)
+
+WORK_DATE = date(2025, 8, 26)
+
+
+class BulkBillingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email='patient@example.com', password='testpass123', role=UserRole.PATIENT.value
+        )
+        cls.patient = Patient.objects.create(
+            user=user,
+            first_name='Test',
+            last_name='Patient',
+            identity_number='111222333',
+            insurance_number='INS123456',
+            birthday=date(1990, 1, 1),
+            gender=Gender.FEMALE.value,
+        )
+        doctor_user = User.objects.create_user(
+            email='doctor@example.com', password='testpass123', role=UserRole.DOCTOR.value
+        )
+        department = Department.objects.create(department_name="Cardiology")
+        doctor = Doctor.objects.create(
+            user=doctor_user,
+            first_name="John",
+            last_name="Doe",
+            identity_number="123456789",
+            birthday=date(1980, 1, 1),
+            gender=Gender.MALE.value,
+            academic_degree=AcademicDegree.BS_CKI.value,
+            specialization="Cardiologist",
+            type=DoctorType.EXAMINATION.value,
+            department=department,
+            price=Decimal('100.00'),
+        )
+        cls.room = ExaminationRoom.objects.create(
+            department=department, type=RoomType.TEST.value, building="A", floor=1
+        )
+        cls.schedules = {
+            work_date: Schedule.objects.create(
+                doctor=doctor,
+                room=cls.room,
+                work_date=work_date,
+                start_time=time(8, 0),
+                end_time=time(12, 0),
+                shift=Shift.MORNING.value,
+                max_patients=10,
+                current_patients=0,
+            )
+            for work_date in (WORK_DATE, date(2025, 8, 27))
+        }
+        cls.doctor = doctor
+        cls.xray = Service.objects.create(
+            service_name="X-Ray", service_type=ServiceType.IMAGING.value, price=Decimal('120.00')
+        )
+        cls.covered = Medicine.objects.create(
+            medicine_name="Paracetamol", category="Pain", usage="Oral", unit="tablet",
+            price=Decimal('10.00'), quantity=100, is_insurance_covered=True, insurance_discount_percent=50,
+        )
+        cls.uncovered = Medicine.objects.create(
+            medicine_name="Vitamin C", category="Supplement", usage="Oral", unit="tablet",
+            price=Decimal('5.00'), quantity=100,
+        )
+
+    def appointment(self, slot, work_date=WORK_DATE, status=AppointmentStatus.COMPLETED.value):
+        return Appointment.objects.create(
+            doctor=self.doctor,
+            patient=self.patient,
+            schedule=self.schedules[work_date],
+            symptoms="Fever",
+            slot_start=time(8, slot),
+            slot_end=time(8, slot + 10),
+            status=status,
+        )
+
+    def prescribe(self, appointment, *lines):
+        prescription = Prescription.objects.create(
+            appointment=appointment, patient=self.patient, diagnosis="Flu"
+        )
+        for medicine, quantity in lines:
+            PrescriptionDetail.objects.create(
+                prescription=prescription, medicine=medicine, dosage="1", frequency="2/day",
+                duration="5 days", quantity=quantity,
+            )
+
+    def test_bill_includes_consultation_services_and_medicines(self):
+        appointment = self.appointment(0)
+        ServiceOrder.objects.create(
+            appointment=appointment, room=self.room, service=self.xray, status=OrderStatus.COMPLETED.value
+        )
+        self.prescribe(appointment, (self.covered, 4), (self.uncovered, 2))
+
+        self.assertEqual(bill_appointments(day=WORK_DATE), (1, 3))
+
+        bill = Bill.objects.get(appointment=appointment)
+        self.assertEqual(bill.status, PaymentStatus.UNPAID.value)
+        self.assertEqual(bill.total_cost, Decimal('150.00'))
+        self.assertEqual(bill.insurance_discount, Decimal('20.00'))
+        self.assertEqual(bill.amount, Decimal('130.00'))
+        self.assertEqual(bill.service_fee, Decimal('120.00'))
+        self.assertEqual(bill.outstanding, Decimal('250.00'))
+        self.assertEqual(
+            sorted(bill.details.values_list('item_type', 'quantity', 'total_price')),
+            [
+                (BillItemType.CONSULTATION.value, 1, Decimal('100.00')),
+                (BillItemType.MEDICINE.value, 2, Decimal('10.00')),
+                (BillItemType.MEDICINE.value, 4, Decimal('40.00')),
+            ],
+        )
+        # Cột tổng hợp khớp với đối soát của payments.totals
+        self.assertFalse(drifted().exists())
+
+    def test_booking_bill_is_completed_with_details(self):
+        appointment = self.appointment(0)
+        # Hóa đơn đặt lịch: phí khám lúc đặt, đã thanh toán online
+        bill = Bill.objects.create(
+            appointment=appointment, patient=self.patient, total_cost=Decimal('80.00'),
+            insurance_discount=Decimal('0.00'), amount=Decimal('80.00'), status=PaymentStatus.BOOKING_PAID.value,
+        )
+        Transaction.objects.create(
+            bill=bill, amount=Decimal('80.00'), payment_method=PaymentMethod.ONLINE_BANKING.value,
+            transaction_date=timezone.now(), status=TransactionStatus.SUCCESS.value,
+        )
+        ServiceOrder.objects.create(
+            appointment=appointment, room=self.room, service=self.xray, status=OrderStatus.COMPLETED.value
+        )
+        self.prescribe(appointment, (self.covered, 4), (self.uncovered, 2))
+
+        self.assertEqual(list(billable_appointments(day=WORK_DATE)), [appointment])
+        self.assertEqual(bill_appointments(day=WORK_DATE), (1, 3))
+        self.assertEqual(bill_appointments(day=WORK_DATE), (0, 0))
+
+        self.assertEqual(Bill.objects.filter(appointment=appointment).count(), 1)
+        bill.refresh_from_db()
+        self.assertEqual(bill.status, PaymentStatus.BOOKING_PAID.value)
+        self.assertEqual(bill.total_cost, Decimal('130.00'))
+        self.assertEqual(bill.insurance_discount, Decimal('20.00'))
+        self.assertEqual(bill.amount, Decimal('110.00'))
+        self.assertEqual(bill.service_fee, Decimal('120.00'))
+        self.assertEqual(bill.paid_amount, Decimal('80.00'))
+        self.assertEqual(bill.outstanding, Decimal('150.00'))
+        self.assertEqual(
+            sorted(bill.details.values_list('item_type', 'total_price')),
+            [
+                (BillItemType.CONSULTATION.value, Decimal('80.00')),
+                (BillItemType.MEDICINE.value, Decimal('10.00')),
+                (BillItemType.MEDICINE.value, Decimal('40.00')),
+            ],
+        )
+        self.assertFalse(drifted().exists())
+
+    def test_only_unbilled_completed_appointments_are_billed(self):
+        # Hóa đơn đã thanh toán hoặc đã có dòng chi tiết thì không lập lại
+        paid = self.appointment(0)
+        Bill.objects.create(
+            appointment=paid, patient=self.patient, total_cost=Decimal('100.00'),
+            amount=Decimal('100.00'), status=PaymentStatus.PAID.value,
+        )
+        detailed = self.appointment(10)
+        detailed_bill = Bill.objects.create(
+            appointment=detailed, patient=self.patient, total_cost=Decimal('100.00'),
+            amount=Decimal('100.00'), status=PaymentStatus.UNPAID.value,
+        )
+        BillDetail.objects.create(
+            bill=detailed_bill, item_type=BillItemType.CONSULTATION.value, quantity=1,
+            unit_price=Decimal('100.00'), total_price=Decimal('100.00'), insurance_discount=Decimal('0.00'),
+        )
+        self.prescribe(detailed, (self.covered, 1))
+        self.appointment(20, status=AppointmentStatus.CONFIRMED.value)
+        self.appointment(30, work_date=date(2025, 8, 27))
+        todo = self.appointment(40)
+
+        self.assertEqual(list(billable_appointments(day=WORK_DATE)), [todo])
+        self.assertEqual(bill_appointments(day=WORK_DATE), (1, 1))
+        self.assertEqual(bill_appointments(day=WORK_DATE), (0, 0))
+        self.assertEqual(Bill.objects.filter(appointment__in=[paid, detailed]).count(), 2)
+        self.assertEqual(detailed_bill.details.count(), 1)
+
+    def test_appointment_ids_and_chunks(self):
+        appointments = [self.appointment(slot) for slot in (0, 15, 30)]
+        self.assertEqual(bill_appointments(appointment_ids=[a.id for a in appointments[:2]], chunk_size=1), (2, 2))
+        self.assertFalse(Bill.objects.filter(appointment=appointments[2]).exists())
+        # Lịch hẹn đã có hóa đơn bị bỏ qua khi lô được chạy lại
+        self.assertEqual(bill_chunk([a.id for a in appointments]), (1, 1))
+
+    def test_chunk_query_count_does_not_grow_with_size(self):
+        one = self.appointment(0)
+        self.prescribe(one, (self.covered, 1))
+        many = [self.appointment(slot, work_date=date(2025, 8, 27)) for slot in (0, 15, 30)]
+        for appointment in many:
+            self.prescribe(appointment, (self.covered, 1), (self.uncovered, 1))
+            ServiceOrder.objects.create(
+                appointment=appointment, room=self.room, service=self.xray, status=OrderStatus.ORDERED.value
+            )
+
+        with CaptureQueriesContext(connection) as single:
+            bill_chunk([one.id])
+        with CaptureQueriesContext(connection) as batch:
+            bill_chunk([a.id for a in many])
+        self.assertEqual(len(batch), len(single))
+        self.assertEqual(Bill.objects.count(), 4)
+
+    def test_command_reports_throughput(self):
+        self.appointment(0)
+        out = StringIO()
+        call_command('bill_appointments', '--date', WORK_DATE.isoformat(), '--dry-run', stdout=out)
+        self.assertIn('1 lịch hẹn', out.getvalue())
+        self.assertFalse(Bill.objects.exists())
+
+        call_command('bill_appointments', '--date', WORK_DATE.isoformat(), stdout=out)
+        self.assertIn('Đã lập hoặc bổ sung 1 hóa đơn', out.getvalue())
+        self.assertIn('hóa đơn/s', out.getvalue())
@@ -0,0 +1,144 @@
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from payments.models import Transaction
+from payments.payos_client import (
+    get_link_info, get_link_statuses, get_payos_client, reset_client,
+)
+from payments.services import PayOSService
+from payments.webhooks import apply_payment
+from common.enums import TransactionStatus
+from payments.tests.test_webhooks import WebhookFixtureMixin
+
+
+def link(order_code, link_status='PENDING'):
+    return SimpleNamespace(orderCode=order_code, status=link_status, amount=100, amountPaid=0)
+
+
+class PayOSClientTest(TestCase):
+    def setUp(self):
+        reset_client()
+        self.addCleanup(reset_client)
+        cache.clear()
+
+    def test_client_is_shared_with_pooled_timeouts(self):
+        client = get_payos_client()
+        self.assertIs(PayOSService().payos, client)
+        self.assertIs(PayOSService().payos, client)
+        timeout = client._http_client.timeout
+        self.assertEqual(timeout.connect, 3)
+        self.assertEqual(timeout.read, 10)
+
+    @patch('payos.PayOS.getPaymentLinkInformation')
+    def test_pending_link_is_cached_briefly(self, mock_get):
+        mock_get.return_value = link(1001)
+        self.assertEqual(get_link_info(1001)['status'], 'PENDING')
+        self.assertEqual(get_link_info('1001')['status'], 'PENDING')
+        self.assertEqual(mock_get.call_count, 1)
+
+        with patch('payments.payos_client.cache.set') as mock_set:
+            cache.clear()
+            get_link_info(1001)
+        self.assertEqual(mock_set.call_args.args[2], 5)
+
+    @patch('payos.PayOS.getPaymentLinkInformation')
+    def test_final_link_is_cached_longer(self, mock_get):
+        mock_get.return_value = link(1001, 'PAID')
+        with patch('payments.payos_client.cache.set') as mock_set:
+            get_link_info(1001)
+        self.assertEqual(mock_set.call_args.args[2], 3600)
+
+    @patch('payos.PayOS.getPaymentLinkInformation')
+    def test_concurrent_lookups_share_one_request(self, mock_get):
+        release = threading.Event()
+
+        def slow(orderId):
+            release.wait(5)
+            return link(orderId)
+
+        mock_get.side_effect = slow
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_link_info(1001))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 4)
+        self.assertLessEqual(mock_get.call_count, 2)
+
+    @patch('payos.PayOS.getPaymentLinkInformation')
+    def test_statuses_fetch_only_missing_codes(self, mock_get):
+        mock_get.side_effect = lambda orderId: link(orderId, 'PAID' if orderId == 2002 else 'PENDING')
+        get_link_info(1001)
+        mock_get.reset_mock()
+
+        statuses = get_link_statuses([1001, 2002, 3003, 2002])
+        self.assertEqual(statuses, {1001: 'PENDING', 2002: 'PAID', 3003: 'PENDING'})
+        self.assertEqual(sorted(call.kwargs['orderId'] for call in mock_get.call_args_list), [2002, 3003])
+
+    @patch('payos.PayOS.getPaymentLinkInformation', side_effect=ValueError('timeout'))
+    def test_failed_status_lookup_is_not_cached(self, mock_get):
+        self.assertEqual(get_link_statuses([1001]), {1001: None})
+        self.assertEqual(get_link_statuses([1001]), {1001: None})
+        self.assertEqual(mock_get.call_count, 2)
+
+
+class PaymentStatusTest(WebhookFixtureMixin, APITestCase):
+    def setUp(self):
+        reset_client()
+        self.addCleanup(reset_client)
+        cache.clear()
+        self.client.force_authenticate(self.transaction.bill.patient.user)
+
+    @patch('payos.PayOS.getPaymentLinkInformation')
+    def test_payment_info_uses_cache(self, mock_get):
+        mock_get.return_value = link(self.order_code)
+        url = reverse('transaction-get-payment-info', kwargs={'order_id': self.order_code})
+        for _ in range(3):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['status'], 'PENDING')
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('payos.PayOS.getPaymentLinkInformation')
+    def test_applied_payment_drops_cached_status(self, mock_get):
+        mock_get.return_value = link(self.order_code)
+        get_link_info(self.order_code)
+        self.assertIsNotNone(cache.get(f'payos:link:{self.order_code}'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_payment(self.bill.id, self.order_code)
+        self.assertIsNone(cache.get(f'payos:link:{self.order_code}'))
+
+    @patch('payos.PayOS.getPaymentLinkInformation')
+    def test_batch_answers_settled_transactions_locally(self, mock_get):
+        mock_get.side_effect = lambda orderId: link(orderId)
+        Transaction.objects.create(
+            bill=self.bill, amount=self.bill.amount, payment_method=self.transaction.payment_method,
+            transaction_date=self.transaction.transaction_date, status=TransactionStatus.SUCCESS.value,
+            order_code=self.order_code + 1,
+        )
+        url = reverse('transaction-get-payment-statuses')
+        response = self.client.get(url, {'order_codes': f'{self.order_code},{self.order_code + 1}'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], [
+            {'orderCode': self.order_code, 'status': 'PENDING'},
+            {'orderCode': self.order_code + 1, 'status': 'PAID'},
+        ])
+        mock_get.assert_called_once_with(orderId=self.order_code)
+
+    def test_batch_rejects_invalid_codes(self):
+        url = reverse('transaction-get-payment-statuses')
+        for codes in ['', 'abc', ','.join(str(i) for i in range(51))]:
+            response = self.client.get(url, {'order_codes': codes})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,9 +1,11 @@
 from django.test import TestCase
 from unittest.mock import patch, MagicMock
 from django.http import Http404
+from rest_framework.exceptions import ValidationError
 from django.utils import timezone
-from datetime import date, time
+from datetime import date, time, timedelta
 from decimal import Decimal
+from payments.payos_client import reset_client
 from payments.services import BillService, PayOSService, TransactionService
 from payments.models import Bill, BillDetail, Transaction
 from appointments.models import Appointment, Service, ServiceOrder
@@ -103,18 +105,49 @@ class BillServiceTest(TestCase):
 
     def test_get_all_bills(self):
         service = BillService()
-        bills = service.get_all_bills(1, 10, 'created_at', 'desc')
-        self.assertEqual(len(bills), 2)
-        bills = service.get_all_bills(1, 10, 'total_cost', 'asc')
-        self.assertEqual(bills[0].id, self.bill.id)
-        bills = service.get_all_bills(1, 10, 'invalid', 'desc')
-        self.assertEqual(len(bills), 2)
-        bills = service.get_all_bills(2, 1, 'created_at', 'desc')
-        self.assertEqual(len(bills), 1)
-        with self.assertRaises(ValueError):
-            service.get_all_bills(0, 10)
-        bills = service.get_all_bills(1, 200, 'created_at', 'desc')
-        self.assertEqual(len(bills), 2)
+        page = service.get_all_bills(10, sort_by='created_at', sort_order='desc')
+        self.assertEqual([b.id for b in page['results']], [self.bill2.id, self.bill.id])
+        self.assertTrue(page['last'])
+        self.assertIsNone(page['nextCursor'])
+        page = service.get_all_bills(10, sort_by='total_cost', sort_order='asc')
+        self.assertEqual(page['results'][0].id, self.bill.id)
+        page = service.get_all_bills(10, sort_by='invalid', sort_order='desc')
+        self.assertEqual(len(page['results']), 2)
+        page = service.get_all_bills(200, sort_by='created_at', sort_order='desc')
+        self.assertEqual(page['pageSize'], 10)
+
+    def test_get_all_bills_walks_pages_by_cursor(self):
+        service = BillService()
+        for sort_by in BillService.SORT_KEYS:
+            for sort_order in ('asc', 'desc'):
+                first = service.get_all_bills(1, sort_by=sort_by, sort_order=sort_order)
+                self.assertFalse(first['last'])
+                with self.assertNumQueries(1):
+                    second = service.get_all_bills(
+                        1, cursor=first['nextCursor'], sort_by=sort_by, sort_order=sort_order
+                    )
+                self.assertTrue(second['last'])
+                self.assertEqual(
+                    {first['results'][0].id, second['results'][0].id}, {self.bill.id, self.bill2.id}
+                )
+
+    def test_get_all_bills_rejects_cursor_from_other_sort(self):
+        service = BillService()
+        cursor = service.get_all_bills(1, sort_by='amount')['nextCursor']
+        with self.assertRaises(ValidationError):
+            service.get_all_bills(1, cursor=cursor, sort_by='created_at')
+
+    def test_get_all_bills_filters(self):
+        service = BillService()
+        page = service.get_all_bills(10, status=PaymentStatus.PAID.value)
+        self.assertEqual([b.id for b in page['results']], [self.bill2.id])
+        page = service.get_all_bills(10, patient_id=self.patient.id, appointment_id=self.appointment.id)
+        self.assertEqual([b.id for b in page['results']], [self.bill.id])
+        today = timezone.localdate()
+        page = service.get_all_bills(10, date_from=today, date_to=today)
+        self.assertEqual(len(page['results']), 2)
+        page = service.get_all_bills(10, date_to=today - timedelta(days=1))
+        self.assertEqual(page['results'], [])
 
     def test_create_bill_with_details(self):
         data = {
@@ -180,6 +213,26 @@ class BillServiceTest(TestCase):
         with self.assertRaises(Http404):
             service.create_bill_detail(999, data)
 
+    def test_bill_writes_lock_the_bill(self):
+        service = BillService()
+        data = [
+            {'item_type': ServiceType.IMAGING.value, 'quantity': 1, 'unit_price': Decimal('200.00'), 'insurance_discount': None}
+        ]
+        with patch.object(Bill.objects, 'select_for_update', wraps=Bill.objects.select_for_update) as mock_lock:
+            service.create_bill_detail(self.bill.id, data)
+            service.update_bill(self.bill.id, {'status': PaymentStatus.PAID.value})
+        self.assertEqual(mock_lock.call_count, 2)
+
+    def test_create_bill_detail_totals_all_details(self):
+        service = BillService()
+        line = {'item_type': ServiceType.IMAGING.value, 'quantity': 1, 'unit_price': Decimal('50.00'), 'insurance_discount': Decimal('5.00')}
+        service.create_bill_detail(self.bill.id, [line])
+        bill = service.create_bill_detail(self.bill.id, [line, line])
+        bill.refresh_from_db()
+        self.assertEqual(bill.total_cost, Decimal('150.00'))
+        self.assertEqual(bill.amount, Decimal('135.00'))
+        self.assertEqual(bill.details.count(), 3)
+
     def test_get_detail_by_bill(self):
         # First add detail
         BillDetail.objects.create(
@@ -285,23 +338,31 @@ class PayOSServiceTest(TestCase):
             status=PaymentStatus.UNPAID.value
         )
 
-    @patch('payments.services.payos.PayOS')
+    def setUp(self):
+        # Client PayOS được giữ trong tiến trình, tạo lại để dùng lớp PayOS giả
+        reset_client()
+        self.addCleanup(reset_client)
+
+    @patch('payments.payos_client.payos.PayOS')
     def test_create_payment_link(self, mock_payos_class):
         mock_payos = mock_payos_class.return_value
         mock_response = MagicMock()
-        mock_response.checkoutUrl = 'http://test.url'
-        mock_payos.createPaymentLink.return_value = mock_response
+        mock_response.checkout_url = 'http://test.url'
+        mock_payos.payment_requests.create.return_value = mock_response
         service = PayOSService()
         url = service.create_payment_link(self.bill.id)
         self.assertEqual(url, 'http://test.url')
-        mock_payos.createPaymentLink.assert_called_once()
+        mock_payos.payment_requests.create.assert_called_once()
+        payment_data = mock_payos.payment_requests.create.call_args.args[0]
+        self.assertEqual(payment_data.amount, 150)
+        self.assertEqual(payment_data.items[0].price, 150)
         # Test paid bill
         self.bill.status = PaymentStatus.PAID.value
         self.bill.save()
         with self.assertRaises(ValueError):
             service.create_payment_link(self.bill.id)
 
-    @patch('payments.services.payos.PayOS')
+    @patch('payments.payos_client.payos.PayOS')
     def test_cancel_payment(self, mock_payos_class):
         mock_payos = mock_payos_class.return_value
         mock_response = MagicMock(orderCode=123, status='CANCELLED')
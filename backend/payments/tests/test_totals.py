@@ -0,0 +1,200 @@
+from datetime import date, time
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from appointments.models import Appointment, Service, ServiceOrder
+from doctors.models import Doctor, Department, ExaminationRoom, Schedule
+from patients.models import Patient
+from users.models import User
+from payments.models import Bill, Transaction
+from payments.serializers import BillSerializer
+from payments.services import BillService
+from payments.totals import drifted
+from common.enums import (
+    AcademicDegree, DoctorType, Gender, OrderStatus, PaymentMethod, PaymentStatus, RoomType,
+    ServiceType, Shift, TransactionStatus, UserRole,
+)
+
+
+class BillTotalsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email='patient@example.com', password='testpass123', role=UserRole.PATIENT.value
+        )
+        cls.patient = Patient.objects.create(
+            user=user,
+            first_name='Test',
+            last_name='Patient',
+            identity_number='111222333',
+            insurance_number='INS123456',
+            birthday=date(1990, 1, 1),
+            gender=Gender.FEMALE.value,
+        )
+        doctor_user = User.objects.create_user(
+            email='doctor@example.com', password='testpass123', role=UserRole.DOCTOR.value
+        )
+        department = Department.objects.create(department_name="Cardiology")
+        doctor = Doctor.objects.create(
+            user=doctor_user,
+            first_name="John",
+            last_name="Doe",
+            identity_number="123456789",
+            birthday=date(1980, 1, 1),
+            gender=Gender.MALE.value,
+            academic_degree=AcademicDegree.BS_CKI.value,
+            specialization="Cardiologist",
+            type=DoctorType.EXAMINATION.value,
+            department=department,
+        )
+        cls.room = ExaminationRoom.objects.create(
+            department=department, type=RoomType.TEST.value, building="A", floor=1
+        )
+        schedule = Schedule.objects.create(
+            doctor=doctor,
+            room=cls.room,
+            work_date=date(2025, 8, 26),
+            start_time=time(8, 0),
+            end_time=time(12, 0),
+            shift=Shift.MORNING.value,
+            max_patients=10,
+            current_patients=0,
+        )
+        cls.appointment = Appointment.objects.create(
+            doctor=doctor,
+            patient=cls.patient,
+            schedule=schedule,
+            symptoms="Fever",
+            slot_start=time(8, 0),
+            slot_end=time(8, 30),
+            status="CONFIRMED",
+        )
+        cls.xray = Service.objects.create(
+            service_name="X-Ray", service_type=ServiceType.IMAGING.value, price=Decimal('120.00')
+        )
+        cls.blood = Service.objects.create(
+            service_name="Blood test", service_type=ServiceType.TEST.value, price=Decimal('80.00')
+        )
+
+    def setUp(self):
+        self.bill = Bill.objects.create(
+            appointment=self.appointment,
+            patient=self.patient,
+            total_cost=Decimal('200.00'),
+            insurance_discount=Decimal('50.00'),
+            amount=Decimal('150.00'),
+            status=PaymentStatus.UNPAID.value,
+        )
+
+    def order(self, service):
+        return ServiceOrder.objects.create(
+            appointment=self.appointment, room=self.room, service=service, status=OrderStatus.ORDERED.value
+        )
+
+    def pay(self, amount, status=TransactionStatus.SUCCESS.value):
+        return Transaction.objects.create(
+            bill=self.bill,
+            amount=amount,
+            payment_method=PaymentMethod.CASH.value,
+            transaction_date=timezone.now(),
+            status=status,
+        )
+
+    def assertTotals(self, service_fee, paid_amount, outstanding):
+        self.bill.refresh_from_db()
+        self.assertEqual(
+            (self.bill.service_fee, self.bill.paid_amount, self.bill.outstanding),
+            (Decimal(service_fee), Decimal(paid_amount), Decimal(outstanding)),
+        )
+
+    def test_new_bill_starts_with_amount_outstanding(self):
+        self.assertTotals('0', '0', '150.00')
+
+    def test_bill_created_after_orders_includes_service_fee(self):
+        self.order(self.xray)
+        self.bill.delete()
+        self.bill = Bill.objects.create(
+            appointment=self.appointment, patient=self.patient, total_cost=Decimal('150.00'),
+            amount=Decimal('150.00'), status=PaymentStatus.UNPAID.value,
+        )
+        self.assertTotals('120.00', '0', '270.00')
+
+    def test_service_orders_update_service_fee(self):
+        order = self.order(self.xray)
+        self.order(self.blood)
+        self.assertTotals('200.00', '0', '350.00')
+
+        order.service = self.blood
+        order.save()
+        self.assertTotals('160.00', '0', '310.00')
+
+        order.delete()
+        self.assertTotals('80.00', '0', '230.00')
+
+    def test_status_only_change_issues_no_update(self):
+        order = self.order(self.xray)
+        order.status = OrderStatus.COMPLETED.value
+        with self.assertNumQueries(1):
+            order.save()
+        self.assertTotals('120.00', '0', '270.00')
+
+    def test_success_transactions_update_paid_amount(self):
+        self.pay(Decimal('100.00'))
+        pending = self.pay(Decimal('50.00'), status=TransactionStatus.PENDING.value)
+        self.assertTotals('0', '100.00', '50.00')
+
+        pending.status = TransactionStatus.SUCCESS.value
+        pending.save()
+        self.assertTotals('0', '150.00', '0.00')
+
+        pending.delete()
+        self.assertTotals('0', '100.00', '50.00')
+
+    def test_full_save_keeps_maintained_totals(self):
+        stale = Bill.objects.get(pk=self.bill.pk)
+        self.order(self.xray)
+        self.pay(Decimal('30.00'))
+
+        stale.status = PaymentStatus.PAID.value
+        stale.amount = Decimal('100.00')
+        stale.save()
+
+        self.assertEqual(stale.outstanding, Decimal('190.00'))
+        self.assertTotals('120.00', '30.00', '190.00')
+
+    def test_create_bill_detail_recomputes_outstanding(self):
+        self.order(self.xray)
+        BillService().create_bill_detail(self.bill.id, [
+            {'item_type': 'SERVICE', 'quantity': 2, 'unit_price': Decimal('40.00'), 'insurance_discount': Decimal('10.00')},
+        ])
+        self.assertTotals('120.00', '0', '190.00')
+
+    def test_reconcile_fixes_bulk_updates(self):
+        self.order(self.xray)
+        Service.objects.filter(pk=self.xray.pk).update(price=Decimal('90.00'))
+        self.assertEqual(drifted().count(), 1)
+
+        out = StringIO()
+        call_command('reconcile_bill_totals', '--dry-run', stdout=out)
+        self.assertTotals('120.00', '0', '270.00')
+
+        call_command('reconcile_bill_totals', stdout=out)
+        self.assertTotals('90.00', '0', '240.00')
+        self.assertFalse(drifted().exists())
+
+    def test_serializer_reads_columns_without_queries(self):
+        self.order(self.xray)
+        self.pay(Decimal('100.00'))
+        self.pay(Decimal('70.00'), status=TransactionStatus.FAILED.value)
+        bill = Bill.objects.select_related('appointment').get(pk=self.bill.pk)
+
+        with self.assertNumQueries(0):
+            data = BillSerializer(bill).data
+
+        self.assertEqual(Decimal(data['service_fee']), Decimal('120.00'))
+        self.assertEqual(Decimal(data['amount']), Decimal('100.00'))
+        self.assertEqual(Decimal(data['outstanding']), Decimal('170.00'))
@@ -1,5 +1,6 @@
 from rest_framework.test import APITestCase
 from unittest.mock import patch, MagicMock
+from payos.resources.v2 import PaymentRequests
 from django.urls import reverse
 from django.utils import timezone
 from datetime import date, time
@@ -133,10 +134,35 @@ class BaseTestCase(APITestCase):
         self.client.force_authenticate(self.user)
 
 class BillViewSetTest(BaseTestCase):
-    def test_list_invalid_page(self):
+    def test_list_pages_by_cursor(self):
         url = reverse('bill-list')
-        response = self.client.get(url, {'page': 0, 'size': 10})
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [b['id'] for b in response.data['content']], [self.bill_paid.id, self.bill_booking_paid.id]
+        )
+        self.assertFalse(response.data['last'])
+
+        response = self.client.get(url, {'size': 2, 'cursor': response.data['nextCursor']})
+        self.assertEqual([b['id'] for b in response.data['content']], [self.bill_unpaid.id])
+        self.assertTrue(response.data['last'])
+        self.assertIsNone(response.data['nextCursor'])
+
+    def test_list_filters_by_status(self):
+        url = reverse('bill-list')
+        response = self.client.get(url, {'status': PaymentStatus.UNPAID.value})
+        self.assertEqual([b['id'] for b in response.data['content']], [self.bill_unpaid.id])
+
+    def test_list_invalid_params(self):
+        url = reverse('bill-list')
+        for params in [
+            {'cursor': 'invalid'},
+            {'size': 0},
+            {'sort_by': 'patient'},
+            {'date_from': '2025-08-27', 'date_to': '2025-08-26'},
+        ]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
 
     def test_create(self):
         url = reverse('bill-list')
@@ -222,10 +248,10 @@ class BillViewSetTest(BaseTestCase):
 
 class MockPaymentResponse:
     def __init__(self, url):
-        self.checkoutUrl = url
+        self.checkout_url = url
 
 class TransactionViewSetTest(BaseTestCase):
-    @patch('payos.PayOS.createPaymentLink')
+    @patch.object(PaymentRequests, 'create')
     def test_create_payment(self, mock_create):
         mock_create.return_value = MockPaymentResponse('https://pay.test.com')
         url = reverse('transaction-create-payment', kwargs={'bill_id': self.bill_unpaid.id})
@@ -234,7 +260,7 @@ class TransactionViewSetTest(BaseTestCase):
         self.assertIn('data', response.data)
         self.assertEqual(response.data['data'], 'https://pay.test.com')
 
-    @patch('payos.PayOS.createPaymentLink')
+    @patch.object(PaymentRequests, 'create')
     def test_create_payment_error(self, mock_create):
         mock_create.side_effect = Exception('Test error')
         url = reverse('transaction-create-payment', kwargs={'bill_id': self.bill_unpaid.id})
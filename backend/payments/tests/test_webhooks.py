@@ -0,0 +1,271 @@
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from appointments.models import Appointment
+from doctors.models import Doctor, Department, ExaminationRoom, Schedule
+from patients.models import Patient
+from users.models import User
+from payments.models import Bill, PaymentWebhookEvent, Transaction
+from payments.services import TransactionService
+from payments.webhooks import apply_payment, claim_batch, drain, record_webhook
+from common.constants import PAYOS_WEBHOOK
+from common.enums import (
+    AcademicDegree, AppointmentStatus, DoctorType, Gender, PaymentMethod, PaymentStatus, RoomType,
+    Shift, TransactionStatus, UserRole, WebhookStatus,
+)
+
+
+def payload(order_code, success=True):
+    return {
+        'code': '00' if success else '01',
+        'success': success,
+        'data': {'orderCode': order_code, 'amount': 100, 'code': '00' if success else '01'},
+        'signature': 'signed',
+    }
+
+
+class WebhookFixtureMixin:
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email='patient@example.com', password='testpass123', role=UserRole.PATIENT.value
+        )
+        patient = Patient.objects.create(
+            user=user,
+            first_name='Test',
+            last_name='Patient',
+            identity_number='111222333',
+            insurance_number='INS123456',
+            birthday=date(1990, 1, 1),
+            gender=Gender.FEMALE.value,
+        )
+        doctor_user = User.objects.create_user(
+            email='doctor@example.com', password='testpass123', role=UserRole.DOCTOR.value
+        )
+        department = Department.objects.create(department_name="Cardiology")
+        doctor = Doctor.objects.create(
+            user=doctor_user,
+            first_name="John",
+            last_name="Doe",
+            identity_number="123456789",
+            birthday=date(1980, 1, 1),
+            gender=Gender.MALE.value,
+            academic_degree=AcademicDegree.BS_CKI.value,
+            specialization="Cardiologist",
+            type=DoctorType.EXAMINATION.value,
+            department=department,
+        )
+        room = ExaminationRoom.objects.create(
+            department=department, type=RoomType.EXAMINATION.value, building="A", floor=1
+        )
+        schedule = Schedule.objects.create(
+            doctor=doctor,
+            room=room,
+            work_date=date(2025, 8, 26),
+            start_time=time(8, 0),
+            end_time=time(12, 0),
+            shift=Shift.MORNING.value,
+            max_patients=10,
+            current_patients=0,
+        )
+        cls.appointment = Appointment.objects.create(
+            doctor=doctor,
+            patient=patient,
+            schedule=schedule,
+            symptoms="Fever",
+            slot_start=time(8, 0),
+            slot_end=time(8, 30),
+            status=AppointmentStatus.PENDING.value,
+        )
+        cls.bill = Bill.objects.create(
+            appointment=cls.appointment,
+            patient=patient,
+            total_cost=Decimal('100.00'),
+            amount=Decimal('100.00'),
+            status=PaymentStatus.UNPAID.value,
+        )
+        cls.order_code = cls.bill.id * 1000 + 7
+        cls.transaction = Transaction.objects.create(
+            bill=cls.bill,
+            amount=Decimal('100.00'),
+            payment_method=PaymentMethod.ONLINE_BANKING.value,
+            transaction_date=timezone.now(),
+            status=TransactionStatus.PENDING.value,
+            order_code=cls.order_code,
+        )
+
+
+class PaymentWebhookInboxTest(WebhookFixtureMixin, TestCase):
+    def test_record_is_a_single_insert_and_ignores_duplicates(self):
+        with self.assertNumQueries(1):
+            record_webhook(self.order_code, payload(self.order_code))
+        record_webhook(self.order_code, payload(self.order_code, success=False))
+
+        event = PaymentWebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookStatus.PENDING.value)
+        self.assertTrue(event.payload['success'])
+        # Chưa xử lý gì khi mới nhận
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.status, PaymentStatus.UNPAID.value)
+
+    def test_drain_applies_payment(self):
+        record_webhook(self.order_code, payload(self.order_code))
+        self.assertEqual(drain(), (1, 1))
+
+        self.bill.refresh_from_db()
+        self.transaction.refresh_from_db()
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.bill.status, PaymentStatus.BOOKING_PAID.value)
+        self.assertEqual(self.bill.paid_amount, Decimal('100.00'))
+        self.assertEqual(self.transaction.status, TransactionStatus.SUCCESS.value)
+        self.assertEqual(self.appointment.status, AppointmentStatus.CONFIRMED.value)
+        event = PaymentWebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookStatus.PROCESSED.value)
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(drain(), (0, 0))
+
+    def test_payment_already_applied_is_not_repeated(self):
+        # Trang return URL đã ghi nhận thanh toán trước khi webhook tới
+        apply_payment(self.bill.id)
+        record_webhook(self.order_code, payload(self.order_code))
+        self.assertEqual(drain(), (1, 1))
+
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.paid_amount, Decimal('100.00'))
+        self.assertEqual(PaymentWebhookEvent.objects.get().status, WebhookStatus.PROCESSED.value)
+
+    def test_reclaimed_event_is_applied_once(self):
+        record_webhook(self.order_code, payload(self.order_code))
+        drain()
+        # Mô phỏng một worker nhận lại sự kiện đã xử lý
+        PaymentWebhookEvent.objects.update(
+            status=WebhookStatus.PENDING.value, available_at=timezone.now()
+        )
+        self.assertEqual(drain(), (1, 1))
+
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.paid_amount, Decimal('100.00'))
+        self.assertEqual(Transaction.objects.filter(status=TransactionStatus.SUCCESS.value).count(), 1)
+
+    def test_event_updates_its_own_transaction(self):
+        newer = Transaction.objects.create(
+            bill=self.bill,
+            amount=Decimal('100.00'),
+            payment_method=PaymentMethod.ONLINE_BANKING.value,
+            transaction_date=timezone.now(),
+            status=TransactionStatus.PENDING.value,
+            order_code=self.order_code + 1,
+        )
+        record_webhook(self.order_code, payload(self.order_code, success=False))
+        drain()
+
+        self.transaction.refresh_from_db()
+        newer.refresh_from_db()
+        self.assertEqual(self.transaction.status, TransactionStatus.FAILED.value)
+        self.assertEqual(newer.status, TransactionStatus.PENDING.value)
+
+    def test_unknown_bill_fails_without_retry(self):
+        record_webhook(123, payload(123))
+        self.assertEqual(drain(), (1, 0))
+        event = PaymentWebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookStatus.FAILED.value)
+        self.assertEqual(event.attempts, 1)
+
+    def test_transient_error_is_retried_with_backoff(self):
+        record_webhook(self.order_code, payload(self.order_code))
+        with patch('payments.webhooks.apply_payment', side_effect=RuntimeError('db down')):
+            self.assertEqual(drain(), (1, 0))
+
+        event = PaymentWebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookStatus.PENDING.value)
+        self.assertEqual(event.last_error, 'db down')
+        self.assertGreater(event.available_at, timezone.now())
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, TransactionStatus.PENDING.value)
+
+    def test_expired_lease_is_reclaimed(self):
+        record_webhook(self.order_code, payload(self.order_code))
+        self.assertEqual(len(claim_batch()), 1)
+        self.assertEqual(claim_batch(), [])
+
+        PaymentWebhookEvent.objects.update(
+            available_at=timezone.now() - timedelta(seconds=PAYOS_WEBHOOK['LEASE_SECONDS'])
+        )
+        self.assertEqual(len(claim_batch()), 1)
+
+    def test_return_url_success_updates_its_own_transaction(self):
+        older_code = self.order_code - 1
+        older = Transaction.objects.create(
+            bill=self.bill,
+            amount=Decimal('100.00'),
+            payment_method=PaymentMethod.ONLINE_BANKING.value,
+            transaction_date=timezone.now(),
+            status=TransactionStatus.PENDING.value,
+            order_code=older_code,
+        )
+        # Giao dịch mới hơn của cùng hóa đơn vẫn phải giữ PENDING
+        newer = Transaction.objects.create(
+            bill=self.bill,
+            amount=Decimal('100.00'),
+            payment_method=PaymentMethod.ONLINE_BANKING.value,
+            transaction_date=timezone.now(),
+            status=TransactionStatus.PENDING.value,
+            order_code=self.order_code + 1,
+        )
+        TransactionService().handle_payment_success(str(older_code))
+
+        older.refresh_from_db()
+        newer.refresh_from_db()
+        self.transaction.refresh_from_db()
+        self.assertEqual(older.status, TransactionStatus.SUCCESS.value)
+        self.assertEqual(newer.status, TransactionStatus.PENDING.value)
+        self.assertEqual(self.transaction.status, TransactionStatus.PENDING.value)
+
+
+@override_settings(PAYOS_WEBHOOK_EAGER_WORKERS=0)
+class ProcessPaymentWebhooksCommandTest(WebhookFixtureMixin, TransactionTestCase):
+    # Worker chạy trong luồng riêng nên dữ liệu phải được commit thật
+
+    def setUp(self):
+        self.setUpTestData()
+
+    def test_command_drains_once(self):
+        record_webhook(self.order_code, payload(self.order_code))
+        out = StringIO()
+        call_command('process_payment_webhooks', '--once', '--workers', '1', stdout=out)
+        self.assertIn('1 webhook', out.getvalue())
+        self.assertEqual(
+            PaymentWebhookEvent.objects.get().status, WebhookStatus.PROCESSED.value
+        )
+
+
+class PaymentWebhookViewTest(WebhookFixtureMixin, APITestCase):
+    @patch('payos.PayOS.verifyPaymentWebhookData')
+    def test_webhook_is_acknowledged_before_processing(self, mock_verify):
+        mock_verify.return_value = SimpleNamespace(orderCode=self.order_code)
+        url = reverse('transaction-handle-payment-webhook')
+
+        for _ in range(2):
+            response = self.client.post(url, payload(self.order_code), format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(PaymentWebhookEvent.objects.count(), 1)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, TransactionStatus.PENDING.value)
+
+    @patch('payos.PayOS.verifyPaymentWebhookData', side_effect=ValueError('invalid signature'))
+    def test_invalid_signature_is_not_stored(self, mock_verify):
+        url = reverse('transaction-handle-payment-webhook')
+        response = self.client.post(url, payload(self.order_code), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(PaymentWebhookEvent.objects.exists())
@@ -0,0 +1,100 @@
+"""
+Cột tổng hợp của hóa đơn, thay cho việc cộng từng dòng trong Python khi serialize.
+
+- ``service_fee``: tổng ``Service.price`` của các ServiceOrder thuộc lịch hẹn.
+- ``paid_amount``: tổng ``Transaction.amount`` có trạng thái SUCCESS.
+- ``outstanding``: ``amount + service_fee - paid_amount``.
+
+Signal trên ServiceOrder và Transaction (``payments.signals``) cộng phần chênh
+lệch bằng một UPDATE với ``F()``, nên các thay đổi đồng thời không ghi đè nhau.
+``rebuild_totals`` tính lại từ dữ liệu gốc trong một câu UPDATE với các subquery
+GROUP BY, dùng cho lệnh ``reconcile_bill_totals`` (vd. sau khi đổi giá dịch vụ).
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from appointments.models import Service, ServiceOrder
+from common.constants import DECIMAL_MAX_DIGITS, DECIMAL_DECIMAL_PLACES
+from common.enums import TransactionStatus
+from .models import Bill, Transaction
+
+ZERO = Decimal("0")
+
+
+def _money(expression):
+    return Coalesce(
+        expression,
+        Value(ZERO),
+        output_field=DecimalField(max_digits=DECIMAL_MAX_DIGITS, decimal_places=DECIMAL_DECIMAL_PLACES),
+    )
+
+
+def service_price(service_id):
+    return Service.objects.filter(pk=service_id).values_list("price", flat=True).first() or ZERO
+
+
+def apply_delta(bills, service_fee=ZERO, paid_amount=ZERO):
+    """Cộng dồn vào các hóa đơn trong ``bills`` (queryset) bằng một UPDATE."""
+    if not service_fee and not paid_amount:
+        return 0
+    # Giá có thể còn là float/int trong bộ nhớ (vd. Service vừa tạo chưa nạp lại)
+    service_fee, paid_amount = Decimal(str(service_fee)), Decimal(str(paid_amount))
+    updates = {"outstanding": F("outstanding") + (service_fee - paid_amount)}
+    if service_fee:
+        updates["service_fee"] = F("service_fee") + service_fee
+    if paid_amount:
+        updates["paid_amount"] = F("paid_amount") + paid_amount
+    return bills.update(**updates)
+
+
+def add_service_fee(appointment_id, amount):
+    return apply_delta(Bill.objects.filter(appointment_id=appointment_id), service_fee=amount)
+
+
+def add_payment(bill_id, amount):
+    return apply_delta(Bill.objects.filter(pk=bill_id), paid_amount=amount)
+
+
+def expected_totals():
+    """(service_fee, paid_amount) tính từ ServiceOrder và Transaction cho từng Bill."""
+    fees = (
+        ServiceOrder.objects.filter(appointment_id=OuterRef("appointment_id"))
+        .order_by()
+        .values("appointment_id")
+        .annotate(total=Sum("service__price"))
+        .values("total")
+    )
+    paid = (
+        Transaction.objects.filter(bill_id=OuterRef("pk"), status=TransactionStatus.SUCCESS.value)
+        .order_by()
+        .values("bill_id")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    return _money(Subquery(fees)), _money(Subquery(paid))
+
+
+def drifted(bills=None):
+    """Các hóa đơn có cột tổng hợp lệch so với dữ liệu gốc."""
+    bills = Bill.objects.all() if bills is None else bills
+    service_fee, paid_amount = expected_totals()
+    return bills.annotate(
+        expected_service_fee=service_fee, expected_paid_amount=paid_amount
+    ).filter(
+        ~Q(service_fee=F("expected_service_fee"))
+        | ~Q(paid_amount=F("expected_paid_amount"))
+        | ~Q(outstanding=F("amount") + F("expected_service_fee") - F("expected_paid_amount"))
+    )
+
+
+def rebuild_totals(bills=None):
+    """Tính lại cả ba cột cho ``bills`` (mặc định mọi hóa đơn) bằng một câu UPDATE."""
+    bills = Bill.objects.all() if bills is None else bills
+    service_fee, paid_amount = expected_totals()
+    return bills.update(
+        service_fee=service_fee,
+        paid_amount=paid_amount,
+        outstanding=F("amount") + service_fee - paid_amount,
+    )
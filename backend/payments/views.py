@@ -6,28 +6,23 @@ from django.http import Http404
 from django.utils.translation import gettext_lazy as _
 from django.shortcuts import get_object_or_404
 from .models import Bill, BillDetail, Transaction
-from .serializers import NewBillRequestSerializer, UpdateBillRequestSerializer, BillResponseSerializer, NewBillDetailRequestSerializer, BillDetailResponseSerializer, BillSerializer, TransactionDTOSerializer
+from .serializers import BillFilterSerializer, PaymentStatusQuerySerializer, NewBillRequestSerializer, UpdateBillRequestSerializer, BillResponseSerializer, NewBillDetailRequestSerializer, BillDetailResponseSerializer, BillSerializer, TransactionDTOSerializer
 from .services import BillService, PayOSService, TransactionService
-from rest_framework.exceptions import ValidationError
-from rest_framework.pagination import PageNumberPagination
 
 class BillViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
-    pagination_class = PageNumberPagination
 
     def list(self, request):
-        page = request.query_params.get('page', 1)
-        size = request.query_params.get('size', 10)
-        sort_by = request.query_params.get('sort_by', 'created_at')
-        sort_order = request.query_params.get('sort_order', 'desc')
-        try:
-            bills = BillService().get_all_bills(int(page), int(size), sort_by=sort_by, sort_order=sort_order)
-            paginator = self.pagination_class()
-            page = paginator.paginate_queryset(bills, request)
-            serializer = BillResponseSerializer(page, many=True)
-            return paginator.get_paginated_response(serializer.data)
-        except ValueError as e:
-            raise ValidationError({"error": str(e)})
+        filter_serializer = BillFilterSerializer(data=request.query_params)
+        filter_serializer.is_valid(raise_exception=True)
+        result_page = BillService().get_all_bills(**filter_serializer.validated_data)
+        serializer = BillResponseSerializer(result_page['results'], many=True)
+        return Response({
+            "content": serializer.data,
+            "pageSize": result_page['pageSize'],
+            "nextCursor": result_page['nextCursor'],
+            "last": result_page['last'],
+        })
 
     def create(self, request):
         serializer = NewBillRequestSerializer(data=request.data)
@@ -121,7 +116,7 @@ class TransactionViewSet(viewsets.ViewSet):
     def handle_payment_webhook(self, request):
         try:
             PayOSService().handle_payment_callback(request.data)
-            response = {"error": 0, "message": _("Webhook được xử lý thành công"), "data": None}
+            response = {"error": 0, "message": _("Đã tiếp nhận webhook"), "data": None}
             return Response(response)
         except Exception as e:
             return Response({"error": -1, "message": str(e), "data": None}, status=status.HTTP_400_BAD_REQUEST)
@@ -135,6 +130,14 @@ class TransactionViewSet(viewsets.ViewSet):
         except Exception as e:
             return Response({"error": -1, "message": str(e), "data": None}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'], url_path='payment-statuses')
+    def get_payment_statuses(self, request):
+        serializer = PaymentStatusQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response({"error": -1, "message": serializer.errors, "data": None}, status=status.HTTP_400_BAD_REQUEST)
+        statuses = PayOSService().get_payment_statuses(serializer.validated_data['order_codes'])
+        return Response({"error": 0, "message": _("Thành công"), "data": statuses})
+
     @action(detail=False, methods=['put'], url_path=r'cancel-payment/(?P<order_id>\d+)')
     def cancel_payment(self, request, order_id=None):
         try:
@@ -0,0 +1,210 @@
+"""
+Hộp thư webhook PayOS: endpoint chỉ xác thực chữ ký rồi ghi một dòng
+PaymentWebhookEvent (INSERT ... ON CONFLICT DO NOTHING theo orderCode) và trả
+lời ngay. Việc cập nhật hóa đơn do worker đảm nhận:
+
+- ``manage.py process_payment_webhooks``: tiến trình riêng với nhiều luồng.
+- Luồng nền trong tiến trình web (``settings.PAYOS_WEBHOOK_EAGER_WORKERS``),
+  được đánh thức sau khi ghi webhook.
+
+PayOS giao webhook ít nhất một lần. Bản gửi lại trùng orderCode bị bỏ qua khi
+ghi. Mỗi sự kiện được áp dụng trong một transaction giữ khóa
+``select_for_update`` trên Bill, và chỉ đổi giao dịch còn PENDING. Vì vậy xử lý
+lại một sự kiện (worker chết sau khi commit, hết hạn giữ chỗ) không làm gì thêm.
+"""
+import logging
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from appointments.models import Appointment
+from common.constants import PAYOS_WEBHOOK
+from common.enums import AppointmentStatus, PaymentStatus, TransactionStatus, WebhookStatus
+from .models import Bill, PaymentWebhookEvent, Transaction
+from .payos_client import forget_link_info
+
+logger = logging.getLogger(__name__)
+
+CLAIMABLE_STATUSES = [WebhookStatus.PENDING.value, WebhookStatus.PROCESSING.value]
+RESULT_FIELDS = ["status", "attempts", "available_at", "lease_id", "processed_at", "last_error", "updated_at"]
+# Lỗi không thể hết khi thử lại (vd. webhook kiểm tra của PayOS với orderCode giả)
+PERMANENT_ERRORS = (Bill.DoesNotExist,)
+
+
+def bill_id_from_order_code(order_code):
+    # create_payment_link: order_code = bill_id * 1000 + (timestamp % 1000)
+    return int(order_code) // 1000
+
+
+def apply_payment(bill_id, order_code=None, success=True):
+    """
+    Ghi nhận kết quả thanh toán online cho hóa đơn, giữ khóa trên Bill nên các
+    lời gọi đồng thời cho cùng hóa đơn chạy lần lượt. Trả về giao dịch đã cập
+    nhật, hoặc None nếu không còn giao dịch PENDING (đã xử lý trước đó).
+    """
+    with transaction.atomic():
+        bill = Bill.objects.select_for_update().get(pk=bill_id)
+        transactions = Transaction.objects.filter(bill=bill).order_by("-created_at")
+        if order_code is None:
+            txn = transactions.first()
+        else:
+            # Giao dịch tạo trước khi có cột order_code thì lấy giao dịch mới nhất
+            txn = (
+                transactions.filter(order_code=order_code).first()
+                or transactions.filter(order_code__isnull=True).first()
+            )
+        if txn is None or txn.status != TransactionStatus.PENDING.value:
+            return None
+
+        if success:
+            paid_amount = int(txn.amount or 0)
+            if paid_amount == int(bill.amount) and not bill.details.exists():
+                bill.status = PaymentStatus.BOOKING_PAID.value
+                if bill.appointment_id:
+                    appointment = Appointment.objects.get(pk=bill.appointment_id)
+                    appointment.status = AppointmentStatus.CONFIRMED.value
+                    appointment.save()
+                logger.info("Bill %s set to BOOKING_PAID and appointment confirmed.", bill_id)
+            elif paid_amount >= int(bill.amount):
+                bill.status = PaymentStatus.PAID.value
+                logger.info("Bill %s set to PAID.", bill_id)
+            txn.status = TransactionStatus.SUCCESS.value
+        else:
+            txn.status = TransactionStatus.FAILED.value
+            logger.info("Payment failed for bill %s", bill_id)
+
+        bill.save(update_fields=["status", "updated_at"])
+        txn.save(update_fields=["status", "updated_at"])
+        if txn.order_code is not None:
+            # Trạng thái link đã cache có thể còn là PENDING
+            transaction.on_commit(partial(forget_link_info, txn.order_code))
+        return txn
+
+
+def is_success(payload):
+    data = payload.get("data") or {}
+    return (
+        payload.get("success") is True
+        or payload.get("status") == "PAID"
+        or data.get("status") == "PAID"
+    )
+
+
+def record_webhook(order_code, payload):
+    """Ghi webhook đã xác thực vào hộp thư bằng một câu INSERT; bản trùng bị bỏ qua."""
+    PaymentWebhookEvent.objects.bulk_create(
+        [PaymentWebhookEvent(order_code=order_code, payload=payload)], ignore_conflicts=True
+    )
+    transaction.on_commit(wake_workers)
+
+
+def backoff_seconds(attempts):
+    delay = min(
+        PAYOS_WEBHOOK["BACKOFF_BASE_SECONDS"] * 2 ** (attempts - 1),
+        PAYOS_WEBHOOK["BACKOFF_MAX_SECONDS"],
+    )
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_batch(batch_size=None):
+    """
+    Giữ chỗ tối đa ``batch_size`` sự kiện đến hạn, kể cả sự kiện PROCESSING
+    quá hạn giữ chỗ (worker chết giữa chừng).
+    """
+    batch_size = batch_size or PAYOS_WEBHOOK["BATCH_SIZE"]
+    now = timezone.now()
+    lease_id = uuid.uuid4()
+    with transaction.atomic():
+        ids = list(
+            PaymentWebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status__in=CLAIMABLE_STATUSES, available_at__lte=now)
+            .order_by("available_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        PaymentWebhookEvent.objects.filter(
+            id__in=ids, status__in=CLAIMABLE_STATUSES, available_at__lte=now
+        ).update(
+            status=WebhookStatus.PROCESSING.value,
+            available_at=now + timedelta(seconds=PAYOS_WEBHOOK["LEASE_SECONDS"]),
+            lease_id=lease_id,
+        )
+    return list(PaymentWebhookEvent.objects.filter(lease_id=lease_id).order_by("id"))
+
+
+def _mark_failed(event, error, now, permanent=False):
+    event.attempts += 1
+    event.lease_id = None
+    event.last_error = str(error)
+    if permanent or event.attempts >= PAYOS_WEBHOOK["MAX_ATTEMPTS"]:
+        event.status = WebhookStatus.FAILED.value
+        logger.error("Webhook %s failed after %s attempts: %s", event.order_code, event.attempts, error)
+    else:
+        event.status = WebhookStatus.PENDING.value
+        event.available_at = now + timedelta(seconds=backoff_seconds(event.attempts))
+
+
+def process_event(event):
+    """Áp dụng một sự kiện; ghi kết quả cùng transaction với thay đổi hóa đơn."""
+    try:
+        with transaction.atomic():
+            applied = apply_payment(
+                bill_id_from_order_code(event.order_code), event.order_code, is_success(event.payload)
+            )
+            if applied is None:
+                logger.info("Webhook %s already applied, skipping", event.order_code)
+            event.status = WebhookStatus.PROCESSED.value
+            event.attempts += 1
+            event.lease_id = None
+            event.processed_at = timezone.now()
+            event.last_error = None
+            event.save(update_fields=RESULT_FIELDS)
+    except Exception as e:
+        _mark_failed(event, e, timezone.now(), permanent=isinstance(e, PERMANENT_ERRORS))
+        event.save(update_fields=RESULT_FIELDS)
+        return False
+    return True
+
+
+def drain(batch_size=None):
+    """Xử lý cho tới khi hết sự kiện đến hạn. Trả về (đã xử lý, thành công)."""
+    processed = succeeded = 0
+    while True:
+        events = claim_batch(batch_size)
+        if not events:
+            return processed, succeeded
+        succeeded += sum(process_event(event) for event in events)
+        processed += len(events)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _drain_in_background():
+    close_old_connections()
+    try:
+        drain()
+    except Exception:
+        logger.exception("Payment webhook worker crashed")
+    finally:
+        close_old_connections()
+
+
+def wake_workers():
+    workers = settings.PAYOS_WEBHOOK_EAGER_WORKERS
+    if workers <= 0:
+        return
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="payos-webhook")
+    _executor.submit(_drain_in_background)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.token_store import DatabaseTokenStore
+
+
+class Command(BaseCommand):
+    help = (
+        "Xóa các bản ghi EphemeralToken đã hết hạn. Chỉ cần khi dùng "
+        "DatabaseTokenStore; nên chạy định kỳ (cron)."
+    )
+
+    def handle(self, *args, **options):
+        deleted = DatabaseTokenStore().purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Đã xóa {deleted} token hết hạn."))
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:12
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_alter_user_role"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EphemeralToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("namespace", models.CharField(max_length=32)),
+                ("key", models.CharField(max_length=255)),
+                (
+                    "value",
+                    models.JSONField(
+                        encoder=django.core.serializers.json.DjangoJSONEncoder
+                    ),
+                ),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("namespace", "key"), name="uniq_ephemeral_token_key"
+                    )
+                ],
+            },
+        ),
+    ]
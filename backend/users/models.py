@@ -2,9 +2,10 @@ from django.db import models
 from django.contrib.auth.hashers import make_password, check_password
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import RegexValidator
+from django.core.serializers.json import DjangoJSONEncoder
 from core.models import BaseModel
 from common.enums import UserRole
-from common.constants import USER_LENGTH, ENUM_LENGTH, REGEX_PATTERNS
+from common.constants import USER_LENGTH, ENUM_LENGTH, REGEX_PATTERNS, COMMON_LENGTH
 
 class UserManager(models.Manager):
     def get_queryset(self):
@@ -120,3 +121,19 @@ class User(BaseModel):
             models.Index(fields=['email', 'is_deleted']),
             models.Index(fields=['phone', 'is_deleted']),
         ]
+
+
+class EphemeralToken(models.Model):
+    """Bản ghi của DatabaseTokenStore (OTP, đăng ký chờ, reset token)."""
+    namespace = models.CharField(max_length=COMMON_LENGTH["TOKEN_NAMESPACE"])
+    key = models.CharField(max_length=COMMON_LENGTH["TOKEN"])
+    value = models.JSONField(encoder=DjangoJSONEncoder)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['namespace', 'key'], name='uniq_ephemeral_token_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.namespace}:{self.key}"
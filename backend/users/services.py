@@ -1,18 +1,24 @@
 from django.db.models import Q
-from django.core.mail import send_mail
 from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.db import transaction, connection
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 from rest_framework_simplejwt.tokens import RefreshToken
-from datetime import datetime, timedelta
 from django.utils.translation import gettext as _
 from .models import User
 from patients.models import Patient 
 from doctors.models import Doctor
+from notifications.email_queue import queue_mail
 from common.enums import UserRole, Gender
-from common.constants import COMMON_LENGTH
+from common.constants import COMMON_LENGTH, EPHEMERAL_TTL
+from .token_store import (
+    get_token_store,
+    REGISTRATION_NAMESPACE,
+    OTP_NAMESPACE,
+    RESET_TOKEN_NAMESPACE,
+)
 
 class JwtService:
     @staticmethod
@@ -27,9 +33,6 @@ class JwtService:
         }
 
 class AuthService:
-    pending_registrations = {}
-    pending_expirations = {}
-    
     @transaction.atomic
     def pre_register(self, data):
         email = data.get('email')
@@ -47,8 +50,11 @@ class AuthService:
         
         identifier = email
         
-        AuthService.pending_registrations[identifier] = data
-        AuthService.pending_expirations[identifier] = datetime.now() + timedelta(minutes=10)
+        # Kho có thể là bảng EphemeralToken: chỉ lưu mật khẩu đã băm, không lưu bản rõ
+        pending = {**data, 'password': make_password(data['password'])}
+        get_token_store().set(
+            REGISTRATION_NAMESPACE, identifier, pending, EPHEMERAL_TTL["REGISTRATION"]
+        )
         
         OtpService().send_otp_to_email(email)
         
@@ -58,22 +64,18 @@ class AuthService:
     def complete_registration(cls, data):
         email = data['email']
     
-        cls._cleanup_expired_registrations()
-    
-        if email not in cls.pending_registrations:
-            raise ValidationError(_("Thông tin đăng ký không tìm thấy hoặc đã hết hạn")) 
-    
-        register_data = cls.pending_registrations.get(email)
+        register_data = get_token_store().get(REGISTRATION_NAMESPACE, email)
         if not register_data:
-            raise ValidationError(_("Không tìm thấy thông tin đăng ký hoặc đã hết hạn"))
+            raise ValidationError(_("Thông tin đăng ký không tìm thấy hoặc đã hết hạn"))
     
         otp_response = OtpService().validate_otp_by_email(email, data['otp'])
 
         if otp_response.get('resetToken') != 'SUCCESS':
             raise ValidationError(otp_response.get('resetToken', _('Xác thực OTP thất bại')))
     
-        user = User.objects.create_user(
-            email=register_data.get('email'),
+        # Mật khẩu đã được băm ở pre_register nên gán thẳng, không qua set_password
+        user = User.objects.create(
+            email=User.objects.normalize_email(register_data.get('email')),
             phone=register_data.get('phone'),
             password=register_data['password'],
             role=UserRole.PATIENT.value,
@@ -96,19 +98,10 @@ class AuthService:
             address=register_data['address']
         )
     
-        cls.pending_registrations.pop(email, None)
-        cls.pending_expirations.pop(email, None)
+        get_token_store().delete(REGISTRATION_NAMESPACE, email)
     
         return {'id': user.id, 'role': user.role}
     
-    @classmethod
-    def _cleanup_expired_registrations(cls):
-        current_time = datetime.now()
-        expired_keys = [key for key, exp_time in cls.pending_expirations.items() if exp_time < current_time]
-        for key in expired_keys:
-            cls.pending_registrations.pop(key, None)
-            cls.pending_expirations.pop(key, None)
-    
     def login(self, data):
         identifier = data.get('email') or data.get('phone')
         password = data['password']
@@ -134,12 +127,11 @@ class AuthService:
         user = get_object_or_404(User, email=email, is_deleted=False)
         reset_token = ResetTokenService.generate_reset_token(user)
         
-        send_mail(
+        queue_mail(
             _('Đặt lại mật khẩu'),
             _('Mã đặt lại mật khẩu của bạn là: %(token)s') % {'token': reset_token},
             settings.EMAIL_HOST_USER,
             [email],
-            fail_silently=False,
         )
         
         return {'message': _('Email đặt lại mật khẩu đã được gửi')}
@@ -152,9 +144,7 @@ class AuthService:
         return {'message': _('Mã OTP đã được gửi đến email của bạn')}
 
     def resend_otp(self, email):
-        self._cleanup_expired_registrations()
-
-        if email not in self.pending_registrations:
+        if get_token_store().get(REGISTRATION_NAMESPACE, email) is None:
             raise ValidationError(_("Không tìm thấy thông tin đăng ký hoặc đã hết hạn"))
 
         OtpService().send_otp_to_email(email)
@@ -177,82 +167,55 @@ class AuthService:
         return {'message': _("Đặt lại mật khẩu thành công")}
 
 class ResetTokenService:
-    reset_tokens = {}  
-
     @staticmethod
     def generate_reset_token(user):
         import random
         token = ''.join(random.choices('0123456789', k=COMMON_LENGTH["RESET_TOKEN"]))
         
-        ResetTokenService.reset_tokens[token] = {
-            'user_id': user.id,
-            'expires': datetime.now() + timedelta(minutes=10)
-        }
+        get_token_store().set(
+            RESET_TOKEN_NAMESPACE, token, {'user_id': user.id}, EPHEMERAL_TTL["RESET_TOKEN"]
+        )
         
         return token
 
     @staticmethod
     def validate_reset_token(token):
-        current_time = datetime.now()
-        expired_tokens = [t for t, data in ResetTokenService.reset_tokens.items() 
-                            if data['expires'] < current_time]
-        for expired_token in expired_tokens:
-            ResetTokenService.reset_tokens.pop(expired_token, None)
-        
-        token_data = ResetTokenService.reset_tokens.get(token)
+        token_data = get_token_store().get(RESET_TOKEN_NAMESPACE, token)
         if not token_data:
             return None
         
         try:
             return get_object_or_404(User, id=token_data['user_id'], is_deleted=False)
         except:
-            ResetTokenService.reset_tokens.pop(token, None)
+            ResetTokenService.remove_reset_token(token)
             return None
 
     @staticmethod
     def remove_reset_token(token):
-        ResetTokenService.reset_tokens.pop(token, None)
+        get_token_store().delete(RESET_TOKEN_NAMESPACE, token)
 
 class OtpService:
-    otp_storage = {}  
-
     @staticmethod
     def generate_otp():
         import random
         return ''.join(random.choices('0123456789', k=6))
 
-    @staticmethod
-    def _cleanup_expired_otps():
-        current_time = datetime.now()
-        expired_keys = [key for key, data in OtpService.otp_storage.items() 
-                        if data['expires'] < current_time]
-        for key in expired_keys:
-            OtpService.otp_storage.pop(key, None)
-
     @staticmethod
     def send_otp_to_email(email):
-        OtpService._cleanup_expired_otps()
         otp = OtpService.generate_otp()
         
-        send_mail(
+        queue_mail(
             _('Xác nhận email'),
             _('Mã OTP của bạn là: %(otp)s. Mã này có hiệu lực trong 10 phút.') % {'otp': otp},
             settings.EMAIL_HOST_USER,
             [email],
-            fail_silently=True,
         )
         
-        OtpService.otp_storage[email] = {
-            'otp': otp,
-            'expires': datetime.now() + timedelta(minutes=10)
-        }
-        
+        get_token_store().set(OTP_NAMESPACE, email, {'otp': otp}, EPHEMERAL_TTL["OTP"])
 
     @staticmethod
     def validate_otp_by_email(email, user_input_otp):
-        OtpService._cleanup_expired_otps()
-        
-        otp_data = OtpService.otp_storage.get(email)
+        otp_data = get_token_store().get(OTP_NAMESPACE, email)
     
         if not otp_data:
             return {'resetToken': _('OTP đã hết hạn hoặc không tồn tại')}
@@ -260,7 +223,7 @@ class OtpService:
         if otp_data['otp'] != user_input_otp:
             return {'resetToken': _('Mã OTP không đúng')}
     
-        del OtpService.otp_storage[email]
+        get_token_store().delete(OTP_NAMESPACE, email)
         return {'resetToken': 'SUCCESS'}
 
 class UserService:
@@ -1,4 +1,5 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.mail import send_mail
@@ -8,8 +9,13 @@ from django.utils.translation import gettext as _
 from rest_framework.exceptions import ValidationError
 from rest_framework_simplejwt.tokens import AccessToken
 from unittest.mock import patch
-from datetime import datetime, timedelta, date
+import json
+import re
+from datetime import date
+from users import services
 from users.services import JwtService, AuthService, ResetTokenService, OtpService, UserService
+from users.models import EphemeralToken
+from users.token_store import get_token_store, REGISTRATION_NAMESPACE, OTP_NAMESPACE, RESET_TOKEN_NAMESPACE
 from patients.models import Patient
 from doctors.models import Doctor
 from common.enums import UserRole, Gender
@@ -59,10 +65,13 @@ class ServicesTest(TestCase):
         cls.service = UserService()
 
     def setUp(self):
-        AuthService.pending_registrations = {}
-        AuthService.pending_expirations = {}
-        OtpService.otp_storage = {}
-        ResetTokenService.reset_tokens = {}
+        self.store = get_token_store()
+
+    def _otp(self, email):
+        return self.store.get(OTP_NAMESPACE, email)['otp']
+
+    def _expire(self, namespace, key):
+        self.store.set(namespace, key, self.store.get(namespace, key), 0)
 
     def test_jwt_service_generate_token(self):
         token_data = JwtService.generate_token(self.user)
@@ -72,7 +81,7 @@ class ServicesTest(TestCase):
         self.assertEqual(refresh['role'], self.user.role)
         self.assertEqual(refresh['userId'], str(self.user.id))
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_pre_register_valid(self):
         data = {
             'email': 'newuser@example.com',
@@ -87,13 +96,12 @@ class ServicesTest(TestCase):
         }
         message = AuthService().pre_register(data)
         self.assertEqual(message, _("Mã OTP đã được gửi đến email của bạn"))
-        self.assertIn('newuser@example.com', AuthService.pending_registrations)
-        self.assertEqual(AuthService.pending_registrations['newuser@example.com'], data)
-        self.assertTrue(AuthService.pending_expirations['newuser@example.com'] > datetime.now())
-        self.assertEqual(len(OtpService.otp_storage), 1)
-        self.assertIn('newuser@example.com', OtpService.otp_storage)
+        pending = self.store.get(REGISTRATION_NAMESPACE, 'newuser@example.com')
+        self.assertEqual(pending['email'], data['email'])
+        self.assertEqual(pending['fullName'], data['fullName'])
+        self.assertIsNotNone(self.store.get(OTP_NAMESPACE, 'newuser@example.com'))
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_pre_register_duplicate_email(self):
         data = {
             'email': 'test@example.com',  # Existing email
@@ -109,7 +117,7 @@ class ServicesTest(TestCase):
         with self.assertRaisesMessage(ValidationError, _("Email đã được sử dụng")):
             AuthService().pre_register(data)
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_pre_register_duplicate_phone(self):
         data = {
             'email': 'newuser@example.com',
@@ -125,7 +133,7 @@ class ServicesTest(TestCase):
         with self.assertRaisesMessage(ValidationError, _("Số điện thoại đã được sử dụng")):
             AuthService().pre_register(data)
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_pre_register_invalid_gender(self):
         data = {
             'email': 'newuser@example.com',
@@ -141,7 +149,7 @@ class ServicesTest(TestCase):
         with self.assertRaisesMessage(ValidationError, _("Giới tính không hợp lệ. Chỉ chấp nhận: M, F, O")):
             AuthService().pre_register(data)
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_complete_registration_valid(self):
         data = {
             'email': 'newuser@example.com',
@@ -157,7 +165,7 @@ class ServicesTest(TestCase):
         AuthService().pre_register(data)
         complete_data = {
             'email': 'newuser@example.com',
-            'otp': OtpService.otp_storage['newuser@example.com']['otp']
+            'otp': self._otp('newuser@example.com')
         }
         result = AuthService.complete_registration(complete_data)
         self.assertEqual(result['role'], UserRole.PATIENT.value)
@@ -169,10 +177,37 @@ class ServicesTest(TestCase):
         self.assertEqual(patient.last_name, 'User')
         self.assertEqual(patient.identity_number, '987654321012')
         self.assertEqual(patient.gender, Gender.FEMALE.value)
-        self.assertNotIn('newuser@example.com', AuthService.pending_registrations)
-        self.assertNotIn('newuser@example.com', OtpService.otp_storage)
+        self.assertIsNone(self.store.get(REGISTRATION_NAMESPACE, 'newuser@example.com'))
+        self.assertIsNone(self.store.get(OTP_NAMESPACE, 'newuser@example.com'))
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @override_settings(EPHEMERAL_TOKEN_STORE={'BACKEND': 'users.token_store.DatabaseTokenStore'})
+    @patch('users.services.queue_mail', new=MockEmailSend())
+    def test_auth_service_pre_register_never_stores_plaintext_password(self):
+        data = {
+            'email': 'newuser@example.com',
+            'phone': '0112233445',
+            'password': 'NewPass123!',
+            'fullName': 'New User',
+            'identityNumber': '987654321012',
+            'insuranceNumber': 'INS654321',
+            'birthday': date(1995, 5, 5),
+            'gender': Gender.FEMALE.value,
+            'address': '456 Elm St'
+        }
+        AuthService().pre_register(data)
+        stored = EphemeralToken.objects.get(namespace=REGISTRATION_NAMESPACE, key='newuser@example.com')
+        self.assertNotIn('NewPass123!', json.dumps(stored.value))
+        self.assertTrue(check_password('NewPass123!', stored.value['password']))
+
+        AuthService.complete_registration({
+            'email': 'newuser@example.com',
+            'otp': get_token_store().get(OTP_NAMESPACE, 'newuser@example.com')['otp'],
+        })
+        user = User.objects.get(email='newuser@example.com')
+        self.assertTrue(user.check_password('NewPass123!'))
+        self.assertIn('token', AuthService().login({'email': 'newuser@example.com', 'password': 'NewPass123!'}))
+
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_complete_registration_invalid_otp(self):
         data = {
             'email': 'newuser@example.com',
@@ -193,7 +228,7 @@ class ServicesTest(TestCase):
         with self.assertRaisesMessage(ValidationError, _("Mã OTP không đúng")):
             AuthService.complete_registration(complete_data)
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_complete_registration_expired(self):
         data = {
             'email': 'newuser@example.com',
@@ -207,15 +242,16 @@ class ServicesTest(TestCase):
             'address': '456 Elm St'
         }
         AuthService().pre_register(data)
-        AuthService.pending_expirations['newuser@example.com'] = datetime.now() - timedelta(minutes=1)
+        self._expire(REGISTRATION_NAMESPACE, 'newuser@example.com')
         complete_data = {
             'email': 'newuser@example.com',
-            'otp': OtpService.otp_storage['newuser@example.com']['otp']
+            'otp': self._otp('newuser@example.com')
         }
         with self.assertRaisesMessage(ValidationError, _("Thông tin đăng ký không tìm thấy hoặc đã hết hạn")):
             AuthService.complete_registration(complete_data)
 
-    def test_auth_service_cleanup_expired_registrations(self):
+    @patch('users.services.queue_mail', new=MockEmailSend())
+    def test_auth_service_expired_registration_cannot_resend(self):
         data = {
             'email': 'newuser@example.com',
             'phone': '0112233445',
@@ -228,10 +264,10 @@ class ServicesTest(TestCase):
             'address': '456 Elm St'
         }
         AuthService().pre_register(data)
-        AuthService.pending_expirations['newuser@example.com'] = datetime.now() - timedelta(minutes=1)
-        AuthService._cleanup_expired_registrations()
-        self.assertNotIn('newuser@example.com', AuthService.pending_registrations)
-        self.assertNotIn('newuser@example.com', AuthService.pending_expirations)
+        self._expire(REGISTRATION_NAMESPACE, 'newuser@example.com')
+        self.assertIsNone(self.store.get(REGISTRATION_NAMESPACE, 'newuser@example.com'))
+        with self.assertRaisesMessage(ValidationError, _("Không tìm thấy thông tin đăng ký hoặc đã hết hạn")):
+            AuthService().resend_otp('newuser@example.com')
 
     def test_auth_service_login_valid_email(self):
         data = {
@@ -270,33 +306,31 @@ class ServicesTest(TestCase):
         with self.assertRaisesMessage(ValidationError, _("Vui lòng cung cấp email hoặc số điện thoại")):
             AuthService().login(data)
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_send_reset_password_email(self):
         result = AuthService().send_reset_password_email('test@example.com')
         self.assertEqual(result['message'], _("Email đặt lại mật khẩu đã được gửi"))
-        self.assertEqual(len(ResetTokenService.reset_tokens), 1)
-        token = list(ResetTokenService.reset_tokens.keys())[0]
-        token_data = ResetTokenService.reset_tokens[token]
+        token = re.search(r'(\d{%d})' % COMMON_LENGTH["RESET_TOKEN"], services.queue_mail.sent_emails[-1]['message']).group(1)
+        token_data = self.store.get(RESET_TOKEN_NAMESPACE, token)
         self.assertEqual(token_data['user_id'], self.user.id)
-        self.assertTrue(token_data['expires'] > datetime.now())
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_send_reset_password_email_nonexistent_user(self):
         with self.assertRaises(Http404):
             AuthService().send_reset_password_email('nonexistent@example.com')
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_send_reset_password_otp(self):
         result = AuthService().send_reset_password_otp('test@example.com')
         self.assertEqual(result['message'], _("Mã OTP đã được gửi đến email của bạn"))
-        self.assertIn('test@example.com', OtpService.otp_storage)
+        self.assertIsNotNone(self.store.get(OTP_NAMESPACE, 'test@example.com'))
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_send_reset_password_otp_nonexistent_user(self):
         with self.assertRaises(Http404):
             AuthService().send_reset_password_otp('nonexistent@example.com')
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_resend_otp(self):
         data = {
             'email': 'newuser@example.com',
@@ -312,14 +346,14 @@ class ServicesTest(TestCase):
         AuthService().pre_register(data)
         message = AuthService().resend_otp('newuser@example.com')
         self.assertEqual(message, _("Mã OTP đã được gửi lại đến email của bạn"))
-        self.assertIn('newuser@example.com', OtpService.otp_storage)
+        self.assertIsNotNone(self.store.get(OTP_NAMESPACE, 'newuser@example.com'))
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_resend_otp_no_pending_registration(self):
         with self.assertRaisesMessage(ValidationError, _("Không tìm thấy thông tin đăng ký hoặc đã hết hạn")):
             AuthService().resend_otp('newuser@example.com')
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_auth_service_reset_password_valid(self):
         token = ResetTokenService.generate_reset_token(self.user)
         data = {
@@ -330,7 +364,7 @@ class ServicesTest(TestCase):
         self.assertEqual(result['message'], _("Đặt lại mật khẩu thành công"))
         user = User.objects.get(id=self.user.id)
         self.assertTrue(user.check_password('NewPass123!'))
-        self.assertNotIn(token, ResetTokenService.reset_tokens)
+        self.assertIsNone(self.store.get(RESET_TOKEN_NAMESPACE, token))
 
     def test_auth_service_reset_password_invalid_token(self):
         data = {
@@ -342,9 +376,7 @@ class ServicesTest(TestCase):
 
     def test_reset_token_service_generate_reset_token(self):
         token = ResetTokenService.generate_reset_token(self.user)
-        self.assertIn(token, ResetTokenService.reset_tokens)
-        self.assertEqual(ResetTokenService.reset_tokens[token]['user_id'], self.user.id)
-        self.assertTrue(ResetTokenService.reset_tokens[token]['expires'] > datetime.now())
+        self.assertEqual(self.store.get(RESET_TOKEN_NAMESPACE, token)['user_id'], self.user.id)
 
     def test_reset_token_service_validate_reset_token_valid(self):
         token = ResetTokenService.generate_reset_token(self.user)
@@ -353,41 +385,38 @@ class ServicesTest(TestCase):
 
     def test_reset_token_service_validate_reset_token_expired(self):
         token = ResetTokenService.generate_reset_token(self.user)
-        ResetTokenService.reset_tokens[token]['expires'] = datetime.now() - timedelta(minutes=1)
+        self._expire(RESET_TOKEN_NAMESPACE, token)
         user = ResetTokenService.validate_reset_token(token)
         self.assertIsNone(user)
-        self.assertNotIn(token, ResetTokenService.reset_tokens)
 
     def test_reset_token_service_remove_reset_token(self):
         token = ResetTokenService.generate_reset_token(self.user)
         ResetTokenService.remove_reset_token(token)
-        self.assertNotIn(token, ResetTokenService.reset_tokens)
+        self.assertIsNone(self.store.get(RESET_TOKEN_NAMESPACE, token))
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_otp_service_generate_and_send_otp(self):
         OtpService.send_otp_to_email('test@example.com')
-        self.assertIn('test@example.com', OtpService.otp_storage)
-        otp_data = OtpService.otp_storage['test@example.com']
-        self.assertEqual(len(otp_data['otp']), 6)
-        self.assertTrue(otp_data['expires'] > datetime.now())
+        self.assertEqual(len(self._otp('test@example.com')), 6)
 
     def test_otp_service_validate_otp_valid(self):
         OtpService.send_otp_to_email('test@example.com')
-        otp = OtpService.otp_storage['test@example.com']['otp']
+        otp = self._otp('test@example.com')
         result = OtpService.validate_otp_by_email('test@example.com', otp)
         self.assertEqual(result['resetToken'], 'SUCCESS')
-        self.assertNotIn('test@example.com', OtpService.otp_storage)
+        self.assertIsNone(self.store.get(OTP_NAMESPACE, 'test@example.com'))
 
     def test_otp_service_validate_otp_invalid(self):
         OtpService.send_otp_to_email('test@example.com')
         result = OtpService.validate_otp_by_email('test@example.com', 'wrong_otp')
         self.assertEqual(result['resetToken'], _("Mã OTP không đúng"))
 
-    def test_otp_service_cleanup_expired_otps(self):
+    def test_otp_service_validate_otp_expired(self):
         OtpService.send_otp_to_email('test@example.com')
-        OtpService.otp_storage['test@example.com']['expires'] = datetime.now() - timedelta(minutes=1)
-        OtpService._cleanup_expired_otps()
-        self.assertNotIn('test@example.com', OtpService.otp_storage)
+        otp = self._otp('test@example.com')
+        self._expire(OTP_NAMESPACE, 'test@example.com')
+        result = OtpService.validate_otp_by_email('test@example.com', otp)
+        self.assertEqual(result['resetToken'], _('OTP đã hết hạn hoặc không tồn tại'))
 
     def test_user_service_get_all_users(self):
         result = self.service.get_all_users(page=0, size=10)
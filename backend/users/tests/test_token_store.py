@@ -0,0 +1,114 @@
+from io import StringIO
+from datetime import date
+from unittest.mock import patch
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from users.models import EphemeralToken
+from users.token_store import (
+    LocMemTokenStore,
+    CacheTokenStore,
+    DatabaseTokenStore,
+    get_token_store,
+    OTP_NAMESPACE,
+    REGISTRATION_NAMESPACE,
+)
+
+
+class TokenStoreContract:
+    """Các kiểm tra chung mà mọi backend phải thỏa."""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        cache.clear()
+        self.store = self.make_store()
+
+    def test_set_and_get(self):
+        self.store.set(OTP_NAMESPACE, 'a@example.com', {'otp': '123456'}, 60)
+        self.assertEqual(self.store.get(OTP_NAMESPACE, 'a@example.com'), {'otp': '123456'})
+
+    def test_missing_key_returns_none(self):
+        self.assertIsNone(self.store.get(OTP_NAMESPACE, 'missing@example.com'))
+
+    def test_namespaces_are_isolated(self):
+        self.store.set(OTP_NAMESPACE, 'a@example.com', {'otp': '123456'}, 60)
+        self.assertIsNone(self.store.get(REGISTRATION_NAMESPACE, 'a@example.com'))
+
+    def test_set_overwrites_value_and_ttl(self):
+        self.store.set(OTP_NAMESPACE, 'a@example.com', {'otp': '111111'}, 0)
+        self.store.set(OTP_NAMESPACE, 'a@example.com', {'otp': '222222'}, 60)
+        self.assertEqual(self.store.get(OTP_NAMESPACE, 'a@example.com'), {'otp': '222222'})
+
+    def test_zero_ttl_is_expired(self):
+        self.store.set(OTP_NAMESPACE, 'a@example.com', {'otp': '123456'}, 0)
+        self.assertIsNone(self.store.get(OTP_NAMESPACE, 'a@example.com'))
+
+    def test_delete(self):
+        self.store.set(OTP_NAMESPACE, 'a@example.com', {'otp': '123456'}, 60)
+        self.store.delete(OTP_NAMESPACE, 'a@example.com')
+        self.store.delete(OTP_NAMESPACE, 'a@example.com')
+        self.assertIsNone(self.store.get(OTP_NAMESPACE, 'a@example.com'))
+
+
+class LocMemTokenStoreTest(TokenStoreContract, TestCase):
+    def make_store(self):
+        return LocMemTokenStore()
+
+    def test_entry_expires_after_ttl(self):
+        with patch('users.token_store.time.monotonic', return_value=1000.0):
+            self.store.set(OTP_NAMESPACE, 'a@example.com', {'otp': '123456'}, 60)
+        with patch('users.token_store.time.monotonic', return_value=1059.0):
+            self.assertIsNotNone(self.store.get(OTP_NAMESPACE, 'a@example.com'))
+        with patch('users.token_store.time.monotonic', return_value=1060.0):
+            self.assertIsNone(self.store.get(OTP_NAMESPACE, 'a@example.com'))
+
+
+class CacheTokenStoreTest(TokenStoreContract, TestCase):
+    def make_store(self):
+        return CacheTokenStore()
+
+    def test_visible_to_other_instances(self):
+        # Hai worker có store riêng nhưng cùng trỏ tới một cache
+        self.store.set(OTP_NAMESPACE, 'a@example.com', {'otp': '123456'}, 60)
+        self.assertEqual(CacheTokenStore().get(OTP_NAMESPACE, 'a@example.com'), {'otp': '123456'})
+
+
+class DatabaseTokenStoreTest(TokenStoreContract, TestCase):
+    def make_store(self):
+        return DatabaseTokenStore()
+
+    def test_visible_to_other_instances(self):
+        self.store.set(OTP_NAMESPACE, 'a@example.com', {'otp': '123456'}, 60)
+        self.assertEqual(DatabaseTokenStore().get(OTP_NAMESPACE, 'a@example.com'), {'otp': '123456'})
+
+    def test_dates_are_serialized(self):
+        self.store.set(REGISTRATION_NAMESPACE, 'a@example.com', {'birthday': date(1995, 5, 5)}, 60)
+        self.assertEqual(self.store.get(REGISTRATION_NAMESPACE, 'a@example.com'), {'birthday': '1995-05-05'})
+
+    def test_expired_entry_is_deleted_on_read(self):
+        self.store.set(REGISTRATION_NAMESPACE, 'a@example.com', {'email': 'a@example.com'}, 0)
+        self.assertIsNone(self.store.get(REGISTRATION_NAMESPACE, 'a@example.com'))
+        self.assertFalse(EphemeralToken.objects.exists())
+
+    def test_purge_expired_tokens_command(self):
+        self.store.set(OTP_NAMESPACE, 'expired@example.com', {'otp': '111111'}, 0)
+        self.store.set(OTP_NAMESPACE, 'live@example.com', {'otp': '222222'}, 60)
+        out = StringIO()
+        call_command('purge_expired_tokens', stdout=out)
+        self.assertEqual(
+            list(EphemeralToken.objects.values_list('key', flat=True)), ['live@example.com']
+        )
+
+
+class GetTokenStoreTest(TestCase):
+    def test_backend_follows_settings(self):
+        with override_settings(EPHEMERAL_TOKEN_STORE={'BACKEND': 'users.token_store.LocMemTokenStore'}):
+            self.assertIsInstance(get_token_store(), LocMemTokenStore)
+        with override_settings(EPHEMERAL_TOKEN_STORE={
+            'BACKEND': 'users.token_store.CacheTokenStore', 'OPTIONS': {'key_prefix': 'otp-test'},
+        }):
+            store = get_token_store()
+            self.assertIsInstance(store, CacheTokenStore)
+            self.assertEqual(store.key_prefix, 'otp-test')
@@ -8,6 +8,7 @@ from unittest.mock import patch
 from datetime import datetime, timedelta, date
 from users.models import User
 from users.services import UserService, AuthService, OtpService, ResetTokenService
+from users.token_store import get_token_store, OTP_NAMESPACE
 from patients.models import Patient
 from common.enums import UserRole, Gender
 from common.constants import PAGE_NO_DEFAULT, PAGE_SIZE_DEFAULT
@@ -293,10 +294,10 @@ class UserViewSetTest(APITestCase):
             'gender': Gender.FEMALE.value,
             'address': '456 Elm St'
         }
-        with patch('users.services.send_mail', new=MockEmailSend()):
+        with patch('users.services.queue_mail', new=MockEmailSend()):
             response = self.client.post('/api/v1/auth/register/', data, format='json')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
-        otp = OtpService.otp_storage['newuser@example.com']['otp']
+        otp = get_token_store().get(OTP_NAMESPACE, 'newuser@example.com')['otp']
         verify_data = {
             'email': 'newuser@example.com',
             'otp': otp
@@ -317,7 +318,7 @@ class UserViewSetTest(APITestCase):
             'gender': Gender.FEMALE.value,
             'address': '456 Elm St'
         }
-        with patch('users.services.send_mail', new=MockEmailSend()):
+        with patch('users.services.queue_mail', new=MockEmailSend()):
             response = self.client.post('/api/v1/auth/register/', data, format='json')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
         verify_data = {
@@ -354,7 +355,7 @@ class UserViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(str(response.data[0]), _('Email/Số điện thoại hoặc mật khẩu không chính xác'))
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_forgot_password_email(self):
         data = {
             'email': 'patient@example.com'
@@ -370,7 +371,7 @@ class UserViewSetTest(APITestCase):
         response = self.client.post('/api/v1/auth/forgot-password/', data, format='json')
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_forgot_password_otp(self):
         data = {
             'email': 'patient@example.com'
@@ -379,7 +380,7 @@ class UserViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['message'], _('Mã OTP đã được gửi đến email của bạn'))
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_resend_otp(self):
         data = {
             'email': 'newuser@example.com',
@@ -392,7 +393,7 @@ class UserViewSetTest(APITestCase):
             'gender': Gender.FEMALE.value,
             'address': '456 Elm St'
         }
-        with patch('users.services.send_mail', new=MockEmailSend()):
+        with patch('users.services.queue_mail', new=MockEmailSend()):
             response = self.client.post('/api/v1/auth/register/', data, format='json')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
         resend_data = {
@@ -402,14 +403,14 @@ class UserViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['message'], _('OTP đã được gửi lại tới %(email)s') % {'email': 'newuser@example.com'})
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_verify_otp(self):
         data = {
             'email': 'patient@example.com'
         }
         response = self.client.post('/api/v1/auth/forgot-password/', data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        otp = OtpService.otp_storage['patient@example.com']['otp']
+        otp = get_token_store().get(OTP_NAMESPACE, 'patient@example.com')['otp']
         verify_data = {
             'email': 'patient@example.com',
             'otp': otp
@@ -419,7 +420,7 @@ class UserViewSetTest(APITestCase):
         self.assertEqual(response.data['message'], _('Xác minh OTP thành công'))
         self.assertIn('resetToken', response.data)
 
-    @patch('users.services.send_mail', new=MockEmailSend())
+    @patch('users.services.queue_mail', new=MockEmailSend())
     def test_verify_otp_invalid(self):
         data = {
             'email': 'patient@example.com'
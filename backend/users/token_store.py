@@ -0,0 +1,143 @@
+"""
+Kho lưu dữ liệu ngắn hạn (OTP, đăng ký chờ xác thực, mã đặt lại mật khẩu).
+
+Mỗi bản ghi nằm trong một namespace và tự hết hạn theo TTL, nên không cần
+quét dọn toàn bộ kho ở mỗi lần gọi. Backend được chọn qua
+``settings.EPHEMERAL_TOKEN_STORE``:
+
+- ``LocMemTokenStore``: dict trong tiến trình, chỉ dùng cho dev/test.
+- ``CacheTokenStore``: Django cache; trỏ ``CACHES`` tới Redis để mọi worker dùng chung.
+- ``DatabaseTokenStore``: bảng ``EphemeralToken``; bản ghi hết hạn bị xóa khi
+  đọc tới, phần còn lại dọn bằng lệnh ``purge_expired_tokens``.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+REGISTRATION_NAMESPACE = "registration"
+OTP_NAMESPACE = "otp"
+RESET_TOKEN_NAMESPACE = "reset"
+
+
+class BaseTokenStore:
+    def set(self, namespace, key, value, ttl):
+        raise NotImplementedError
+
+    def get(self, namespace, key):
+        """Trả về giá trị còn hạn hoặc None."""
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+
+class LocMemTokenStore(BaseTokenStore):
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def set(self, namespace, key, value, ttl):
+        with self._lock:
+            self._data[(namespace, key)] = (value, time.monotonic() + ttl)
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._data[(namespace, key)]
+                return None
+            return value
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+
+class CacheTokenStore(BaseTokenStore):
+    def __init__(self, alias="default", key_prefix="ephemeral"):
+        self.alias = alias
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, namespace, key):
+        return f"{self.key_prefix}:{namespace}:{key}"
+
+    def set(self, namespace, key, value, ttl):
+        # Django cache coi timeout 0 là hết hạn ngay, khớp với các backend khác
+        self.cache.set(self._key(namespace, key), value, timeout=max(ttl, 0))
+
+    def get(self, namespace, key):
+        return self.cache.get(self._key(namespace, key))
+
+    def delete(self, namespace, key):
+        self.cache.delete(self._key(namespace, key))
+
+
+class DatabaseTokenStore(BaseTokenStore):
+    @property
+    def model(self):
+        from .models import EphemeralToken
+        return EphemeralToken
+
+    def set(self, namespace, key, value, ttl):
+        self.model.objects.update_or_create(
+            namespace=namespace,
+            key=key,
+            defaults={"value": value, "expires_at": timezone.now() + timedelta(seconds=ttl)},
+        )
+
+    def get(self, namespace, key):
+        entry = (
+            self.model.objects.filter(namespace=namespace, key=key)
+            .values_list("value", "expires_at")
+            .first()
+        )
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= timezone.now():
+            # Xóa ngay thay vì chờ purge_expired_tokens
+            self.delete(namespace, key)
+            return None
+        return value
+
+    def delete(self, namespace, key):
+        self.model.objects.filter(namespace=namespace, key=key).delete()
+
+    def purge_expired(self):
+        deleted, _ = self.model.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_token_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                conf = settings.EPHEMERAL_TOKEN_STORE
+                _store = import_string(conf["BACKEND"])(**conf.get("OPTIONS", {}))
+    return _store
+
+
+@receiver(setting_changed)
+def _reset_token_store(*, setting, **kwargs):
+    global _store
+    if setting == "EPHEMERAL_TOKEN_STORE":
+        _store = None
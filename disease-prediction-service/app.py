@@ -5,69 +5,265 @@ import numpy as np
 import json
 import os
 import re
+import time
 import unicodedata
 from collections import defaultdict
+from cached_response import CachedPayload
+from forest_engine import FlatForest
+from prediction_cache import PredictionCache, symptom_bitmask
+from suggestion_engine import CooccurrenceSuggester
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Resolve artifacts relative to this file so WSGI servers can start from any cwd
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, 'models', 'random_forest_model.joblib')
+# Flat NumPy export of the same forest (forest_engine.py); preferred when present
+FOREST_PATH = os.path.join(BASE_DIR, 'models', 'forest')
+# Symptom co-occurrence from the training data (suggestion_engine.py); optional
+COOCCURRENCE_PATH = os.path.join(BASE_DIR, 'models', 'cooccurrence.npz')
+LABEL_ENCODER_PATH = os.path.join(BASE_DIR, 'models', 'label_encoder.joblib')
+
 # Load models
 model = None
 label_encoder = None
 symptom_mapping = None
 disease_mapping = None
 symptom_keys_ordered = None
+symptom_index = None
+class_names = None
+class_names_vn = None
 symptom_norm_to_key = None
+symptom_matcher = None
 token_to_symptoms = None
+symptom_tokens = None
+suggester = None
+model_load_seconds = None
+# Catalogue endpoints and pages, serialized and gzipped once per load_mappings()
+cached_payloads = {}
+# The catalogue only changes on deploy; pages revalidate every time so UI changes show up
+CATALOGUE_CACHE_CONTROL = f"public, max-age={int(os.environ.get('CATALOGUE_MAX_AGE', '3600'))}"
+PAGE_CACHE_CONTROL = 'no-cache'
+# Top-k results per canonical symptom set; cleared whenever a model is loaded
+prediction_cache = PredictionCache(int(os.environ.get('PREDICTION_CACHE_SIZE', '10000')))
 SUGGEST_STOPWORDS = {
     'and','or','the','a','an','of','in','on','with','without','to','for','due','during','after','before',
     'pain','symptom','symptoms','area','region','chronic','acute','abnormal','movement','movements','body'
 }
 
-def load_models():
-    global model, label_encoder, symptom_mapping, disease_mapping, symptom_keys_ordered, symptom_norm_to_key, token_to_symptoms
+def load_mappings():
+    """Load the EN/VN mappings and precompute the text-matching helpers."""
+    global symptom_mapping, disease_mapping, symptom_keys_ordered, symptom_index, symptom_norm_to_key, symptom_matcher, token_to_symptoms, symptom_tokens
+
+    with open(os.path.join(BASE_DIR, 'data_info', 'symptom_mapping.json'), 'r', encoding='utf-8') as f:
+        symptom_mapping = json.load(f)
+
+    with open(os.path.join(BASE_DIR, 'data_info', 'disease_mapping.json'), 'r', encoding='utf-8') as f:
+        disease_mapping = json.load(f)
+
+    # Precompute helpers
+    symptom_keys_ordered = list(symptom_mapping.keys())
+    symptom_index = {key: i for i, key in enumerate(symptom_keys_ordered)}
+    symptom_norm_to_key = {}
+    token_to_symptoms = defaultdict(set)
+    symptom_tokens = {}
+    for en_key, vn_value in symptom_mapping.items():
+        en_norm = _normalize_text(en_key)
+        vn_norm = _normalize_text(vn_value)
+        symptom_norm_to_key[en_norm] = en_key
+        symptom_norm_to_key[vn_norm] = en_key
+        symptom_tokens[en_key] = {
+            tok for tok in _tokens(en_norm) + _tokens(vn_norm) if tok not in SUGGEST_STOPWORDS
+        }
+        for tok in symptom_tokens[en_key]:
+            token_to_symptoms[tok].add(en_key)
+    symptom_matcher = _build_symptom_matcher(symptom_norm_to_key)
+    _build_cached_payloads()
+
+def _build_cached_payloads():
+    """Serialize the catalogue responses and render the pages that embed it."""
+    global cached_payloads
+    with app.app_context():
+        payloads = {
+            'symptoms': CachedPayload(jsonify({
+                'symptoms': list(symptom_mapping.keys()),
+                'symptoms_vn': list(symptom_mapping.values())
+            }).get_data(), 'application/json', CATALOGUE_CACHE_CONTROL),
+            'diseases': CachedPayload(jsonify({
+                'diseases': list(disease_mapping.keys()),
+                'diseases_vn': list(disease_mapping.values())
+            }).get_data(), 'application/json', CATALOGUE_CACHE_CONTROL),
+            'index.html': CachedPayload(render_template('index.html', symptoms=symptom_mapping),
+                                        'text/html', PAGE_CACHE_CONTROL),
+            'chat.html': CachedPayload(render_template('chat.html', symptoms=symptom_mapping),
+                                       'text/html', PAGE_CACHE_CONTROL),
+        }
+    cached_payloads = payloads
+
+def _cached(name):
+    payload = cached_payloads.get(name)
+    if payload is None:
+        return jsonify({'error': 'Service is still loading'}), 503
+    return payload.response(request)
+
+def load_models(mmap_mode=None):
+    """Load the model, encoder and mappings. The flat forest export is always
+    memory-mapped; for the joblib fallback, mmap_mode='r' maps the arrays of an
+    uncompressed artifact read-only so forked workers share the pages."""
+    global model, label_encoder, class_names, class_names_vn, model_load_seconds, suggester
     
     try:
+        started = time.perf_counter()
         # Load trained model
-        model = joblib.load('models/random_forest_model.joblib')
-        label_encoder = joblib.load('models/label_encoder.joblib')
+        if os.path.isdir(FOREST_PATH):
+            model = FlatForest.load(FOREST_PATH, mmap_mode=mmap_mode or 'r')
+        else:
+            model = joblib.load(MODEL_PATH, mmap_mode=mmap_mode)
         
         # Load mappings
-        with open('data_info/symptom_mapping.json', 'r', encoding='utf-8') as f:
-            symptom_mapping = json.load(f)
-        
-        with open('data_info/disease_mapping.json', 'r', encoding='utf-8') as f:
-            disease_mapping = json.load(f)
-            
-        # Precompute helpers
-        symptom_keys_ordered = list(symptom_mapping.keys())
-        symptom_norm_to_key = {}
-        token_to_symptoms = defaultdict(set)
-        for en_key, vn_value in symptom_mapping.items():
-            en_norm = _normalize_text(en_key)
-            vn_norm = _normalize_text(vn_value)
-            symptom_norm_to_key[en_norm] = en_key
-            symptom_norm_to_key[vn_norm] = en_key
-            for tok in _tokens(en_norm):
-                if tok and tok not in SUGGEST_STOPWORDS:
-                    token_to_symptoms[tok].add(en_key)
-            for tok in _tokens(vn_norm):
-                if tok and tok not in SUGGEST_STOPWORDS:
-                    token_to_symptoms[tok].add(en_key)
-
-        print("Models loaded successfully!")
+        load_mappings()
+
+        # Disease name of each predict_proba column, decoded once. A flat export
+        # carries them already, which avoids importing sklearn to unpickle the encoder
+        if getattr(model, 'labels', None):
+            label_encoder = None
+            class_names = np.array(model.labels)
+        else:
+            label_encoder = joblib.load(LABEL_ENCODER_PATH)
+            class_names = label_encoder.inverse_transform(model.classes_)
+        class_names_vn = [disease_mapping.get(name, name) for name in class_names]
+
+        suggester = None
+        if os.path.exists(COOCCURRENCE_PATH):
+            suggester = CooccurrenceSuggester.load(COOCCURRENCE_PATH)
+            if suggester.n_symptoms != len(symptom_keys_ordered):
+                print("Ignoring cooccurrence.npz: symptom count does not match the mapping")
+                suggester = None
+        model_load_seconds = time.perf_counter() - started
+        prediction_cache.clear()
+
+        print(f"Models loaded successfully in {model_load_seconds:.2f}s ({type(model).__name__})!")
         return True
     except Exception as e:
         print(f"Error loading models: {e}")
         return False
 
+def memory_mb():
+    """RSS and private (unshared) memory of this process in MB.
+    RSS also counts pages a forked worker still shares with the master."""
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                name, value = line.split(':', 1)
+                if name in ('Rss', 'Private_Clean', 'Private_Dirty'):
+                    usage[name] = int(value.split()[0]) / 1024
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return {'rss_mb': round(peak, 1), 'private_mb': None}
+    return {
+        'rss_mb': round(usage.get('Rss', 0), 1),
+        'private_mb': round(usage.get('Private_Clean', 0) + usage.get('Private_Dirty', 0), 1)
+    }
+
+@app.route('/health/live')
+def liveness():
+    """The process is up and serving requests"""
+    return jsonify({'status': 'alive', 'pid': os.getpid()})
+
+@app.route('/health/ready')
+def readiness():
+    """Ready once the model and mappings are loaded"""
+    if model is None or symptom_mapping is None:
+        return jsonify({'status': 'loading', 'pid': os.getpid()}), 503
+    return jsonify({
+        'status': 'ready',
+        'pid': os.getpid(),
+        'model': type(model).__name__,
+        'model_load_seconds': round(model_load_seconds, 3),
+        **memory_mb()
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss/eviction counters of this worker's prediction cache"""
+    return jsonify(prediction_cache.stats())
+
 @app.route('/')
 def home():
-    return render_template('index.html', symptoms=symptom_mapping)
+    return _cached('index.html')
 
 @app.route('/chat')
 def chat_page():
-    return render_template('chat.html', symptoms=symptom_mapping)
+    return _cached('chat.html')
+
+MAX_BATCH_SIZE = 5000
+DEFAULT_TOP_K = 5
+
+def _symptom_columns(symptoms):
+    """Feature columns of the known symptoms, as a set."""
+    return {symptom_index[s] for s in symptoms if s in symptom_index}
+
+def _feature_matrix(column_sets):
+    """Binary feature matrix (one row per column set) in the model's column order."""
+    rows, cols = [], []
+    for row, columns in enumerate(column_sets):
+        rows.extend([row] * len(columns))
+        cols.extend(columns)
+    features = np.zeros((len(column_sets), len(symptom_keys_ordered)), dtype=np.float32)
+    features[rows, cols] = 1
+    return features
+
+def _top_k(probabilities, k):
+    """Column indices of the k largest probabilities per row, highest first (ties by column)."""
+    k = min(k, probabilities.shape[1])
+    top = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+    top.sort(axis=1)
+    order = np.argsort(-np.take_along_axis(probabilities, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
+
+def _score(column_sets, k):
+    """Score column sets with one predict_proba call; results without input_symptoms."""
+    probabilities = model.predict_proba(_feature_matrix(column_sets))
+    top_indices = _top_k(probabilities, k)
+    # Same class as model.predict: the first column holding the max probability
+    predicted = probabilities.argmax(axis=1)
+    results = []
+    for row, top, best in zip(probabilities, top_indices, predicted):
+        top_predictions = [{
+            'disease': class_names[i],
+            'disease_vn': class_names_vn[i],
+            'probability': float(row[i])
+        } for i in top]
+        results.append({
+            'predicted_disease': class_names[best],
+            'predicted_disease_vn': class_names_vn[best],
+            'confidence': float(row[best]),
+            'top_predictions': top_predictions
+        })
+    return results
+
+def _predict_many(symptom_sets, k=DEFAULT_TOP_K):
+    """Predict all symptom sets, scoring only the ones not already cached."""
+    generation = prediction_cache.generation
+    column_sets = [_symptom_columns(symptoms) for symptoms in symptom_sets]
+    keys = [(symptom_bitmask(columns), k) for columns in column_sets]
+    results = [prediction_cache.get(key) for key in keys]
+
+    missing = {}
+    for i, (key, result) in enumerate(zip(keys, results)):
+        if result is None:
+            missing.setdefault(key, []).append(i)
+    if missing:
+        scored = _score([column_sets[positions[0]] for positions in missing.values()], k)
+        for (key, positions), result in zip(missing.items(), scored):
+            prediction_cache.put(key, result, generation)
+            for i in positions:
+                results[i] = result
+
+    return [{**result, 'input_symptoms': symptoms} for result, symptoms in zip(results, symptom_sets)]
 
 @app.route('/api/predict', methods=['POST'])
 def predict():
@@ -78,66 +274,57 @@ def predict():
         if not symptoms:
             return jsonify({'error': 'No symptoms provided'}), 400
         
-        # Create feature vector (assuming binary encoding for symptoms)
-        # You might need to adjust this based on how your model was trained
-        feature_vector = np.zeros(len(symptom_mapping))
-        
-        for symptom in symptoms:
-            if symptom in symptom_mapping:
-                # Find the index of the symptom
-                try:
-                    idx = symptom_keys_ordered.index(symptom)
-                    feature_vector[idx] = 1
-                except ValueError:
-                    continue
-        
-        # Reshape for prediction
-        feature_vector = feature_vector.reshape(1, -1)
-        
-        # Make prediction
-        prediction = model.predict(feature_vector)
-        predicted_disease = label_encoder.inverse_transform(prediction)[0]
-        
-        # Get Vietnamese name
-        disease_vn = disease_mapping.get(predicted_disease, predicted_disease)
-        
-        # Get prediction probabilities
-        probabilities = model.predict_proba(feature_vector)[0]
-        top_indices = np.argsort(probabilities)[::-1][:5]  # Top 5 predictions
-        
-        # Map probability indices to actual encoded class labels
-        model_classes = getattr(model, 'classes_', None)
-        if model_classes is None:
-            return jsonify({'error': 'Model does not expose classes_ for predict_proba mapping'}), 500
-        
-        top_predictions = []
-        for prob_index in top_indices:
-            encoded_label = model_classes[prob_index]
-            disease_name = label_encoder.inverse_transform([encoded_label])[0]
-            disease_vn_name = disease_mapping.get(disease_name, disease_name)
-            top_predictions.append({
-                'disease': disease_name,
-                'disease_vn': disease_vn_name,
-                'probability': float(probabilities[prob_index])
-            })
-        
-        return jsonify({
-            'predicted_disease': predicted_disease,
-            'predicted_disease_vn': disease_vn,
-            'confidence': float(max(probabilities)),
-            'top_predictions': top_predictions,
-            'input_symptoms': symptoms
-        })
+        return jsonify(_predict_many([symptoms])[0])
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """Predict many cases at once: {"cases": [{"symptoms": [...]}, ...], "top_k": 5}"""
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        cases = data.get('cases', [])
+        try:
+            top_k = int(data.get('top_k', DEFAULT_TOP_K))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'top_k must be an integer'}), 400
+
+        if not cases:
+            return jsonify({'error': 'No cases provided'}), 400
+        if not isinstance(cases, list):
+            return jsonify({'error': 'cases must be a list'}), 400
+        if len(cases) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} cases per batch'}), 400
+        if top_k < 1:
+            return jsonify({'error': 'top_k must be at least 1'}), 400
+        for i, case in enumerate(cases):
+            if not isinstance(case, dict) or not isinstance(case.get('symptoms', []), list):
+                return jsonify({'error': f'cases[{i}] must be an object with a "symptoms" list'}), 400
+
+        symptom_sets = [case.get('symptoms') or [] for case in cases]
+        scored = [i for i, symptoms in enumerate(symptom_sets) if symptoms]
+        results = [{'error': 'No symptoms provided'}] * len(cases)
+        if scored:
+            for i, result in zip(scored, _predict_many([symptom_sets[i] for i in scored], top_k)):
+                results[i] = result
+
+        return jsonify({'results': results})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9\s]')
+_SPACES_RE = re.compile(r'\s+')
+
 def _normalize_text(text: str) -> str:
     text = text.lower()
     text = ''.join(c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn')
     # Keep letters/digits/spaces only
-    text = re.sub(r'[^a-z0-9\s]', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = _NON_ALNUM_RE.sub(' ', text)
+    text = _SPACES_RE.sub(' ', text).strip()
     return text
 
 def _tokens(normalized_text: str):
@@ -145,47 +332,71 @@ def _tokens(normalized_text: str):
         return []
     return [t for t in normalized_text.split(' ') if t]
 
+_MATCH_END = None  # trie key marking the last token of a phrase
+
+def _build_symptom_matcher(norm_to_key):
+    """Build a token trie over all normalized EN/VN phrases.
+    Normalized text is lowercase [a-z0-9] tokens joined by single spaces, so a
+    word-boundary match of a phrase is exactly a run of whole tokens.
+    """
+    root = {}
+    for phrase, key in norm_to_key.items():
+        node = root
+        for tok in _tokens(phrase):
+            node = node.setdefault(tok, {})
+        if node is not root:
+            node[_MATCH_END] = key
+    return root
+
 def _extract_symptoms_from_text(text: str):
     """Extract symptom keys (EN) from free text in EN or VN.
-    Uses simple normalized substring matching against both EN keys and VN values.
+    Walks the phrase trie from every token, so the cost is linear in the input
+    length (times the longest phrase) and overlapping phrases are all reported.
     """
-    if not text:
+    if not text or not symptom_matcher:
         return []
-    normalized = _normalize_text(text)
-    found_keys = set()
-
-    # Try longest phrases first to avoid partial shadowing
-    phrases = sorted(symptom_norm_to_key.keys(), key=len, reverse=True)
-    for phrase in phrases:
-        if not phrase:
-            continue
-        # word-boundary like match; phrase may have spaces
-        # Build regex safely
-        pattern = r'(?<![a-z0-9])' + re.escape(phrase) + r'(?![a-z0-9])'
-        if re.search(pattern, normalized):
-            found_keys.add(symptom_norm_to_key[phrase])
+    tokens = _tokens(_normalize_text(text))
+    found_keys = {}
+    for start in range(len(tokens)):
+        node = symptom_matcher
+        for tok in tokens[start:]:
+            node = node.get(tok)
+            if node is None:
+                break
+            key = node.get(_MATCH_END)
+            if key is not None:
+                found_keys[key] = True
 
     return list(found_keys)
 
-def _suggest_related_symptoms(chosen_keys, limit=8):
-    if not chosen_keys:
-        return []
-    # Score candidates by shared tokens frequency
+def _suggest_by_tokens(chosen_keys, limit, exclude=()):
+    """Fallback: candidates sharing the most (non-stopword) words with the chosen symptoms."""
     token_set = set()
     for key in chosen_keys:
-        token_set.update(_tokens(_normalize_text(key)))
-        token_set.update(_tokens(_normalize_text(symptom_mapping.get(key, ''))))
+        token_set.update(symptom_tokens.get(key, ()))
     scores = {}
-    for tok in list(token_set):
-        if tok in SUGGEST_STOPWORDS:
-            continue
-        for cand in token_to_symptoms.get(tok, []):
-            if cand in chosen_keys:
+    for tok in token_set:
+        for cand in token_to_symptoms.get(tok, ()):
+            if cand in chosen_keys or cand in exclude:
                 continue
             scores[cand] = scores.get(cand, 0) + 1
     ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
     return [name for name, _ in ranked[:limit]]
 
+def _suggest_related_symptoms(chosen_keys, limit=8):
+    """Symptoms that most often co-occur with the chosen ones in the training data,
+    topped up from the shared-word index when that gives fewer than `limit`."""
+    if not chosen_keys:
+        return []
+    chosen_keys = set(chosen_keys)
+    suggestions = []
+    columns = _symptom_columns(chosen_keys)
+    if suggester is not None and columns:
+        suggestions = [symptom_keys_ordered[col] for col in suggester.suggest(columns, limit)]
+    if len(suggestions) < limit:
+        suggestions.extend(_suggest_by_tokens(chosen_keys, limit - len(suggestions), set(suggestions)))
+    return suggestions
+
 @app.route('/api/parse-symptoms', methods=['POST'])
 def parse_symptoms():
     try:
@@ -206,25 +417,13 @@ def parse_symptoms():
 
 @app.route('/api/symptoms', methods=['GET'])
 def get_symptoms():
-    """Get all available symptoms"""
-    try:
-        return jsonify({
-            'symptoms': list(symptom_mapping.keys()),
-            'symptoms_vn': list(symptom_mapping.values())
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    """Get all available symptoms (precomputed, ETag/gzip)"""
+    return _cached('symptoms')
 
 @app.route('/api/diseases', methods=['GET'])
 def get_diseases():
-    """Get all available diseases"""
-    try:
-        return jsonify({
-            'diseases': list(disease_mapping.keys()),
-            'diseases_vn': list(disease_mapping.values())
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    """Get all available diseases (precomputed, ETag/gzip)"""
+    return _cached('diseases')
 
 if __name__ == '__main__':
     if load_models():
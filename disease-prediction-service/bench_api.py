@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Benchmark độ trễ và thông lượng các API qua Flask test client (không cần mạng)
+
+Mỗi kịch bản (endpoint x kích thước payload) chạy ở từng mức đồng thời trong
+--seconds giây, mỗi luồng một test client. Kết quả gồm p50/p95/p99, số
+request/giây và tỉ lệ hit của prediction cache, in ra JSON để lưu và so sánh
+giữa các lần chạy:
+
+    python bench_api.py --out bench.json
+    python bench_api.py --only predict,catalogue --concurrency 1,8
+    python bench_api.py --baseline bench.json --tolerance 0.2   # exit 1 nếu p95 chậm hơn 20%
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+import app
+from bench_symptom_extractor import build_messages
+
+
+def predict_scenario(n_symptoms):
+    def make(rng):
+        return 'POST', '/api/predict', {'json': {'symptoms': rng.sample(app.symptom_keys_ordered, n_symptoms)}}
+    return make
+
+
+def batch_scenario(n_cases, n_symptoms=5):
+    def make(rng):
+        cases = [{'symptoms': rng.sample(app.symptom_keys_ordered, n_symptoms)} for _ in range(n_cases)]
+        return 'POST', '/api/predict/batch', {'json': {'cases': cases}}
+    return make
+
+
+def parse_scenario(messages, n_sentences):
+    def make(rng):
+        return 'POST', '/api/parse-symptoms', {'json': {'text': ' '.join(rng.sample(messages, n_sentences))}}
+    return make
+
+
+def get_scenario(path, headers=None):
+    def make(rng):
+        return 'GET', path, {'headers': headers or {}}
+    return make
+
+
+def build_scenarios():
+    """(group, variant, make_request) cho mọi kịch bản."""
+    messages = build_messages(200)
+    symptoms_etag = app.cached_payloads['symptoms'].etag
+    return [
+        ('predict', '1-symptom', predict_scenario(1)),
+        ('predict', '5-symptoms', predict_scenario(5)),
+        ('predict', '15-symptoms', predict_scenario(15)),
+        ('predict_batch', '32-cases', batch_scenario(32)),
+        ('predict_batch', '512-cases', batch_scenario(512)),
+        ('parse', '1-sentence', parse_scenario(messages, 1)),
+        ('parse', '8-sentences', parse_scenario(messages, 8)),
+        ('catalogue', 'symptoms', get_scenario('/api/symptoms')),
+        ('catalogue', 'symptoms-gzip', get_scenario('/api/symptoms', {'Accept-Encoding': 'gzip'})),
+        ('catalogue', 'symptoms-304', get_scenario('/api/symptoms', {'If-None-Match': f'"{symptoms_etag}"'})),
+        ('catalogue', 'diseases-gzip', get_scenario('/api/diseases', {'Accept-Encoding': 'gzip'})),
+    ]
+
+
+def run(make_request, concurrency, seconds, warmup, seed):
+    """Chạy một kịch bản ở một mức đồng thời; trả về dict kết quả."""
+    app.prediction_cache.clear()
+    cache_before = app.prediction_cache.stats()
+    ready = threading.Barrier(concurrency + 1)
+    go = threading.Event()
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    deadline = [None]
+
+    def worker(w):
+        rng = random.Random(seed + w)
+        client = app.app.test_client()
+        for _ in range(warmup):
+            method, path, kwargs = make_request(rng)
+            client.open(path, method=method, **kwargs)
+        ready.wait()
+        go.wait()
+        own = latencies[w]
+        while time.perf_counter() < deadline[0]:
+            method, path, kwargs = make_request(rng)
+            began = time.perf_counter()
+            response = client.open(path, method=method, **kwargs)
+            own.append(time.perf_counter() - began)
+            if response.status_code not in (200, 304):
+                errors[w] += 1
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    # Bắt đầu đo khi mọi luồng đã khởi động xong
+    ready.wait()
+    began = time.perf_counter()
+    deadline[0] = began + seconds
+    go.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    samples = np.concatenate([np.asarray(own) for own in latencies]) * 1000
+    cache_after = app.prediction_cache.stats()
+    lookups = (cache_after['hits'] - cache_before['hits']) + (cache_after['misses'] - cache_before['misses'])
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if len(samples) else (0.0, 0.0, 0.0)
+    return {
+        'requests': int(len(samples)),
+        'errors': sum(errors),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'latency_ms': {
+            'p50': round(float(p50), 3),
+            'p95': round(float(p95), 3),
+            'p99': round(float(p99), 3),
+            'mean': round(float(samples.mean()), 3) if len(samples) else 0.0,
+            'max': round(float(samples.max()), 3) if len(samples) else 0.0,
+        },
+        'cache_hit_rate': round((cache_after['hits'] - cache_before['hits']) / lookups, 4) if lookups else None,
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Đối chiếu p95 với một lần chạy trước; trả về danh sách kịch bản chậm đi."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['name']: r for r in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        before = baseline.get(result['name'])
+        if not before or not before['latency_ms']['p95']:
+            continue
+        ratio = result['latency_ms']['p95'] / before['latency_ms']['p95']
+        result['p95_vs_baseline'] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            regressions.append(result['name'])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=2.0, help='thời gian đo mỗi kịch bản ở mỗi mức đồng thời')
+    parser.add_argument('--concurrency', default='1,4,16', help='các mức đồng thời, cách nhau bằng dấu phẩy')
+    parser.add_argument('--only', help='chỉ chạy các nhóm này: predict,predict_batch,parse,catalogue')
+    parser.add_argument('--warmup', type=int, default=5, help='số request khởi động mỗi luồng, không tính')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='ghi JSON vào file thay vì stdout')
+    parser.add_argument('--baseline', help='JSON của lần chạy trước để so sánh p95')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='mức p95 chậm đi cho phép so với baseline')
+    args = parser.parse_args()
+
+    if not app.load_models():
+        raise SystemExit("Failed to load models. Please check your model files.")
+    levels = [int(level) for level in args.concurrency.split(',')]
+    groups = set(args.only.split(',')) if args.only else None
+
+    results = []
+    for group, variant, make_request in build_scenarios():
+        if groups and group not in groups:
+            continue
+        for concurrency in levels:
+            result = {
+                'name': f'{group}/{variant}@c{concurrency}',
+                'scenario': group,
+                'variant': variant,
+                'concurrency': concurrency,
+                **run(make_request, concurrency, args.seconds, args.warmup, args.seed),
+            }
+            results.append(result)
+            latency = result['latency_ms']
+            print(f"{result['name']:36} {result['throughput_rps']:9.1f} req/s  "
+                  f"p50 {latency['p50']:8.2f}  p95 {latency['p95']:8.2f}  p99 {latency['p99']:8.2f} ms"
+                  f"{'  errors: %d' % result['errors'] if result['errors'] else ''}", file=sys.stderr)
+
+    regressions = compare(results, args.baseline, args.tolerance) if args.baseline else []
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'model': type(app.model).__name__,
+            'model_load_seconds': round(app.model_load_seconds, 3),
+            'prediction_cache_size': app.prediction_cache.maxsize,
+            'seconds': args.seconds,
+            'concurrency': levels,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.baseline:
+        report['regressions'] = regressions
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if regressions:
+        print(f"p95 regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark cho _extract_symptoms_from_text
+So sánh cách cũ (một regex cho mỗi cụm từ, ~750 lần re.search mỗi tin nhắn)
+với trie token dựng sẵn trong load_mappings(), trên tin nhắn tiếng Việt và tiếng Anh.
+
+    python bench_symptom_extractor.py --seconds 2
+"""
+
+import argparse
+import random
+import re
+import time
+
+import app
+
+
+def legacy_extract(text):
+    """Bản cũ của _extract_symptoms_from_text, giữ lại để đo và đối chiếu kết quả."""
+    if not text:
+        return []
+    normalized = app._normalize_text(text)
+    found_keys = set()
+    phrases = sorted(app.symptom_norm_to_key.keys(), key=len, reverse=True)
+    for phrase in phrases:
+        if not phrase:
+            continue
+        pattern = r'(?<![a-z0-9])' + re.escape(phrase) + r'(?![a-z0-9])'
+        if re.search(pattern, normalized):
+            found_keys.add(app.symptom_norm_to_key[phrase])
+    return list(found_keys)
+
+
+VN_TEMPLATES = [
+    "Chào bác sĩ, mấy hôm nay tôi bị {0} và {1}, buổi tối thì {2}.",
+    "Con tôi {0}, kèm theo {1}. Có cần đi khám không ạ?",
+    "Tôi thấy {0} từ tuần trước, uống thuốc rồi nhưng vẫn {1}.",
+]
+EN_TEMPLATES = [
+    "Hi doctor, for the last few days I have had {0} and {1}, and at night {2}.",
+    "My son has {0} together with {1}. Should we come in?",
+    "I noticed {0} last week; medication helped a bit but I still have {1}.",
+]
+
+
+def build_messages(count, seed=0):
+    rng = random.Random(seed)
+    en_keys = list(app.symptom_mapping.keys())
+    messages = []
+    for i in range(count):
+        picks = rng.sample(en_keys, 3)
+        if i % 2:
+            messages.append(rng.choice(EN_TEMPLATES).format(*picks))
+        else:
+            messages.append(rng.choice(VN_TEMPLATES).format(*(app.symptom_mapping[k].lower() for k in picks)))
+    return messages
+
+
+def measure(extract, messages, seconds):
+    done = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for message in messages:
+            extract(message)
+        done += len(messages)
+    return done / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    app.load_mappings()
+    messages = build_messages(args.messages)
+
+    mismatches = sum(
+        set(legacy_extract(m)) != set(app._extract_symptoms_from_text(m)) for m in messages
+    )
+    print(f"{len(app.symptom_norm_to_key)} phrases, {len(messages)} messages (VN/EN), mismatches: {mismatches}")
+
+    before = measure(legacy_extract, messages, args.seconds)
+    after = measure(app._extract_symptoms_from_text, messages, args.seconds)
+    print(f"before (regex per phrase): {before:10.0f} msg/s")
+    print(f"after  (token trie):       {after:10.0f} msg/s  ({after / before:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
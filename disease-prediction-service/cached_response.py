@@ -0,0 +1,44 @@
+"""
+Precomputed HTTP responses for content that only changes when models reload
+
+CachedPayload serializes nothing at request time: the body and its gzip
+version are built once, with a strong ETag derived from the bytes. Each
+encoding gets its own ETag (the bytes on the wire differ), and a request whose
+If-None-Match names either of them gets a 304 since both stand for the same
+content.
+"""
+
+import gzip
+import hashlib
+
+from flask import Response
+
+
+class CachedPayload:
+    def __init__(self, body, mimetype, cache_control):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = digest
+        self.gzip_etag = f'{digest}-gzip'
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+
+    def not_modified(self, request):
+        if_none_match = request.if_none_match
+        return if_none_match.contains_weak(self.etag) or if_none_match.contains_weak(self.gzip_etag)
+
+    def response(self, request):
+        use_gzip = request.accept_encodings['gzip'] > 0 and len(self.gzipped) < len(self.body)
+        headers = {'Cache-Control': self.cache_control, 'Vary': 'Accept-Encoding'}
+        if self.not_modified(request):
+            response = Response(status=304, headers=headers)
+        elif use_gzip:
+            response = Response(self.gzipped, mimetype=self.mimetype, headers=headers)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(self.body, mimetype=self.mimetype, headers=headers)
+        response.set_etag(self.gzip_etag if use_gzip else self.etag)
+        return response
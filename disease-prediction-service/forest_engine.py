@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Flat NumPy format and inference engine for the RandomForest model
+
+export_forest() writes every tree of a fitted RandomForestClassifier into one
+directory of flat .npy arrays (all trees concatenated, node ids global):
+
+    feature.npy     int32    split feature per node, -1 for leaves
+    threshold.npy   float64  split threshold per node
+    children.npy    int32    (n_nodes, 2) left and right child per node
+    leaf.npy        int32    row in the leaf distributions, -1 for internal nodes
+    roots.npy       int32    root node of each tree
+    leaf_ptr.npy    int64    CSR row pointers of the leaf class distributions
+    leaf_class.npy  int32    CSR column (model class index)
+    leaf_proba.npy  float64  CSR value (normalized like DecisionTree.predict_proba)
+    classes.npy              model.classes_
+    meta.json                shapes, format version and (optionally) the decoded
+                             disease name of each class, so serving needs no sklearn
+
+FlatForest loads them with np.load(mmap_mode='r'), so startup does not unpickle
+Python tree objects and forked workers share the pages through the page cache.
+predict_proba walks all trees for all rows at once and returns the same
+probabilities as the sklearn forest.
+
+    python forest_engine.py models/random_forest_model.joblib models/forest \
+        --label-encoder models/label_encoder.joblib
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+FORMAT_VERSION = 1
+ARRAYS = ('feature', 'threshold', 'children', 'leaf', 'roots',
+          'leaf_ptr', 'leaf_class', 'leaf_proba', 'classes')
+
+
+def export_forest(model, out_dir, label_encoder=None):
+    """Write a fitted RandomForestClassifier as flat arrays; replaces out_dir."""
+    features, thresholds, children, leaves, roots = [], [], [], [], []
+    leaf_ptr, leaf_class, leaf_proba = [0], [], []
+    offset = 0
+    n_leaves = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+
+        roots.append(offset)
+        features.append(np.where(is_leaf, -1, tree.feature))
+        thresholds.append(tree.threshold)
+        children.append(np.where(
+            is_leaf[:, None], 0, np.stack([tree.children_left, tree.children_right], axis=1) + offset
+        ))
+
+        leaf_rows = np.full(n, -1, dtype=np.int64)
+        leaf_rows[is_leaf] = np.arange(n_leaves, n_leaves + is_leaf.sum())
+        leaves.append(leaf_rows)
+
+        # Same normalization as DecisionTreeClassifier.predict_proba
+        values = tree.value[is_leaf, 0, :]
+        normalizer = values.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        values = values / normalizer
+        for row in values:
+            nonzero = np.flatnonzero(row)
+            leaf_class.append(nonzero)
+            leaf_proba.append(row[nonzero])
+            leaf_ptr.append(leaf_ptr[-1] + len(nonzero))
+
+        n_leaves += int(is_leaf.sum())
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'children': np.concatenate(children).astype(np.int32),
+        'leaf': np.concatenate(leaves).astype(np.int32),
+        'roots': np.array(roots, dtype=np.int32),
+        'leaf_ptr': np.array(leaf_ptr, dtype=np.int64),
+        'leaf_class': np.concatenate(leaf_class).astype(np.int32),
+        'leaf_proba': np.concatenate(leaf_proba).astype(np.float64),
+        'classes': np.asarray(model.classes_),
+    }
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'n_trees': len(model.estimators_),
+        'n_features': int(model.n_features_in_),
+        'n_classes': int(model.n_classes_),
+        'n_nodes': int(offset),
+        'n_leaves': n_leaves,
+        'max_depth': int(max_depth),
+        'labels': None if label_encoder is None else
+        [str(label) for label in label_encoder.inverse_transform(model.classes_)],
+    }
+
+    # Write next to the target, then swap it in so readers never see half a model
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    replace_dir(tmp_dir, out_dir)
+    return meta
+
+
+def replace_dir(tmp_dir, out_dir):
+    """Swap a fully written tmp_dir in as out_dir (two renames, then drop the old one)."""
+    old_dir = f"{out_dir}.old-{os.getpid()}"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class FlatForest:
+    """NumPy-only RandomForest inference over arrays written by export_forest()."""
+
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.children = arrays['children']
+        self.leaf = arrays['leaf']
+        self.roots = arrays['roots']
+        self.leaf_ptr = arrays['leaf_ptr']
+        self.leaf_class = arrays['leaf_class']
+        self.leaf_proba = arrays['leaf_proba']
+        self.classes_ = arrays['classes']
+        self.n_classes_ = meta['n_classes']
+        self.n_features_in_ = meta['n_features']
+        self.labels = meta.get('labels')
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported forest format: {meta.get('format_version')}")
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in ARRAYS
+        }
+        return cls(arrays, meta)
+
+    def apply(self, X):
+        """Global leaf node reached by every row in every tree, shape (n_rows, n_trees)."""
+        # Same dtype sklearn compares against thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+        values = X.ravel()
+        row_offset = np.repeat(np.arange(n_rows, dtype=np.int64) * n_features, n_trees)
+        nodes = np.tile(np.asarray(self.roots, dtype=np.int64), n_rows)
+        # Only (row, tree) pairs still at an internal node take another step
+        active = np.arange(nodes.size)
+        while active.size:
+            current = nodes[active]
+            feature = self.feature[current]
+            internal = feature >= 0
+            active, current, feature = active[internal], current[internal], feature[internal]
+            go_right = values[row_offset[active] + feature] > self.threshold[current]
+            nodes[active] = self.children[current, go_right.view(np.int8)]
+        return nodes.reshape(n_rows, n_trees)
+
+    def predict_proba(self, X):
+        leaves = self.leaf[self.apply(X)]
+        n_rows, n_trees = leaves.shape
+        starts = self.leaf_ptr[leaves.ravel()]
+        counts = self.leaf_ptr[leaves.ravel() + 1] - starts
+        # Expand every (row, tree) leaf into its nonzero class entries and sum per row
+        entry = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        row_of_entry = np.repeat(np.repeat(np.arange(n_rows), n_trees), counts)
+        flat = row_of_entry * self.n_classes_ + self.leaf_class[entry]
+        proba = np.bincount(flat, weights=self.leaf_proba[entry], minlength=n_rows * self.n_classes_)
+        return proba.reshape(n_rows, self.n_classes_) / n_trees
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a joblib RandomForest to the flat NumPy format")
+    parser.add_argument('model', help='path to random_forest_model.joblib')
+    parser.add_argument('out_dir', help='output directory, e.g. models/forest')
+    parser.add_argument('--label-encoder', help='path to label_encoder.joblib, stored as class names')
+    args = parser.parse_args()
+
+    import joblib
+
+    started = time.perf_counter()
+    model = joblib.load(args.model)
+    label_encoder = joblib.load(args.label_encoder) if args.label_encoder else None
+    loaded = time.perf_counter()
+    meta = export_forest(model, args.out_dir, label_encoder)
+    print(f"Loaded joblib in {loaded - started:.2f}s, exported in {time.perf_counter() - loaded:.2f}s")
+    print(json.dumps({k: v for k, v in meta.items() if k != 'labels'}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
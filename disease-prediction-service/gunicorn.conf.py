@@ -0,0 +1,37 @@
+"""
+Gunicorn settings for the disease prediction service
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Environment overrides: PORT, WEB_CONCURRENCY (workers), GUNICORN_THREADS,
+MODEL_MMAP_MODE and PREDICT_N_JOBS (see wsgi.py).
+"""
+
+import os
+import time
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+# Load the model once in the master, then fork (copy-on-write sharing)
+preload_app = True
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+_started = time.perf_counter()
+
+
+def when_ready(server):
+    import app as service
+    server.log.info(
+        "Master ready in %.2fs (model load %.2fs), memory %s",
+        time.perf_counter() - _started, service.model_load_seconds, service.memory_mb()
+    )
+
+
+def post_fork(server, worker):
+    import app as service
+    server.log.info("Worker %s forked, memory %s", worker.pid, service.memory_mb())
@@ -0,0 +1,71 @@
+"""
+Bounded in-process LRU cache for prediction results
+
+Keys are canonical symptom sets (see symptom_bitmask), so the same symptoms in
+any order, with duplicates or unknown names, hit the same entry. Thread-safe for
+gunicorn's gthread workers. clear() starts a new generation: results computed
+against the previous model are dropped instead of being stored after a reload.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+def symptom_bitmask(columns):
+    """Canonical, hashable key for a set of feature column indices."""
+    mask = 0
+    for col in columns:
+        mask |= 1 << col
+    return mask
+
+
+class PredictionCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation):
+        """Store value unless the cache was cleared since `generation` was read."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'generation': self.generation,
+            }
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Symptom co-occurrence matrix for "related symptom" suggestions
+
+build_cooccurrence() turns the binary training matrix (rows = cases, columns =
+symptoms in symptom_mapping order) into a CSR matrix where entry (i, j) is the
+share of cases with symptom i that also have symptom j, i.e. P(j | i). The
+diagonal is dropped. Suggestions for a chosen set are the row sum over the
+chosen symptoms, ranked with np.argpartition.
+
+    python suggestion_engine.py ../dataset/data.csv models/cooccurrence.npz
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+CHUNK_ROWS = 50000
+
+
+def cooccurrence_counts(chunks, n_symptoms):
+    """Sum X.T @ X over chunks of a binary (cases x symptoms) matrix."""
+    counts = np.zeros((n_symptoms, n_symptoms), dtype=np.int64)
+    for chunk in chunks:
+        chunk = sp.csr_matrix(np.asarray(chunk, dtype=np.int32))
+        counts += (chunk.T @ chunk).toarray()
+    return counts
+
+
+def build_cooccurrence(counts):
+    """Row-normalized co-occurrence P(j | i) as float32 CSR, without the diagonal."""
+    support = np.diag(counts).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conditional = np.where(support[:, None] > 0, counts / support[:, None], 0.0)
+    np.fill_diagonal(conditional, 0.0)
+    return sp.csr_matrix(conditional.astype(np.float32))
+
+
+def save_cooccurrence(matrix, path):
+    """Write atomically so a running service never reads half a file."""
+    tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+    sp.save_npz(tmp_path, matrix, compressed=False)
+    os.replace(tmp_path, path)
+
+
+class CooccurrenceSuggester:
+    def __init__(self, matrix):
+        matrix = sp.csr_matrix(matrix)
+        self.n_symptoms = matrix.shape[0]
+        self.indptr = matrix.indptr
+        self.indices = matrix.indices
+        self.data = matrix.data
+
+    @classmethod
+    def load(cls, path):
+        return cls(sp.load_npz(path))
+
+    def scores(self, columns):
+        """Sum of the co-occurrence rows of the chosen columns (the sparse row sum)."""
+        columns = np.fromiter(columns, dtype=np.int64)
+        starts, ends = self.indptr[columns], self.indptr[columns + 1]
+        if len(columns) == 1:
+            entries = np.arange(starts[0], ends[0])
+        else:
+            entries = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        return np.bincount(self.indices[entries], weights=self.data[entries], minlength=self.n_symptoms)
+
+    def suggest(self, columns, limit):
+        """Up to `limit` columns most associated with the chosen ones, best first."""
+        if not columns or limit <= 0:
+            return []
+        scores = self.scores(columns)
+        scores[list(columns)] = 0.0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        # Highest score first, ties by column
+        order = np.lexsort((candidates, -scores[candidates]))
+        return candidates[order].tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the symptom co-occurrence matrix from the dataset CSV")
+    parser.add_argument('csv', help='dataset CSV: disease column first, then one 0/1 column per symptom')
+    parser.add_argument('out', help='output .npz, e.g. models/cooccurrence.npz')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    started = time.perf_counter()
+    columns = pd.read_csv(args.csv, nrows=0).columns[1:]
+    reader = pd.read_csv(args.csv, usecols=columns, dtype='uint8', chunksize=args.chunk_rows)
+    counts = cooccurrence_counts((chunk.to_numpy() for chunk in reader), len(columns))
+    matrix = build_cooccurrence(counts)
+    save_cooccurrence(matrix, args.out)
+    print(f"{len(columns)} symptoms, {matrix.nnz} nonzero pairs, built in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
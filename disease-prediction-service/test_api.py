@@ -4,10 +4,12 @@ Test script for Disease Prediction API
 Chạy script này để test các API endpoints
 """
 
+import os
 import requests
 import json
 
-BASE_URL = "http://localhost:5000"
+# Cùng port với app.run và gunicorn.conf.py
+BASE_URL = os.environ.get("BASE_URL", "http://localhost:5001")
 
 def test_get_symptoms():
     """Test API lấy danh sách triệu chứng"""
@@ -68,6 +70,65 @@ def test_predict():
     except Exception as e:
         print(f"❌ Error: {e}")
 
+def test_predict_batch():
+    """Test API dự đoán theo lô"""
+    print("\n🔍 Testing POST /api/predict/batch...")
+
+    cases = [
+        {"symptoms": ["headache", "fever", "cough"]},
+        {"symptoms": ["sharp chest pain", "shortness of breath"]},
+        {"symptoms": []},
+    ]
+
+    try:
+        response = requests.post(
+            f"{BASE_URL}/api/predict/batch",
+            json={"cases": cases, "top_k": 3},
+            headers={"Content-Type": "application/json"}
+        )
+
+        if response.status_code == 200:
+            results = response.json()['results']
+            print(f"✅ Batch prediction successful! {len(results)} results")
+            for case, result in zip(cases, results):
+                if 'error' in result:
+                    print(f"  {case['symptoms']} -> {result['error']}")
+                else:
+                    print(f"  {case['symptoms']} -> {result['predicted_disease_vn']} ({result['confidence']:.2%})")
+        else:
+            print(f"❌ Failed with status code: {response.status_code}")
+            print(f"Error: {response.text}")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+
+def test_invalid_batch_request():
+    """Test API dự đoán theo lô với dữ liệu sai kiểu"""
+    print("\n🔍 Testing invalid batch request...")
+
+    bodies = [
+        # top_k không phải số nguyên
+        {"cases": [{"symptoms": ["fever"]}], "top_k": "abc"},
+        {"cases": [{"symptoms": ["fever"]}], "top_k": None},
+        # case không phải object hoặc symptoms không phải list
+        {"cases": [["fever"]]},
+        {"cases": [{"symptoms": "fever"}]},
+    ]
+
+    try:
+        for body in bodies:
+            response = requests.post(
+                f"{BASE_URL}/api/predict/batch",
+                json=body,
+                headers={"Content-Type": "application/json"}
+            )
+
+            if response.status_code == 400:
+                print(f"✅ Rejected {body}: {response.json()['error']}")
+            else:
+                print(f"❌ Expected 400 for {body}, got {response.status_code}")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+
 def test_invalid_request():
     """Test API với request không hợp lệ"""
     print("\n🔍 Testing invalid request...")
@@ -109,6 +170,8 @@ def main():
     test_get_symptoms()
     test_get_diseases()
     test_predict()
+    test_predict_batch()
+    test_invalid_batch_request()
     test_invalid_request()
     
     print("\n" + "=" * 50)
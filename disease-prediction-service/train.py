@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Offline training pipeline for the disease model (replaces running the notebook)
+
+Same cleaning and model as notebooks/disease-prediction.ipynb, without loading
+the whole CSV as float64:
+
+1. Read the CSV in chunks with uint8 symptom columns.
+2. Drop rows whose symptom vector was already seen (64-bit row hash, first wins).
+3. Drop diseases with fewer than --min-samples cases.
+4. Fit RandomForestClassifier on a stratified split and report test accuracy.
+5. Write every artifact into a staging directory, then swap it in as --out:
+   random_forest_model.joblib, label_encoder.joblib, forest/ (forest_engine),
+   cooccurrence.npz (suggestion_engine), symptom_list.txt, disease_list.txt and
+   training_report.json with timings and peak memory.
+
+    python train.py --data ../dataset/data.csv --out models --n-jobs 4
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from forest_engine import export_forest, replace_dir
+from suggestion_engine import build_cooccurrence, cooccurrence_counts, save_cooccurrence
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SYMPTOM_MAPPING_PATH = os.path.join(BASE_DIR, 'data_info', 'symptom_mapping.json')
+DISEASE_MAPPING_PATH = os.path.join(BASE_DIR, 'data_info', 'disease_mapping.json')
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def read_dataset(path, chunk_rows):
+    """Read (labels, uint8 symptom matrix, symptom names, stats), deduplicated on the symptoms."""
+    header = pd.read_csv(path, nrows=0).columns
+    label_column, symptoms = header[0], list(header[1:])
+    dtypes = {name: np.uint8 for name in symptoms}
+    dtypes[label_column] = str
+
+    seen = set()
+    labels, blocks = [], []
+    total = 0
+    for chunk in pd.read_csv(path, dtype=dtypes, chunksize=chunk_rows):
+        total += len(chunk)
+        hashes = pd.util.hash_pandas_object(chunk[symptoms], index=False).to_numpy()
+        keep = np.zeros(len(chunk), dtype=bool)
+        for i, row_hash in enumerate(hashes.tolist()):
+            if row_hash not in seen:
+                seen.add(row_hash)
+                keep[i] = True
+        labels.append(chunk[label_column].to_numpy()[keep])
+        blocks.append(chunk[symptoms].to_numpy(dtype=np.uint8)[keep])
+
+    y = np.concatenate(labels)
+    X = np.concatenate(blocks)
+    return y, X, symptoms, {'rows_read': total, 'duplicates_dropped': total - len(y)}
+
+
+def drop_rare(y, X, min_samples):
+    diseases, counts = np.unique(y, return_counts=True)
+    rare = diseases[counts < min_samples]
+    keep = ~np.isin(y, rare)
+    return y[keep], X[keep], len(rare)
+
+
+def check_mappings(symptoms, diseases):
+    """The service builds features in symptom_mapping.json order and shows VN names from the mappings."""
+    with open(SYMPTOM_MAPPING_PATH, encoding='utf-8') as f:
+        mapped_symptoms = list(json.load(f))
+    if symptoms != mapped_symptoms:
+        raise SystemExit(
+            "Symptom columns of the dataset differ from data_info/symptom_mapping.json "
+            "(names or order); update the mapping before training."
+        )
+    with open(DISEASE_MAPPING_PATH, encoding='utf-8') as f:
+        mapped_diseases = json.load(f)
+    missing = [d for d in diseases if d not in mapped_diseases]
+    if missing:
+        print(f"Warning: {len(missing)} diseases have no Vietnamese name in disease_mapping.json", file=sys.stderr)
+
+
+def write_lines(path, items):
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in items:
+            f.write(f"{item}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=os.path.join(BASE_DIR, '..', 'dataset', 'data.csv'))
+    parser.add_argument('--out', default=os.path.join(BASE_DIR, 'models'))
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--min-samples', type=int, default=5, help='drop diseases with fewer cases')
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--n-estimators', type=int, default=50)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--random-state', type=int, default=42)
+    args = parser.parse_args()
+
+    timings = {}
+    started = time.perf_counter()
+
+    y, X, symptoms, stats = read_dataset(args.data, args.chunk_rows)
+    y, X, stats['rare_diseases_dropped'] = drop_rare(y, X, args.min_samples)
+    diseases = pd.Series(y).value_counts().index.tolist()
+    check_mappings(symptoms, diseases)
+    timings['load_seconds'] = time.perf_counter() - started
+    print(f"{stats['rows_read']} rows read, {stats['duplicates_dropped']} duplicates and "
+          f"{stats['rare_diseases_dropped']} rare diseases dropped -> {X.shape[0]} x {X.shape[1]}, "
+          f"{len(diseases)} diseases ({timings['load_seconds']:.1f}s, peak {peak_rss_mb():.0f} MB)")
+
+    label_encoder = LabelEncoder()
+    y_encoded = label_encoder.fit_transform(y)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y_encoded, test_size=args.test_size, random_state=args.random_state, stratify=y_encoded
+    )
+
+    fit_started = time.perf_counter()
+    model = RandomForestClassifier(
+        n_estimators=args.n_estimators,
+        max_depth=None,
+        min_samples_split=2,
+        min_samples_leaf=1,
+        class_weight='balanced',
+        random_state=args.random_state,
+        n_jobs=args.n_jobs,
+    )
+    model.fit(X_train, y_train)
+    timings['fit_seconds'] = time.perf_counter() - fit_started
+    accuracy = float((model.predict(X_test) == y_test).mean()) if len(y_test) else None
+    print(f"Fitted {args.n_estimators} trees in {timings['fit_seconds']:.1f}s, "
+          f"test accuracy {accuracy:.4f}, peak {peak_rss_mb():.0f} MB")
+
+    write_started = time.perf_counter()
+    out_dir = os.path.abspath(args.out)
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    joblib.dump(model, os.path.join(tmp_dir, 'random_forest_model.joblib'), compress=3)
+    joblib.dump(label_encoder, os.path.join(tmp_dir, 'label_encoder.joblib'), compress=3)
+    export_forest(model, os.path.join(tmp_dir, 'forest'), label_encoder)
+    save_cooccurrence(
+        build_cooccurrence(cooccurrence_counts([X[i:i + args.chunk_rows] for i in range(0, len(X), args.chunk_rows)],
+                                               X.shape[1])),
+        os.path.join(tmp_dir, 'cooccurrence.npz'),
+    )
+    write_lines(os.path.join(tmp_dir, 'symptom_list.txt'), symptoms)
+    write_lines(os.path.join(tmp_dir, 'disease_list.txt'), diseases)
+    timings['write_seconds'] = time.perf_counter() - write_started
+    timings['total_seconds'] = time.perf_counter() - started
+
+    report = {
+        'data': os.path.abspath(args.data),
+        'params': {k: v for k, v in vars(args).items() if k not in ('data', 'out')},
+        **stats,
+        'n_samples': int(X.shape[0]),
+        'n_symptoms': int(X.shape[1]),
+        'n_diseases': len(diseases),
+        'test_accuracy': accuracy,
+        'timings': {k: round(v, 3) for k, v in timings.items()},
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+    with open(os.path.join(tmp_dir, 'training_report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    # Model, encoder, flat export and lists become visible together
+    replace_dir(tmp_dir, out_dir)
+    print(f"Wrote {out_dir} in {timings['write_seconds']:.1f}s; total {timings['total_seconds']:.1f}s, "
+          f"peak {report['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+WSGI entry point for production serving
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The model is loaded here, at import time. With preload_app in gunicorn.conf.py
+this happens once in the master before forking, so every worker shares the
+loaded forest copy-on-write instead of loading its own.
+"""
+
+import gc
+import os
+
+import app as service
+
+MODEL_MMAP_MODE = os.environ.get('MODEL_MMAP_MODE') or None
+# Trees per predict_proba are evaluated with this many threads in each worker;
+# the notebook trains with n_jobs=-1, which oversubscribes CPUs across workers
+PREDICT_N_JOBS = int(os.environ.get('PREDICT_N_JOBS', '1'))
+
+if not service.load_models(mmap_mode=MODEL_MMAP_MODE):
+    raise SystemExit("Failed to load models. Please check your model files.")
+if hasattr(service.model, 'n_jobs'):
+    # sklearn forest (no flat export in models/forest)
+    service.model.set_params(n_jobs=PREDICT_N_JOBS)
+
+# Move everything loaded so far out of the GC's reach so collections in the
+# workers don't touch (and un-share) the model's pages
+gc.freeze()
+
+app = service.app
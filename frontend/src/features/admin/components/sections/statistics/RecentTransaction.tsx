@@ -17,7 +17,7 @@ export default function RecentTransactions() {
   useEffect(() => {
     const fetchBills = async () => {
       try {
-        const data = await paymentService.getAllBills(1, 10);
+        const data = await paymentService.getAllBills(10);
         setBills(data.content);
       } catch (error) {
         console.error("Không thể tải danh sách hóa đơn:", error);
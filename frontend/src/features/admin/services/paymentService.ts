@@ -67,15 +67,23 @@ export const paymentService = {
     }
   },
 
+  // Hỏi trạng thái nhiều link thanh toán trong một request
+  async getPaymentStatuses(orderCodes: number[]): Promise<{ orderCode: number; status: string | null }[]> {
+    const response = await api.get(`/transactions/payment-statuses/`, {
+      params: { order_codes: orderCodes.join(",") },
+    })
+    if (response.data.error !== 0) {
+      throw new Error(response.data.message || "Không thể lấy trạng thái thanh toán")
+    }
+    return response.data.data
+  },
+
   async checkPaymentStatus(orderId: number): Promise<boolean> {
     try {
-      const response = await api.get(`/transactions/payment-info/${orderId}/`)
-      if (response.data.error === 0) {
-        const paymentInfo = response.data.data
-        if (paymentInfo.status === "PAID") {
-          await this.handlePaymentSuccess(orderId)
-          return true
-        }
+      const [paymentStatus] = await this.getPaymentStatuses([orderId])
+      if (paymentStatus?.status === "PAID") {
+        await this.handlePaymentSuccess(orderId)
+        return true
       }
       return false
     } catch (error) {
@@ -111,16 +119,15 @@ export const paymentService = {
 
   // Get all bills
   async getAllBills(
-    page = 1,
     size = 20,
+    cursor = "",
   ): Promise<{
     content: BillResponse[]
-    totalPages: number
-    totalElements: number
-    size: number
-    number: number
+    pageSize: number
+    nextCursor: string | null
+    last: boolean
   }> {
-    const response = await api.get(`/bills?page=${page}&size=${size}`)
+    const response = await api.get(`/bills/`, { params: { size, cursor } })
     return response.data
   },
 }
@@ -7,8 +7,8 @@ const paymentService = {
             const response = await api.get(`/bills/`, {
                 params: { appointment_id: appointmentId }
             });
-            // API trả về danh sách trong results, lấy bill đầu tiên hoặc null nếu không có
-            return response.data.results?.[0] || null;
+            // API trả về danh sách trong content, lấy bill đầu tiên hoặc null nếu không có
+            return response.data.content?.[0] || null;
         } catch (error: any) {
             console.error('Lỗi khi lấy hóa đơn theo appointment:', error.response?.data || error.message);
             throw error;